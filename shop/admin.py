@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Category, Product, CartItem, Order, OrderItem
+from django.utils import timezone
+
+from .models import (
+    Category, Product, CartItem, StockReservation, Order, OrderItem, ProductDailySales, CategoryDailySales, Task,
+    ProductNeighbor,
+)
+from .order_export import export_response
 
 
 @admin.register(Category)
@@ -11,29 +17,95 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'category', 'price', 'stock', 'created_at')
+    list_display = ('id', 'name', 'category', 'price', 'stock', 'reserved', 'created_at')
     list_filter = ('category',)
     search_fields = ('name', 'description')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'reserved')
 
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
-    list_display = ('id', 'product', 'quantity', 'session_key')
+    list_display = ('id', 'product', 'quantity', 'cart_key')
+    list_select_related = ('product',)
     list_filter = ('product',)
-    search_fields = ('product__name', 'session_key')
+    search_fields = ('product__name', 'cart_key')
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'product', 'quantity', 'cart_key', 'expires_at')
+    list_select_related = ('product',)
+    search_fields = ('product__name', 'cart_key')
+    readonly_fields = ('product', 'quantity', 'cart_key', 'expires_at')
 
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
-    readonly_fields = ('product', 'quantity')
+    readonly_fields = ('product', 'product_name', 'unit_price', 'quantity')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'username', 'phone', 'created_at')
+    list_display = ('id', 'username', 'phone', 'item_count', 'total', 'created_at')
     ordering = ('-created_at',)
     inlines = [OrderItemInline]
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'total', 'item_count')
     search_fields = ('username', 'phone', 'address')
+    actions = ['export_csv', 'export_jsonl']
+
+    @admin.action(description='Экспорт выбранных заказов в CSV')
+    def export_csv(self, request, queryset):
+        return export_response('csv', queryset)
+
+    @admin.action(description='Экспорт выбранных заказов в JSONL')
+    def export_jsonl(self, request, queryset):
+        return export_response('jsonl', queryset)
+
+
+@admin.register(ProductDailySales)
+class ProductDailySalesAdmin(admin.ModelAdmin):
+    list_display = ('day', 'product_name', 'units', 'revenue')
+    list_filter = ('day',)
+    search_fields = ('product_name',)
+    ordering = ('-day', '-revenue')
+    readonly_fields = ('day', 'product', 'product_name', 'units', 'revenue')
+
+
+@admin.register(CategoryDailySales)
+class CategoryDailySalesAdmin(admin.ModelAdmin):
+    list_display = ('day', 'category_name', 'units', 'revenue')
+    list_filter = ('day',)
+    ordering = ('-day', '-revenue')
+    readonly_fields = ('day', 'category', 'category_name', 'units', 'revenue')
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at', 'wait_ms', 'run_ms', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('idempotency_key',)
+    ordering = ('-id',)
+    readonly_fields = (
+        'name', 'payload', 'idempotency_key', 'attempts', 'created_at', 'started_at', 'finished_at',
+        'locked_by', 'last_error', 'wait_ms', 'run_ms',
+    )
+    actions = ['retry']
+
+    @admin.action(description='Повторить выбранные задачи')
+    def retry(self, request, queryset):
+        updated = queryset.exclude(status=Task.RUNNING).update(
+            status=Task.PENDING, attempts=0, run_at=timezone.now(), locked_by='', finished_at=None
+        )
+        self.message_user(request, f'Поставлено в очередь повторно: {updated}')
+
+
+@admin.register(ProductNeighbor)
+class ProductNeighborAdmin(admin.ModelAdmin):
+    list_display = ('product', 'neighbor', 'score')
+    list_select_related = ('product', 'neighbor')
+    raw_id_fields = ('product', 'neighbor')
+    ordering = ('product', '-score')
@@ -0,0 +1,141 @@
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, urlencode
+from django.views.generic import View
+
+from .categories import category_registry, get_categories_version
+from .models import Product
+from .views import ProductListView, ProductsByCategoryView
+
+PRODUCT_FIELDS = ('id', 'name', 'price', 'stock', 'image', 'category_id', 'updated_at')
+COMPACT_JSON = {'separators': (',', ':'), 'ensure_ascii': False}
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode(), usedforsecurity=False).hexdigest()
+    return f'"{digest}"'
+
+
+def categories_last_modified():
+    return max((category.updated_at for category in category_registry.all()), default=None)
+
+
+def conditional_json(request, etag, last_modified, build_payload):
+    # build_payload вызывается только если клиенту действительно нужен ответ, при 304 ничего не сериализуется
+    # заголовок Last-Modified хранит секунды, поэтому и сравниваем с точностью до секунды
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = JsonResponse(build_payload(), json_dumps_params=COMPACT_JSON)
+    response['ETag'] = etag
+    if timestamp:
+        response['Last-Modified'] = http_date(timestamp)
+    return response
+
+
+def serialize_product(row):
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'price': row['price'],
+        'stock': row['stock'],
+        'image': row['image'],
+        'category': row['category_id'],
+        'updated_at': row['updated_at'],
+    }
+
+
+class CatalogApiMixin:
+    def page_cache_enabled(self):
+        return False
+
+    def use_cursor_pagination(self):
+        # в API курсор используется по умолчанию: без COUNT(*) и OFFSET
+        return not self.request.GET.get('q') and 'page' not in self.request.GET
+
+    def get_paginate_by(self, queryset):
+        max_size = getattr(settings, 'SHOP_API_MAX_PAGE_SIZE', 1000)
+        try:
+            size = int(self.request.GET.get('page_size', self.paginate_by))
+        except ValueError:
+            size = self.paginate_by
+        return max(1, min(size, max_size))
+
+    def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        state = queryset.order_by().aggregate(last_modified=Max('updated_at'), count=Count('id'))
+        last_modified = max(filter(None, [state['last_modified'], categories_last_modified()]), default=None)
+        etag = make_etag(
+            request.get_full_path(), state['last_modified'], state['count'], get_categories_version()
+        )
+        return conditional_json(request, etag, last_modified, lambda: self.get_payload(queryset))
+
+    def page_link(self, **params):
+        query = {key: value for key, value in self.request.GET.items() if key not in ('page', 'cursor')}
+        query.update(params)
+        return f'{self.request.path}?{urlencode(query)}'
+
+    def get_payload(self, queryset):
+        extra_fields = [field for field in self.cursor_ordering if field not in PRODUCT_FIELDS]
+        rows_queryset = queryset.values(*PRODUCT_FIELDS, *extra_fields)
+        page_size = self.get_paginate_by(rows_queryset)
+        paginator, page, rows, _ = self.paginate_queryset(rows_queryset, page_size)
+
+        payload = {'results': [serialize_product(row) for row in rows]}
+        if self.use_cursor_pagination():
+            payload['next'] = self.page_link(cursor=page.next_cursor) if page.has_next() else None
+            payload['previous'] = self.page_link(cursor=page.previous_cursor) if page.has_previous() else None
+        else:
+            payload['count'] = paginator.count
+            payload['next'] = self.page_link(page=page.next_page_number()) if page.has_next() else None
+            payload['previous'] = self.page_link(page=page.previous_page_number()) if page.has_previous() else None
+        return payload
+
+
+class ProductListApiView(CatalogApiMixin, ProductListView):
+    pass
+
+
+class ProductsByCategoryApiView(CatalogApiMixin, ProductsByCategoryView):
+    pass
+
+
+class ProductDetailApiView(View):
+    def get(self, request, pk):
+        product = get_object_or_404(Product.objects.select_related('category'), pk=pk)
+        etag = make_etag('product', product.pk, product.updated_at.isoformat(), product.category.updated_at.isoformat())
+        last_modified = max(product.updated_at, product.category.updated_at)
+
+        def build_payload():
+            return {
+                'id': product.pk,
+                'name': product.name,
+                'description': product.description,
+                'price': product.price,
+                'stock': product.stock,
+                'image': product.image,
+                'category': {'id': product.category.pk, 'slug': product.category.slug, 'name': product.category.name},
+                'created_at': product.created_at,
+                'updated_at': product.updated_at,
+            }
+
+        return conditional_json(request, etag, last_modified, build_payload)
+
+
+class CategoryListApiView(View):
+    def get(self, request):
+        categories = category_registry.all()
+        etag = make_etag('categories', get_categories_version(), len(categories))
+
+        def build_payload():
+            return {'results': [
+                {'id': category.pk, 'name': category.name, 'slug': category.slug, 'description': category.description}
+                for category in categories
+            ]}
+
+        return conditional_json(request, etag, categories_last_modified(), build_payload)
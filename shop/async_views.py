@@ -0,0 +1,133 @@
+import asyncio
+
+from django.core.paginator import InvalidPage, Paginator
+from django.http import Http404
+from django.views.generic import View
+from django.views.generic.base import ContextMixin, TemplateResponseMixin
+
+from .models import Product
+from .forms import OrderForm
+from .cart import get_cart
+from .pagination import CursorPaginator
+from .categories import category_registry
+from .page_cache import AsyncProductPageCacheMixin
+from .facets import FACETS_PLACEHOLDER, afacet_grid, build_facets, filter_params, parse_filters, render_facets
+from .recommendations import bought_together
+from .views import CursorPaginationMixin, get_filtered_products
+
+
+# async-варианты представлений витрины и корзины для ASGI: запросы идут через async ORM,
+# TemplateResponse рендерится обработчиком Django уже после view (включая ленивый бейдж корзины)
+
+
+class AsyncCatalogListView(CursorPaginationMixin, TemplateResponseMixin, ContextMixin, View):
+    template_name = 'shop/products_list.html'
+    paginate_by = 5
+    cursor_ordering = ('category__name', 'name', 'pk')
+
+    def get_queryset(self):
+        queryset = Product.objects.select_related('category').order_by(*self.cursor_ordering)
+        return get_filtered_products(queryset, self.request, self.get_facet_filters())
+
+    def get_facet_filters(self):
+        return parse_filters(self.request.GET, self.category.pk if self.category else None)
+
+    async def aget_facets(self, categories):
+        filters = self.get_facet_filters()
+        return build_facets(await afacet_grid(filters['q']), filters, categories)
+
+    async def apaginate(self, queryset):
+        if self.use_cursor_pagination():
+            paginator = CursorPaginator(queryset, self.paginate_by, self.cursor_ordering)
+            page = await paginator.apage(self.request.GET.get('cursor'))
+            return None, page
+
+        paginator = Paginator(queryset, self.paginate_by)
+        # count — cached_property, считаем его заранее через acount, чтобы Paginator не пошёл в БД синхронно
+        paginator.count = await queryset.acount()
+        page_number = self.request.GET.get('page') or 1
+        if page_number == 'last':
+            page_number = paginator.num_pages
+        try:
+            page = paginator.page(page_number)
+        except InvalidPage:
+            raise Http404('Некорректный номер страницы')
+        page.object_list = [product async for product in page.object_list]
+        return paginator, page
+
+    async def get_selected_category(self):
+        return None
+
+    async def get(self, request, *args, **kwargs):
+        self.category = await self.get_selected_category()
+        # список категорий и страница товаров не зависят друг от друга — запрашиваем их одновременно
+        categories, (paginator, page) = await asyncio.gather(
+            category_registry.aall(), self.apaginate(self.get_queryset())
+        )
+        if getattr(self, 'rendering_for_cache', False):
+            facets = {'facets_placeholder': FACETS_PLACEHOLDER}
+        else:
+            facets = {'facets': await self.aget_facets(categories)}
+        context = self.get_context_data(
+            **facets,
+            filter_params=filter_params(self.get_facet_filters()),
+            products=page.object_list,
+            object_list=page.object_list,
+            paginator=paginator,
+            page_obj=page,
+            is_paginated=page.has_other_pages(),
+            query=request.GET.get('q', ''),
+            categories=categories,
+            selected_category=self.category,
+        )
+        return self.render_to_response(context)
+
+
+class AsyncProductListView(AsyncProductPageCacheMixin, AsyncCatalogListView):
+    async def arender_page_fragments(self):
+        # при отдаче из кеша get не вызывается, категорию и фасеты определяем здесь
+        self.category = await self.get_selected_category()
+        facets = await self.aget_facets(await category_registry.aall())
+        return {FACETS_PLACEHOLDER: render_facets(facets, self.category)}
+
+
+class AsyncProductsByCategoryView(AsyncProductListView):
+    cursor_ordering = ('name', 'pk')
+
+    async def aget_page_cache_scope(self):
+        category = await category_registry.aget_by_slug_or_404(self.kwargs['slug'])
+        return f'category:{category.pk}'
+
+    async def get_selected_category(self):
+        return await category_registry.aget_by_slug_or_404(self.kwargs['slug'])
+
+    def get_queryset(self):
+        queryset = Product.objects.filter(category=self.category).order_by(*self.cursor_ordering)
+        return get_filtered_products(queryset, self.request, self.get_facet_filters())
+
+
+class AsyncProductDetailView(TemplateResponseMixin, ContextMixin, View):
+    template_name = 'shop/product_detail.html'
+
+    async def get(self, request, pk):
+        try:
+            product = await Product.objects.select_related('category').aget(pk=pk)
+        except Product.DoesNotExist:
+            raise Http404('Товар не найден')
+        neighbors = [row async for row in bought_together(product.pk)]
+        return self.render_to_response(self.get_context_data(
+            object=product, product=product, bought_together=neighbors
+        ))
+
+
+class AsyncCartView(TemplateResponseMixin, ContextMixin, View):
+    template_name = 'shop/cart.html'
+
+    async def get(self, request):
+        cart = get_cart(request)
+        cart_items = await cart.alines()
+        return self.render_to_response(self.get_context_data(
+            cart_items=cart_items,
+            total=cart.summary(cart_items)['total'],
+            order_form=OrderForm(),
+        ))
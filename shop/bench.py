@@ -0,0 +1,133 @@
+import os
+import random
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection, connections
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import Category, Order, OrderItem, Product
+from .sales import day_bounds
+
+
+@contextmanager
+def bench_database():
+    # отдельная файловая БД, чтобы бенчмарки не трогали рабочие данные и работали из нескольких потоков
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    path = None
+    if connection.vendor == 'sqlite':
+        fd, path = tempfile.mkstemp(prefix='shop_bench_', suffix='.sqlite3')
+        os.close(fd)
+        test_settings['NAME'] = path
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    # реплики (TEST MIRROR) должны смотреть в ту же тестовую базу, а не в рабочую
+    mirrors = {
+        alias: connections[alias].settings_dict['NAME']
+        for alias in connections
+        if connections[alias].settings_dict.get('TEST', {}).get('MIRROR') == connection.alias
+    }
+    for alias in mirrors:
+        connections[alias].close()
+        connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+    try:
+        yield
+    finally:
+        for alias, name in mirrors.items():
+            connections[alias].close()
+            connections[alias].settings_dict['NAME'] = name
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = old_test_name
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+def seed_catalog(products, categories=10, stock=100, batch_size=5000):
+    category_objs = Category.objects.bulk_create([
+        Category(name=f'category {i}', slug=slugify(f'category {i}')) for i in range(categories)
+    ])
+    batch = []
+    for i in range(products):
+        batch.append(Product(
+            name=f'product {i}',
+            description=f'description of product {i}',
+            category=category_objs[i % categories],
+            price=10 + i % 1000,
+            stock=stock,
+        ))
+        if len(batch) >= batch_size:
+            Product.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Product.objects.bulk_create(batch)
+    return category_objs
+
+
+def seed_orders(lines, days, lines_per_order=3, seed=0, hot_products=0, hot_share=0.0):
+    # hot_share заказов содержат один из первых hot_products товаров — хиты продаж с длинной историей
+    rng = random.Random(seed)
+    products = list(Product.objects.order_by('pk').values_list('pk', 'name', 'price'))
+    hot = products[:hot_products]
+    orders_total = max(1, lines // lines_per_order)
+    per_day = max(1, orders_total // days)
+    last_day = timezone.localdate()
+    first_day = last_day - timedelta(days=days - 1)
+    created = 0
+    day = first_day
+    while created < orders_total:
+        count = min(per_day, orders_total - created)
+        orders = Order.objects.bulk_create([
+            Order(username='bench', phone='000', address='bench') for _ in range(count)
+        ])
+        # auto_now_add не даёт задать дату при создании — переносим пачку на её день отдельным UPDATE
+        moment, _ = day_bounds(min(day, last_day))
+        Order.objects.filter(pk__gte=orders[0].pk, pk__lte=orders[-1].pk).update(
+            created_at=moment + timedelta(hours=12)
+        )
+        items = []
+        for order in orders:
+            basket = rng.sample(products, lines_per_order)
+            if hot and rng.random() < hot_share:
+                bestseller = rng.choice(hot)
+                if bestseller not in basket:
+                    basket[0] = bestseller
+            for pk, name, price in basket:
+                items.append(OrderItem(
+                    order=order, product_id=pk, product_name=name, unit_price=price, quantity=rng.randint(1, 3)
+                ))
+        OrderItem.objects.bulk_create(items, batch_size=5000)
+        created += count
+        day += timedelta(days=1)
+    return first_day, min(day - timedelta(days=1), last_day)
+
+
+def timed(func, repeat=1):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    return result, samples
+
+
+def percentile(samples, percent):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+    }
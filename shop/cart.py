@@ -0,0 +1,407 @@
+import uuid
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.sessions.backends.signed_cookies import SessionStore as SignedCookieSession
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Sum, When
+from django.db.models.functions import Now
+from django.http import Http404
+from django.utils.module_loading import import_string
+
+from .models import CartItem, Product
+from .reservations import release, reservations_enabled, reserve, reserve_many
+
+SESSION_CART_KEY = 'cart'
+CART_KEY_SESSION_KEY = 'cart_key'
+BADGE_KEY = 'shop:cartbadge'
+BADGE_TIMEOUT = 60 * 15
+CENTS = Decimal('0.01')
+# произведение — выражение, а не столбец: без output_field тип не определён, а SQLite к тому же
+# не приводит результат к двум знакам, поэтому суммы из базы дополнительно квантуем (CENTS)
+LINE_TOTAL = ExpressionWrapper(
+    F('quantity') * F('product__price'), output_field=DecimalField(max_digits=12, decimal_places=2)
+)
+
+
+def legacy_cart_key(session):
+    # до миграции 0016 корзины и резервы лежали под session_key; у серверных сессий он постоянен,
+    # поэтому сессия без cart_key продолжает свою корзину под ним — открытые корзины не теряются.
+    # у signed_cookies session_key — сама подписанная cookie, новая после каждой записи: его не берём
+    if isinstance(session, SignedCookieSession):
+        return None
+    return session.session_key
+
+
+def get_or_create_cart_key(request):
+    # строки корзины, резервы и бейдж привязаны к постоянному id в сессии, а не к session_key напрямую
+    cart_key = request.session.get(CART_KEY_SESSION_KEY)
+    if not cart_key:
+        cart_key = legacy_cart_key(request.session) or uuid.uuid4().hex
+        request.session[CART_KEY_SESSION_KEY] = cart_key
+    return cart_key
+
+
+def clamp_quantity(current, quantity, product):
+    new_quantity = min(current + quantity, product.stock)
+    if new_quantity < 1:
+        raise ValidationError('Количество товара в корзине должно быть не менее 1')
+    return new_quantity
+
+
+def reserve_quantity(cart_key, current, quantity, product):
+    # с резервами в корзину попадает только то, что удалось удержать за корзиной
+    if not reservations_enabled():
+        return clamp_quantity(current, quantity, product)
+    # как и free_room в add_many: резервируем не больше, чем поместится в строку до остатка, —
+    # в строке могут быть единицы без резерва (резерв истёк и вернулся в остаток)
+    room = min(quantity, product.stock - current)
+    new_quantity = min(current, product.stock) + (reserve(cart_key, product.pk, room) if room > 0 else 0)
+    if new_quantity < 1:
+        raise ValidationError('Товара нет в наличии')
+    return new_quantity
+
+
+def reserve_quantities(cart_key, quantities):
+    if not reservations_enabled():
+        return quantities
+    return reserve_many(cart_key, quantities)
+
+
+def free_room(products, quantities, current):
+    # сколько ещё поместится в строку, не превысив остаток; товары, которым места нет, в резерв не идут
+    room = {}
+    for product_id, quantity in quantities.items():
+        amount = min(quantity, products[product_id].stock - current.get(product_id, 0))
+        if amount > 0:
+            room[product_id] = amount
+    return room
+
+
+def release_one(cart_key, product_id):
+    if reservations_enabled():
+        release(cart_key, product_id, 1)
+
+
+def empty_summary():
+    return {'count': 0, 'total': Decimal('0.00')}
+
+
+def database_summary(summary):
+    return {'count': summary['count'] or 0, 'total': (summary['total'] or Decimal('0')).quantize(CENTS)}
+
+
+class CartLine:
+    def __init__(self, pk, product, quantity, subtotal=None):
+        self.pk = pk
+        self.product = product
+        self.quantity = quantity
+        self._subtotal = subtotal if subtotal is None else subtotal.quantize(CENTS)
+
+    def subtotal(self):
+        if self._subtotal is None:
+            return self.product.price * self.quantity
+        return self._subtotal
+
+
+class BaseCart:
+    def __init__(self, request):
+        self.request = request
+
+    @property
+    def cart_key(self):
+        # без cookie сессии Django не ходит в базу, пустая сессия просто не содержит ключа
+        return self.request.session.get(CART_KEY_SESSION_KEY) or legacy_cart_key(self.request.session)
+
+    async def acart_key(self):
+        # загруженная здесь сессия кешируется, дальше cart_key читает её без запроса к базе
+        return await self.request.session.aget(CART_KEY_SESSION_KEY) or legacy_cart_key(self.request.session)
+
+    def summary(self, lines=None):
+        if lines is None:
+            return self.aggregate()
+        return {
+            'count': sum(line.quantity for line in lines),
+            'total': sum((line.subtotal() for line in lines), Decimal('0.00')),
+        }
+
+    def aggregate(self):
+        raise NotImplementedError
+
+    @staticmethod
+    def badge_cache_key(cart_key):
+        if not cart_key:
+            return None
+        return f'{BADGE_KEY}:{cart_key}'
+
+    def badge(self):
+        key = self.badge_cache_key(self.cart_key)
+        if key is None:
+            return empty_summary()
+        badge = cache.get(key)
+        if badge is None:
+            badge = self.aggregate()
+            cache.set(key, badge, BADGE_TIMEOUT)
+        return badge
+
+    async def abadge(self):
+        key = self.badge_cache_key(await self.acart_key())
+        if key is None:
+            return empty_summary()
+        badge = await cache.aget(key)
+        if badge is None:
+            badge = await self.aaggregate()
+            await cache.aset(key, badge, BADGE_TIMEOUT)
+        return badge
+
+    async def aaggregate(self):
+        return await sync_to_async(self.aggregate)()
+
+    def invalidate_badge(self):
+        key = self.badge_cache_key(self.cart_key)
+        if key is not None:
+            cache.delete(key)
+
+    def lines(self):
+        raise NotImplementedError
+
+    async def alines(self):
+        return await sync_to_async(self.lines)()
+
+    def quantities(self):
+        raise NotImplementedError
+
+    def add(self, product, quantity):
+        raise NotImplementedError
+
+    def add_many(self, products, quantities):
+        rejected = []
+        for product_id, quantity in quantities.items():
+            try:
+                self.add(products[product_id], quantity)
+            except ValidationError:
+                rejected.append(product_id)
+        return rejected
+
+    def remove_one(self, line_id):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def is_empty(self):
+        return not self.quantities()
+
+
+class DatabaseCart(BaseCart):
+    def __init__(self, request, cart_key=None):
+        super().__init__(request)
+        self._cart_key = cart_key
+
+    @property
+    def cart_key(self):
+        return self._cart_key or super().cart_key
+
+    async def acart_key(self):
+        return self._cart_key or await super().acart_key()
+
+    def items(self):
+        # без ключа корзина заведомо пуста — не создаём сессию на простом просмотре
+        if not self.cart_key:
+            return CartItem.objects.none()
+        return CartItem.objects.filter(cart_key=self.cart_key)
+
+    def line_items(self):
+        items = self.items().select_related('product').annotate(line_total=LINE_TOTAL)
+        return items.order_by('pk')
+
+    def lines(self):
+        return [CartLine(item.pk, item.product, item.quantity, item.line_total) for item in self.line_items()]
+
+    async def alines(self):
+        await self.acart_key()
+        return [CartLine(item.pk, item.product, item.quantity, item.line_total) async for item in self.line_items()]
+
+    def aggregate(self):
+        if not self.cart_key:
+            return empty_summary()
+        return database_summary(self.items().aggregate(count=Sum('quantity'), total=Sum(LINE_TOTAL)))
+
+    async def aaggregate(self):
+        if not await self.acart_key():
+            return empty_summary()
+        return database_summary(await self.items().aaggregate(count=Sum('quantity'), total=Sum(LINE_TOTAL)))
+
+    def quantities(self):
+        return dict(self.items().values_list('product_id', 'quantity'))
+
+    def is_empty(self):
+        return not self.items().exists()
+
+    def add(self, product, quantity):
+        cart_key = self._cart_key or get_or_create_cart_key(self.request)
+        # пустая строка из get_or_create не должна пережить отказ по остатку
+        with transaction.atomic():
+            cart_item, _ = CartItem.objects.get_or_create(
+                product=product,
+                cart_key=cart_key,
+                defaults={'quantity': 0}
+            )
+            cart_item.quantity = reserve_quantity(cart_key, cart_item.quantity, quantity, product)
+            cart_item.full_clean()
+            cart_item.save()
+        self.invalidate_badge()
+
+    def add_many(self, products, quantities):
+        # один INSERT ... ON CONFLICT DO NOTHING и один UPDATE с F()-инкрементом на всю пачку
+        cart_key = self._cart_key or get_or_create_cart_key(self.request)
+        with transaction.atomic():
+            current = dict(
+                CartItem.objects.select_for_update()
+                .filter(cart_key=cart_key, product_id__in=quantities)
+                .values_list('product_id', 'quantity')
+            )
+            # строку ограничиваем остатком до резерва: всё, что зарезервировано, должно попасть в корзину,
+            # иначе излишек так и числился бы в Product.reserved до истечения резерва
+            room = free_room(products, quantities, current)
+            granted = reserve_quantities(cart_key, room)
+            rejected = [product_id for product_id in room if product_id not in granted]
+            if not granted:
+                return rejected
+            CartItem.objects.bulk_create(
+                [CartItem(cart_key=cart_key, product_id=product_id, quantity=0) for product_id in granted],
+                ignore_conflicts=True,
+            )
+            CartItem.objects.filter(cart_key=cart_key, product_id__in=granted).update(
+                quantity=Case(*(
+                    When(product_id=product_id, then=F('quantity') + amount) for product_id, amount in granted.items()
+                )),
+                updated_at=Now(),
+            )
+        self.invalidate_badge()
+        return rejected
+
+    def remove_one(self, line_id):
+        try:
+            cart_item = self.items().get(pk=line_id)
+        except CartItem.DoesNotExist:
+            raise Http404('Товар не найден в корзине')
+
+        release_one(self.cart_key, cart_item.product_id)
+        if cart_item.quantity > 1:
+            cart_item.quantity -= 1
+            cart_item.full_clean()
+            cart_item.save()
+        else:
+            cart_item.delete()
+        self.invalidate_badge()
+
+    def clear(self):
+        # вызывается после оформления заказа, резервы к этому моменту уже списаны в place_order
+        self.items().delete()
+        self.invalidate_badge()
+
+
+class SessionCart(BaseCart):
+    # строки корзины живут в сессии (с SESSION_ENGINE=signed_cookies — прямо в cookie), БД трогает только заказ
+
+    def _data(self):
+        return self.request.session.get(SESSION_CART_KEY, {})
+
+    def _save(self, data):
+        self.request.session[SESSION_CART_KEY] = data
+
+    async def _adata(self):
+        return await self.request.session.aget(SESSION_CART_KEY, {})
+
+    @staticmethod
+    def _quantities(data):
+        return {int(product_id): quantity for product_id, quantity in data.items()}
+
+    @staticmethod
+    def _lines(quantities, products):
+        return [
+            CartLine(product_id, products[product_id], quantity)
+            for product_id, quantity in quantities.items()
+            if product_id in products
+        ]
+
+    @staticmethod
+    def _summary(quantities, prices):
+        return {
+            'count': sum(quantities.values()),
+            'total': sum((price * quantities[pk] for pk, price in prices), Decimal('0.00')),
+        }
+
+    def quantities(self):
+        return self._quantities(self._data())
+
+    def lines(self):
+        quantities = self.quantities()
+        return self._lines(quantities, Product.objects.in_bulk(list(quantities)))
+
+    async def alines(self):
+        quantities = self._quantities(await self._adata())
+        return self._lines(quantities, await Product.objects.ain_bulk(list(quantities)))
+
+    def aggregate(self):
+        quantities = self.quantities()
+        if not quantities:
+            return empty_summary()
+        return self._summary(quantities, Product.objects.filter(pk__in=quantities).values_list('pk', 'price'))
+
+    async def aaggregate(self):
+        quantities = self._quantities(await self._adata())
+        if not quantities:
+            return empty_summary()
+        prices = [row async for row in Product.objects.filter(pk__in=quantities).values_list('pk', 'price')]
+        return self._summary(quantities, prices)
+
+    def add(self, product, quantity):
+        data = self._data()
+        cart_key = get_or_create_cart_key(self.request)
+        data[str(product.pk)] = reserve_quantity(cart_key, data.get(str(product.pk), 0), quantity, product)
+        self._save(data)
+        self.invalidate_badge()
+
+    def add_many(self, products, quantities):
+        data = self._data()
+        cart_key = get_or_create_cart_key(self.request)
+        if reservations_enabled():
+            room = free_room(products, quantities, self._quantities(data))
+            granted = reserve_quantities(cart_key, room)
+            for product_id, quantity in granted.items():
+                data[str(product_id)] = data.get(str(product_id), 0) + quantity
+            rejected = [product_id for product_id in room if product_id not in granted]
+        else:
+            for product_id, quantity in quantities.items():
+                data[str(product_id)] = clamp_quantity(data.get(str(product_id), 0), quantity, products[product_id])
+            rejected = []
+        self._save(data)
+        self.invalidate_badge()
+        return rejected
+
+    def remove_one(self, line_id):
+        data = self._data()
+        key = str(line_id)
+        if key not in data:
+            raise Http404('Товар не найден в корзине')
+        release_one(self.cart_key, line_id)
+        if data[key] > 1:
+            data[key] -= 1
+        else:
+            del data[key]
+        self._save(data)
+        self.invalidate_badge()
+
+    def clear(self):
+        self.request.session.pop(SESSION_CART_KEY, None)
+        self.invalidate_badge()
+
+
+def get_cart(request):
+    cart_class = import_string(getattr(settings, 'SHOP_CART_BACKEND', 'shop.cart.DatabaseCart'))
+    return cart_class(request)
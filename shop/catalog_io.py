@@ -0,0 +1,182 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .categories import bump_categories_version
+from .models import Category, Product
+from .page_cache import bump_generations
+
+FIELDS = ['name', 'description', 'category', 'category_slug', 'price', 'stock', 'image']
+PRODUCT_UPDATE_FIELDS = ['description', 'price', 'stock', 'image', 'image_digest', 'updated_at']
+
+
+def detect_format(path, explicit=None):
+    if explicit:
+        return explicit
+    return 'csv' if str(path).lower().endswith('.csv') else 'jsonl'
+
+
+def read_records(stream, fmt):
+    # вместе с записью отдаём номер строки, чтобы ошибки импорта указывали, где искать
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f'строка {number}: некорректный JSON ({e})')
+        yield number, record
+
+
+def parse_record(number, record):
+    try:
+        return {
+            'name': record['name'],
+            'description': record.get('description') or '',
+            'category': record['category'],
+            'category_slug': record.get('category_slug') or slugify(record['category']),
+            'price': Decimal(str(record['price'])),
+            'stock': int(record.get('stock') or 0),
+            'image': record.get('image') or '',
+        }
+    except KeyError as e:
+        raise ValueError(f'строка {number}: нет поля {e}')
+    except (ValueError, TypeError, InvalidOperation):
+        raise ValueError(f'строка {number}: некорректная цена или остаток')
+
+
+def write_records(stream, records, fmt):
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=FIELDS)
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            yield record
+        return
+    for record in records:
+        stream.write(json.dumps(record, ensure_ascii=False, default=str))
+        stream.write('\n')
+        yield record
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def export_records(queryset=None, chunk_size=2000):
+    queryset = queryset if queryset is not None else Product.objects.all()
+    rows = queryset.order_by('pk').values_list(
+        'name', 'description', 'category__name', 'category__slug', 'price', 'stock', 'image'
+    )
+    for name, description, category, category_slug, price, stock, image in rows.iterator(chunk_size=chunk_size):
+        yield {
+            'name': name,
+            'description': description or '',
+            'category': category,
+            'category_slug': category_slug,
+            'price': str(price),
+            'stock': stock,
+            'image': image,
+        }
+
+
+class CatalogImporter:
+    def __init__(self, batch_size=2000):
+        self.batch_size = batch_size
+        # категорий мало, поэтому slug → id держим в памяти на весь импорт
+        self.category_ids = dict(Category.objects.values_list('slug', 'id'))
+        self.created = 0
+        self.updated = 0
+        self.categories_created = 0
+        self.touched_categories = set()
+
+    def run(self, records):
+        records = (parse_record(number, record) for number, record in records)
+        for batch in batched(records, self.batch_size):
+            with transaction.atomic():
+                self.import_batch(batch)
+            yield len(batch)
+
+        if self.categories_created:
+            bump_categories_version()
+        bump_generations(self.touched_categories)
+
+    def ensure_categories(self, batch):
+        missing = {}
+        for record in batch:
+            slug = record['category_slug']
+            if slug not in self.category_ids:
+                missing[slug] = Category(name=record['category'], slug=slug)
+        if missing:
+            # bulk_create обходит Category.save, поэтому slug считаем сами выше
+            Category.objects.bulk_create(missing.values(), ignore_conflicts=True)
+            self.category_ids.update(Category.objects.filter(slug__in=missing).values_list('slug', 'id'))
+            conflicts = [slug for slug in missing if slug not in self.category_ids]
+            if conflicts:
+                raise ValueError(f'Категории с таким названием уже существуют под другим slug: {", ".join(conflicts)}')
+            self.categories_created += len(missing)
+
+    def import_batch(self, batch):
+        self.ensure_categories(batch)
+        now = timezone.now()
+
+        products = {}
+        for record in batch:
+            category_id = self.category_ids[record['category_slug']]
+            products[(category_id, record['name'])] = Product(
+                name=record['name'],
+                description=record['description'],
+                category_id=category_id,
+                price=record['price'],
+                stock=record['stock'],
+                image=record['image'],
+                updated_at=now,
+            )
+
+        # естественный ключ товара — (категория, название)
+        existing = Product.objects.filter(
+            category_id__in={key[0] for key in products}, name__in={key[1] for key in products}
+        ).values_list('category_id', 'name', 'pk', 'image', 'image_digest')
+        to_update = []
+        for category_id, name, pk, image, image_digest in existing:
+            product = products.pop((category_id, name), None)
+            if product is not None:
+                product.pk = pk
+                # нарезанные варианты относятся к старой картинке: при смене image их заново сделает process_images
+                product.image_digest = image_digest if product.image == image else ''
+                to_update.append(product)
+
+        # обновления идут одним INSERT ... ON CONFLICT(id) DO UPDATE: bulk_update строил бы CASE на каждую строку пачки
+        Product.objects.bulk_create(
+            [*to_update, *products.values()],
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=PRODUCT_UPDATE_FIELDS,
+        )
+
+        self.updated += len(to_update)
+        self.created += len(products)
+        self.touched_categories.update(key[0] for key in products)
+        self.touched_categories.update(product.category_id for product in to_update)
+
+
+def peak_memory_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # на Linux ru_maxrss в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
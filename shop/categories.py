@@ -0,0 +1,101 @@
+import time
+
+from django.core.cache import cache
+from django.http import Http404
+
+from .models import Category
+
+VERSION_KEY = 'shop:categories:version'
+DATA_KEY = 'shop:categories:data'
+DATA_TIMEOUT = 60 * 60
+
+
+def get_categories_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # после вытеснения ключа начинаем с нового значения, а не с 1, чтобы воркеры не приняли старые данные за свежие
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def aget_categories_version():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, time.time_ns(), None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def bump_categories_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+
+
+class CategoryRegistry:
+    def __init__(self):
+        self._state = (None, [], {})
+
+    def _current_state(self, version):
+        # состояние читаем один раз: другой поток может подменить его между проверкой и возвратом
+        state = self._state
+        if state[0] == version and version is not None:
+            return state
+        return None
+
+    def _set_state(self, version, categories):
+        state = (version, categories, {category.slug: category for category in categories})
+        self._state = state
+        return state
+
+    def _load(self):
+        version = get_categories_version()
+        state = self._current_state(version)
+        if state is not None:
+            return state
+
+        key = f'{DATA_KEY}:{version}'
+        categories = cache.get(key)
+        if categories is None:
+            categories = list(Category.objects.order_by('name'))
+            cache.set(key, categories, DATA_TIMEOUT)
+        return self._set_state(version, categories)
+
+    async def _aload(self):
+        version = await aget_categories_version()
+        state = self._current_state(version)
+        if state is not None:
+            return state
+
+        key = f'{DATA_KEY}:{version}'
+        categories = await cache.aget(key)
+        if categories is None:
+            categories = [category async for category in Category.objects.order_by('name')]
+            await cache.aset(key, categories, DATA_TIMEOUT)
+        return self._set_state(version, categories)
+
+    def all(self):
+        return self._load()[1]
+
+    def get_by_slug(self, slug):
+        return self._load()[2].get(slug)
+
+    def get_by_slug_or_404(self, slug):
+        category = self.get_by_slug(slug)
+        if category is None:
+            raise Http404('Категория не найдена')
+        return category
+
+    async def aall(self):
+        return (await self._aload())[1]
+
+    async def aget_by_slug_or_404(self, slug):
+        category = (await self._aload())[2].get(slug)
+        if category is None:
+            raise Http404('Категория не найдена')
+        return category
+
+
+category_registry = CategoryRegistry()
@@ -0,0 +1,72 @@
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.db.models.functions import Now
+
+from .models import Product, Order, OrderItem
+from .page_cache import bump_generations
+from .reservations import take_held
+from .taskqueue import enqueue
+
+
+@transaction.atomic
+def place_order(cart, order_data):
+    lines = cart.quantities()
+    if not lines:
+        raise ValidationError('Корзина пуста')
+
+    # резервы корзины переходят в заказ; чего не удержано (резервы выключены или уже вернулись в остаток),
+    # берётся из свободного остатка stock - reserved
+    held = take_held(cart.cart_key, list(lines))
+
+    # условное списание без блокировки строки товара: строка обновится, только если после списания
+    # stock не станет меньше оставшихся чужих резервов
+    condition = reduce(or_, (
+        Q(pk=pk, stock__gte=F('reserved') + quantity - held.get(pk, 0)) for pk, quantity in lines.items()
+    ))
+    changes = {
+        'stock': Case(*(When(pk=pk, then=F('stock') - quantity) for pk, quantity in lines.items()), default=F('stock')),
+        'updated_at': Now(),
+    }
+    if held:
+        changes['reserved'] = Case(
+            *(When(pk=pk, then=F('reserved') - quantity) for pk, quantity in held.items()), default=F('reserved')
+        )
+    updated = Product.objects.filter(condition).update(**changes)
+    if updated != len(lines):
+        short = Product.objects.filter(pk__in=lines).exclude(condition).values_list('name', flat=True)
+        raise ValidationError(f'Недостаточно товара на складе: {", ".join(short)}')
+
+    # снимок названия и цены на момент покупки: история заказов не зависит от последующих правок каталога
+    products = {
+        pk: (name, price, category_id)
+        for pk, name, price, category_id in Product.objects.filter(pk__in=lines).values_list(
+            'pk', 'name', 'price', 'category_id'
+        )
+    }
+    items = [
+        OrderItem(product_id=pk, product_name=products[pk][0], unit_price=products[pk][1], quantity=quantity)
+        for pk, quantity in lines.items()
+    ]
+    order = Order.objects.create(
+        **order_data,
+        total=sum((item.subtotal() for item in items), Decimal('0.00')),
+        item_count=sum(lines.values()),
+    )
+    for item in items:
+        item.order = order
+    OrderItem.objects.bulk_create(items)
+    cart.clear()
+    # некритичная работа уходит в очередь и ставится только после коммита: покупатель её не ждёт,
+    # ключ идемпотентности не даст посчитать заказ в сводках и рекомендациях дважды
+    enqueue('sales.record_order', {'order_id': order.pk}, key=f'sales:order:{order.pk}')
+    enqueue('recommendations.record_order', {'product_ids': list(lines)}, key=f'recommendations:order:{order.pk}')
+    enqueue('stock.low_stock_alert', {'product_ids': list(lines)}, key=f'stock:order:{order.pk}')
+    # update() обходит сигналы, поэтому кеш страниц с изменившимся остатком сбрасываем вручную
+    category_ids = {row[2] for row in products.values()}
+    transaction.on_commit(lambda: bump_generations(category_ids))
+    return order
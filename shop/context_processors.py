@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from .cart import get_cart
+
+
+def cart_badge(request):
+    # лениво: запрос к кешу/БД делается, только если шаблон действительно выводит бейдж
+    return {'cart_badge': SimpleLazyObject(lambda: get_cart(request).badge())}
@@ -0,0 +1,56 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# каталог читается с реплики, всё остальное (корзины, резервы, заказы, сессии) живёт на основной базе
+CATALOG_MODELS = {'shop.product', 'shop.category', 'shop.productneighbor'}
+
+use_primary = ContextVar('shop_use_primary', default=False)
+
+
+@contextmanager
+def pin_to_primary():
+    token = use_primary.set(True)
+    try:
+        yield
+    finally:
+        use_primary.reset(token)
+
+
+def replica_aliases():
+    return getattr(settings, 'SHOP_DATABASE_REPLICAS', [])
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if not replicas or model._meta.label_lower not in CATALOG_MODELS:
+            return DEFAULT_DB_ALIAS
+        # свои записи сессия читает с основной базы: пока идёт транзакция и сразу после записи (см. middleware)
+        if use_primary.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики — копии основной базы, связи между их объектами допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    # connection_created: настраиваем каждое новое соединение SQLite
+    if connection.vendor != 'sqlite':
+        return
+    # прямо через sqlite3, мимо execute_wrappers: служебные запросы не попадают в метрики и счётчики запросов
+    for name, value in getattr(settings, 'SHOP_SQLITE_PRAGMAS', {}).items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+    if connection.alias in replica_aliases():
+        connection.connection.execute('PRAGMA query_only = ON')
@@ -0,0 +1,159 @@
+import hashlib
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, CharField, Count, Value, When
+from django.http import QueryDict
+from django.template.loader import render_to_string
+
+from .models import Product
+from .page_cache import ALL_PRODUCTS, aget_generation, get_generation
+from .search import search_products
+
+FACETS_KEY = 'shop:facets'
+DEFAULT_PRICE_BUCKETS = (100, 500, 1000, 5000)
+
+# как и CSRF-токен с бейджем корзины, блок фасетов подставляется в закешированную страницу при отдаче:
+# страница категории кешируется по своей генерации, а счётчики зависят от всего каталога
+FACETS_PLACEHOLDER = '__shop_page_cache_facets__'
+
+
+def facet_cache_timeout():
+    return getattr(settings, 'SHOP_FACET_CACHE_TIMEOUT', 300)
+
+
+def price_buckets():
+    # границы из настроек превращаются в полуинтервалы [low, high): '-100', '100-500', ..., '5000-'
+    edges = [None, *getattr(settings, 'SHOP_PRICE_BUCKETS', DEFAULT_PRICE_BUCKETS), None]
+    buckets = []
+    for low, high in zip(edges, edges[1:]):
+        if low is None:
+            label = f'до {high} сом'
+        elif high is None:
+            label = f'от {low} сом'
+        else:
+            label = f'{low}–{high} сом'
+        buckets.append({'key': f'{low or ""}-{high or ""}', 'low': low, 'high': high, 'label': label})
+    return buckets
+
+
+def normalize_query(query):
+    return ' '.join((query or '').split()).casefold()
+
+
+def parse_filters(params, category_id=None):
+    price = params.get('price')
+    return {
+        'q': normalize_query(params.get('q')),
+        'category': category_id,
+        'price': price if price in {bucket['key'] for bucket in price_buckets()} else None,
+        # по умолчанию, как и раньше, только товары в наличии
+        'in_stock': params.get('in_stock') != '0',
+    }
+
+
+def filter_params(filters):
+    # нормализованная строка запроса: из неё строятся ссылки, посторонние параметры в кеш страницы не попадают
+    params = QueryDict(mutable=True)
+    if filters['q']:
+        params['q'] = filters['q']
+    if filters['price']:
+        params['price'] = filters['price']
+    if not filters['in_stock']:
+        params['in_stock'] = '0'
+    return params
+
+
+def apply_filters(queryset, filters):
+    if filters['in_stock']:
+        queryset = queryset.filter(stock__gte=1)
+    if filters['price']:
+        bucket = next(bucket for bucket in price_buckets() if bucket['key'] == filters['price'])
+        if bucket['low'] is not None:
+            queryset = queryset.filter(price__gte=bucket['low'])
+        if bucket['high'] is not None:
+            queryset = queryset.filter(price__lt=bucket['high'])
+    return queryset
+
+
+def grid_queryset(query):
+    # один GROUP BY по (категория, ценовой интервал, наличие) для текущего поиска: из этой сетки
+    # считаются все фасеты при любом выборе фильтров, без COUNT на каждую категорию
+    queryset = Product.objects.all()
+    if query:
+        queryset = search_products(queryset, query)
+    bucket = Case(
+        *(When(price__lt=b['high'], then=Value(b['key'])) for b in price_buckets() if b['high'] is not None),
+        default=Value(price_buckets()[-1]['key']),
+        output_field=CharField(),
+    )
+    available = Case(When(stock__gte=1, then=Value(True)), default=Value(False), output_field=BooleanField())
+    return (
+        queryset.annotate(bucket=bucket, available=available)
+        .values_list('category_id', 'bucket', 'available')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+
+
+def grid_cache_key(query, generation):
+    digest = hashlib.md5(query.encode(), usedforsecurity=False).hexdigest()
+    return f'{FACETS_KEY}:{generation}:{digest}'
+
+
+def facet_grid(query):
+    # сетка зависит только от поиска, выбранные фильтры применяются к ней в памяти;
+    # любое изменение товаров поднимает общую генерацию страниц и делает ключ устаревшим
+    key = grid_cache_key(query, get_generation(ALL_PRODUCTS))
+    grid = cache.get(key)
+    if grid is None:
+        grid = list(grid_queryset(query))
+        cache.set(key, grid, facet_cache_timeout())
+    return grid
+
+
+async def afacet_grid(query):
+    key = grid_cache_key(query, await aget_generation(ALL_PRODUCTS))
+    grid = await cache.aget(key)
+    if grid is None:
+        grid = [row async for row in grid_queryset(query)]
+        await cache.aset(key, grid, facet_cache_timeout())
+    return grid
+
+
+def build_facets(grid, filters, categories):
+    # счётчик каждого фасета учитывает все остальные выбранные фильтры, кроме своего
+    by_category = Counter()
+    by_price = Counter()
+    by_stock = Counter()
+    for category_id, bucket, available, count in grid:
+        category_ok = filters['category'] is None or category_id == filters['category']
+        price_ok = filters['price'] is None or bucket == filters['price']
+        stock_ok = available or not filters['in_stock']
+        if price_ok and stock_ok:
+            by_category[category_id] += count
+        if category_ok and stock_ok:
+            by_price[bucket] += count
+        if category_ok and price_ok:
+            by_stock[available] += count
+    return {
+        'params': filter_params(filters),
+        'total': sum(by_category.values()),
+        'categories': [
+            {'category': category, 'count': by_category[category.pk], 'selected': category.pk == filters['category']}
+            for category in categories
+        ],
+        'prices': [
+            {**bucket, 'count': by_price[bucket['key']], 'selected': bucket['key'] == filters['price']}
+            for bucket in price_buckets()
+        ],
+        'in_stock': filters['in_stock'],
+        'in_stock_count': by_stock[True],
+        'all_count': by_stock[True] + by_stock[False],
+    }
+
+
+def render_facets(facets, selected_category):
+    # ссылки строятся из facets.params, request шаблону не нужен — рендер без контекст-процессоров
+    return render_to_string('shop/facets.html', {'facets': facets, 'selected_category': selected_category})
@@ -1,15 +1,37 @@
 from django import forms
+from .images import ImageProcessingError, ingest_upload, pillow_available
 from .models import Product, Category
 
 
 class ProductForm(forms.ModelForm):
     stock = forms.IntegerField(min_value=0, label='Остаток')
     price = forms.DecimalField(max_digits=7, decimal_places=2, label='Цена')
+    image_file = forms.FileField(required=False, label='Загрузить изображение')
 
     class Meta:
         model = Product
         fields = ['name', 'description', 'category', 'price', 'stock', 'image']
 
+    def clean_image_file(self):
+        image_file = self.cleaned_data.get('image_file')
+        if not image_file:
+            return None
+        if not pillow_available():
+            raise forms.ValidationError('Обработка изображений недоступна: не установлен Pillow')
+        try:
+            self.image_digest = ingest_upload(image_file)
+        except ImageProcessingError as e:
+            raise forms.ValidationError(str(e))
+        return image_file
+
+    def save(self, commit=True):
+        if getattr(self, 'image_digest', None):
+            self.instance.image_digest = self.image_digest
+        elif 'image' in self.changed_data:
+            # новый URL — старые варианты к нему не относятся, до process_images показываем URL как есть
+            self.instance.image_digest = ''
+        return super().save(commit)
+
 
 class CategoryForm(forms.ModelForm):
     class Meta:
@@ -30,3 +52,18 @@ class OrderForm(forms.Form):
     username = forms.CharField(max_length=150, label='Имя', required=True)
     phone = forms.CharField(max_length=30, label='Телефон', required=True)
     address = forms.CharField(max_length=500, label='Адрес', required=True, widget=forms.Textarea(attrs={'rows': 2}))
+
+
+class SalesReportForm(forms.Form):
+    start = forms.DateField(required=False, label='С', widget=forms.DateInput(attrs={'type': 'date'}))
+    end = forms.DateField(required=False, label='По', widget=forms.DateInput(attrs={'type': 'date'}))
+    by = forms.ChoiceField(
+        required=False, label='Группировка', choices=[('category', 'Категории'), ('product', 'Товары')]
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end and start > end:
+            raise forms.ValidationError('Начало периода позже конца')
+        return cleaned_data
@@ -0,0 +1,174 @@
+import hashlib
+import io
+import os
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
+
+try:
+    from PIL import Image, ImageOps, UnidentifiedImageError
+except ImportError:
+    Image = ImageOps = UnidentifiedImageError = None
+
+# имя варианта -> наибольшая сторона в пикселях
+DEFAULT_SIZES = {'thumb': 160, 'card': 400, 'full': 1200}
+DEFAULT_FORMATS = ('webp', 'jpeg')
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+SAVE_OPTIONS = {
+    'webp': {'quality': 80, 'method': 4},
+    'jpeg': {'quality': 82, 'optimize': True, 'progressive': True},
+}
+FETCH_TIMEOUT = 15
+
+
+class ImageProcessingError(Exception):
+    pass
+
+
+def pillow_available():
+    return Image is not None
+
+
+def image_root():
+    return Path(getattr(settings, 'SHOP_IMAGE_ROOT', Path(settings.MEDIA_ROOT) / 'thumbs'))
+
+
+def image_url():
+    return getattr(settings, 'SHOP_IMAGE_URL', f'{settings.MEDIA_URL}thumbs/')
+
+
+def image_sizes():
+    return getattr(settings, 'SHOP_IMAGE_SIZES', DEFAULT_SIZES)
+
+
+def image_formats():
+    return getattr(settings, 'SHOP_IMAGE_FORMATS', DEFAULT_FORMATS)
+
+
+def max_source_bytes():
+    return getattr(settings, 'SHOP_IMAGE_MAX_BYTES', 20 * 1024 * 1024)
+
+
+def fetch_remote_enabled():
+    return getattr(settings, 'SHOP_IMAGE_FETCH_REMOTE', False)
+
+
+def content_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def variant_path(digest, size, fmt):
+    # кеш адресуется содержимым: одинаковые картинки разных товаров обрабатываются и хранятся один раз
+    return f'{digest[:2]}/{digest}/{size}.{EXTENSIONS[fmt]}'
+
+
+def variant_url(digest, size, fmt):
+    return f'{image_url()}{variant_path(digest, size, fmt)}'
+
+
+def pipeline_options():
+    # всё, что нужно воркеру, передаём явно: процессы пула не поднимают Django
+    return {
+        'root': str(image_root()),
+        'sizes': dict(image_sizes()),
+        'formats': tuple(image_formats()),
+        'max_bytes': max_source_bytes(),
+    }
+
+
+def render_variants(data, options):
+    if Image is None:
+        raise ImproperlyConfigured('Для обработки изображений нужен Pillow')
+    digest = content_digest(data)
+    root = Path(options['root'])
+    targets = {
+        (name, fmt): root / variant_path(digest, name, fmt)
+        for name in options['sizes']
+        for fmt in options['formats']
+    }
+    if all(path.exists() for path in targets.values()):
+        return digest, False
+
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            source = ImageOps.exif_transpose(source)
+            source = source.convert('RGB')
+            for (name, fmt), path in targets.items():
+                if path.exists():
+                    continue
+                variant = source.copy()
+                # thumbnail только уменьшает и сохраняет пропорции
+                variant.thumbnail((options['sizes'][name], options['sizes'][name]), Image.Resampling.LANCZOS)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                # пишем во временный файл и переименовываем, чтобы параллельный воркер не увидел половину файла
+                tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+                variant.save(tmp_path, format=fmt.upper(), **SAVE_OPTIONS[fmt])
+                os.replace(tmp_path, path)
+    except UnidentifiedImageError as e:
+        raise ImageProcessingError('Файл не является изображением') from e
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageProcessingError(f'Не удалось обработать изображение: {e}') from e
+    return digest, True
+
+
+def read_source(source, max_bytes):
+    if urlparse(source).scheme in ('http', 'https'):
+        request = Request(source, headers={'User-Agent': 'shop-image-pipeline'})
+        with urlopen(request, timeout=FETCH_TIMEOUT) as response:
+            data = response.read(max_bytes + 1)
+    else:
+        with open(source, 'rb') as stream:
+            data = stream.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ImageProcessingError(f'Изображение больше {max_bytes} байт')
+    return data
+
+
+def process_source(product_id, source, options):
+    # точка входа воркера ProcessPoolExecutor: скачать или прочитать файл и нарезать варианты
+    start = time.perf_counter()
+    try:
+        data = read_source(source, options['max_bytes'])
+        digest, created = render_variants(data, options)
+    except (OSError, ImageProcessingError, ImproperlyConfigured) as e:
+        return product_id, None, False, str(e), time.perf_counter() - start
+    return product_id, digest, created, None, time.perf_counter() - start
+
+
+def resolve_source(image, allow_remote=False):
+    # Product.image — либо URL, либо путь: /static/... ищем через finders, /media/... в MEDIA_ROOT;
+    # остальные пути не читаем, иначе через поле товара можно вытащить любой файл сервера
+    if not image:
+        return None
+    parsed = urlparse(image)
+    if parsed.scheme in ('http', 'https'):
+        return image if allow_remote else None
+    if parsed.scheme or parsed.netloc:
+        return None
+    path = parsed.path
+    static_url = '/' + settings.STATIC_URL.lstrip('/')
+    media_url = '/' + settings.MEDIA_URL.lstrip('/')
+    if path.startswith(static_url):
+        try:
+            return finders.find(path[len(static_url):])
+        except SuspiciousFileOperation:
+            return None
+    if path.startswith(media_url):
+        root = Path(settings.MEDIA_ROOT).resolve()
+        candidate = (root / path[len(media_url):]).resolve()
+        return str(candidate) if candidate.is_relative_to(root) and candidate.is_file() else None
+    return None
+
+
+def ingest_upload(uploaded_file):
+    # загрузка из формы — одна картинка, режем прямо в запросе без пула
+    data = b''.join(uploaded_file.chunks())
+    if len(data) > max_source_bytes():
+        raise ImageProcessingError(f'Изображение больше {max_source_bytes()} байт')
+    digest, _ = render_variants(data, pipeline_options())
+    return digest
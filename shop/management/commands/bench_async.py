@@ -0,0 +1,102 @@
+import asyncio
+import importlib
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import clear_url_caches, reverse
+
+from shop.bench import bench_database, seed_catalog, summarize
+
+
+def reload_urlconf():
+    # маршруты выбираются по SHOP_ASYNC_VIEWS при импорте urls.py
+    import shop.urls
+    import shop_project.urls
+    importlib.reload(shop.urls)
+    importlib.reload(shop_project.urls)
+    clear_url_caches()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает sync- и async-представления витрины и корзины под ASGI при высокой конкурентности: '
+        'задержки и пропускная способность'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 100])
+        parser.add_argument('--page-cache', action='store_true', help='Не выключать кеш страниц витрины')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        try:
+            with bench_database():
+                categories = seed_catalog(options['products'])
+                paths = self.build_paths(categories, options)
+                timeout = None if options['page_cache'] else 0
+                for concurrency in options['concurrency']:
+                    for async_views in (False, True):
+                        overrides = {'SHOP_ASYNC_VIEWS': async_views}
+                        if timeout is not None:
+                            overrides['SHOP_PAGE_CACHE_TIMEOUT'] = timeout
+                        with override_settings(**overrides):
+                            reload_urlconf()
+                            stats = asyncio.run(self.run(paths, concurrency))
+                        label = 'async' if async_views else 'sync'
+                        self.stdout.write(
+                            f'{label:<5} concurrency={concurrency:<4} rps={stats["throughput_rps"]:<8} '
+                            f'p50={stats["p50_ms"]}ms p95={stats["p95_ms"]}ms p99={stats["p99_ms"]}ms '
+                            f'errors={stats["errors"]}'
+                        )
+        finally:
+            reload_urlconf()
+            teardown_test_environment()
+
+    def build_paths(self, categories, options):
+        rng = random.Random(0)
+        pages = max(1, options['products'] // 5)
+        paths = []
+        for _ in range(options['requests']):
+            kind = rng.random()
+            if kind < 0.4:
+                paths.append(f'{reverse("products")}?page={rng.randint(1, min(pages, 50))}')
+            elif kind < 0.6:
+                paths.append(reverse('products_by_category', kwargs={'slug': rng.choice(categories).slug}))
+            elif kind < 0.9:
+                paths.append(reverse('product_detail', kwargs={'pk': rng.randint(1, options['products'])}))
+            else:
+                paths.append(reverse('cart'))
+        return paths
+
+    async def run(self, paths, concurrency):
+        queue = asyncio.Queue()
+        for path in paths:
+            queue.put_nowait(path)
+        samples = []
+        errors = 0
+
+        async def worker():
+            nonlocal errors
+            # AsyncClient проходит через ASGIHandler, как запрос от ASGI-сервера, только без сокета
+            client = AsyncClient(raise_request_exception=False)
+            while not queue.empty():
+                path = queue.get_nowait()
+                start = time.perf_counter()
+                response = await client.get(path)
+                samples.append(time.perf_counter() - start)
+                if response.status_code >= 500:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+
+        stats = summarize(samples)
+        stats['throughput_rps'] = round(len(samples) / wall, 1) if wall else 0.0
+        stats['errors'] = errors
+        return stats
@@ -0,0 +1,77 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from shop.bench import bench_database, seed_catalog
+from shop.models import Order, Product
+
+BACKENDS = ['shop.cart.DatabaseCart', 'shop.cart.SessionCart']
+ORDER_DATA = {'username': 'bench', 'phone': '000', 'address': 'bench'}
+
+
+class Command(BaseCommand):
+    help = 'Прогоняет один и тот же сценарий корзины на всех бэкендах, сверяет результат и сравнивает запросы и время'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=50)
+        parser.add_argument('--lines', type=int, default=5)
+        parser.add_argument('--checkout-every', type=int, default=10, help='Каждая N-я корзина оформляется в заказ')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        results = {}
+        try:
+            for backend in BACKENDS:
+                with bench_database(), override_settings(SHOP_CART_BACKEND=backend):
+                    seed_catalog(options['lines'] * 4, stock=10 ** 6)
+                    results[backend] = self.run_scenario(options)
+        finally:
+            teardown_test_environment()
+
+        for backend, result in results.items():
+            self.stdout.write(
+                f'{backend:<26} queries={result["queries"]:<6} writes={result["writes"]:<6} '
+                f'time={result["time"]:.2f}s orders={result["orders"]}'
+            )
+        states = {backend: (result['orders'], result['stock'], result['carts']) for backend, result in results.items()}
+        if any(state != states[BACKENDS[0]] for state in states.values()):
+            raise CommandError(f'Бэкенды корзины ведут себя по-разному: {states}')
+        self.stdout.write(self.style.SUCCESS('Результаты бэкендов совпадают'))
+
+    def run_scenario(self, options):
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        carts = []
+        queries = writes = 0
+        start = time.perf_counter()
+        for index in range(options['sessions']):
+            client = Client()
+            with CaptureQueriesContext(connection) as ctx:
+                client.get(reverse('cart'))
+                for line in range(options['lines']):
+                    pk = product_ids[(index + line) % len(product_ids)]
+                    client.post(reverse('add_to_cart', args=[pk]), {'quantity': 2})
+                response = client.get(reverse('cart'))
+                first_line = response.context['cart_items'][0]
+                client.post(reverse('remove_from_cart', args=[first_line.pk]))
+                response = client.get(reverse('cart'))
+                if index % options['checkout_every'] == 0:
+                    client.post(reverse('order_create'), ORDER_DATA)
+                    response = client.get(reverse('cart'))
+            carts.append(sorted((line.product.pk, line.quantity) for line in response.context['cart_items']))
+            queries += len(ctx.captured_queries)
+            writes += sum(
+                1 for query in ctx.captured_queries
+                if query['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))
+            )
+        return {
+            'queries': queries,
+            'writes': writes,
+            'time': time.perf_counter() - start,
+            'orders': Order.objects.count(),
+            'stock': sum(Product.objects.values_list('stock', flat=True)),
+            'carts': carts,
+        }
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from shop.bench import bench_database, seed_catalog, summarize, timed
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк JSON API каталога: скорость сериализации больших страниц и ответы 304'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=50_000)
+        parser.add_argument('--page-sizes', type=int, nargs='+', default=[100, 1000, 5000])
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        try:
+            with bench_database(), override_settings(SHOP_API_MAX_PAGE_SIZE=max(options['page_sizes'])):
+                seed_catalog(options['products'])
+                self.run(options)
+        finally:
+            teardown_test_environment()
+
+    def run(self, options):
+        client = Client()
+        url = reverse('api_products')
+        for page_size in options['page_sizes']:
+            params = {'page_size': page_size}
+            response, samples = timed(lambda: client.get(url, params), options['repeat'])
+            stats = summarize(samples)
+            rows = len(response.json()['results'])
+            rows_per_second = rows / (stats['p50_ms'] / 1000) if stats['p50_ms'] else 0
+            self.stdout.write(
+                f'200 page_size={page_size:<6} bytes={len(response.content):<9} '
+                f'p50={stats["p50_ms"]}ms rows/s={rows_per_second:.0f}'
+            )
+
+            etag = response['ETag']
+            not_modified, samples = timed(lambda: client.get(url, params, HTTP_IF_NONE_MATCH=etag), options['repeat'])
+            stats = summarize(samples)
+            self.stdout.write(f'{not_modified.status_code} page_size={page_size:<6} p50={stats["p50_ms"]}ms')
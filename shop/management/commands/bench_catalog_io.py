@@ -0,0 +1,61 @@
+import json
+import os
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from shop.bench import bench_database
+from shop.catalog_io import peak_memory_mb
+
+
+def generate_records(products, categories):
+    for i in range(products):
+        yield {
+            'name': f'product {i}',
+            'description': f'description of product {i}',
+            'category': f'category {i % categories}',
+            'price': f'{10 + i % 1000}.00',
+            'stock': i % 50,
+            'image': '',
+        }
+
+
+class Command(BaseCommand):
+    help = 'Генерирует большой JSONL-файл каталога и замеряет импорт, повторный импорт (обновление) и экспорт'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1_000_000)
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp(prefix='shop_catalog_')
+        source = os.path.join(directory, 'catalog.jsonl')
+        exported = os.path.join(directory, 'export.jsonl')
+
+        start = time.perf_counter()
+        with open(source, 'w', encoding='utf-8') as stream:
+            for record in generate_records(options['products'], options['categories']):
+                stream.write(json.dumps(record))
+                stream.write('\n')
+        self.stdout.write(f'Сгенерировано {options["products"]} записей за {time.perf_counter() - start:.2f} с')
+
+        try:
+            with bench_database():
+                self.stdout.write('Импорт в пустую базу:')
+                call_command('import_catalog', source, batch_size=options['batch_size'], stdout=self.stdout)
+                self.stdout.write('Повторный импорт (только обновления):')
+                call_command('import_catalog', source, batch_size=options['batch_size'], stdout=self.stdout)
+                self.stdout.write('Экспорт:')
+                call_command('export_catalog', exported, stderr=self.stdout)
+        finally:
+            for path in (source, exported):
+                if os.path.exists(path):
+                    os.remove(path)
+            os.rmdir(directory)
+
+        memory = peak_memory_mb()
+        if memory:
+            self.stdout.write(f'Пик памяти процесса: {memory:.0f} МБ')
@@ -0,0 +1,85 @@
+import threading
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.test.utils import CaptureQueriesContext
+
+from shop.bench import bench_database, seed_catalog
+from shop.cart import DatabaseCart
+from shop.checkout import place_order
+from shop.models import CartItem, Product
+
+ORDER_DATA = {'username': 'bench', 'phone': '000', 'address': 'bench'}
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк оформления заказа: число запросов от размера корзины и продажа горячего товара из нескольких потоков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[1, 5, 30, 100])
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--attempts', type=int, default=25, help='Попыток заказа на один поток')
+        parser.add_argument('--stock', type=int, default=100, help='Остаток горячего товара')
+
+    def handle(self, *args, **options):
+        with bench_database():
+            seed_catalog(products=max(options['lines']) + 1, stock=10 ** 6)
+            self.bench_query_count(options['lines'])
+            self.bench_concurrency(options['workers'], options['attempts'], options['stock'])
+
+    def bench_query_count(self, line_counts):
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        for lines in line_counts:
+            cart_key = f'lines-{lines}'
+            CartItem.objects.bulk_create([
+                CartItem(product_id=pk, quantity=1, cart_key=cart_key) for pk in product_ids[:lines]
+            ])
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                place_order(DatabaseCart(None, cart_key=cart_key), ORDER_DATA)
+                elapsed = time.perf_counter() - start
+            self.stdout.write(f'lines={lines:<5} queries={len(ctx.captured_queries):<3} time={elapsed * 1000:.2f}ms')
+
+    def bench_concurrency(self, workers, attempts, stock):
+        hot = Product.objects.order_by('-pk').first()
+        Product.objects.filter(pk=hot.pk).update(stock=stock)
+        results = {'ok': 0, 'rejected': 0, 'locked': 0}
+        lock = threading.Lock()
+
+        def worker(index):
+            try:
+                for attempt in range(attempts):
+                    cart_key = f'hot-{index}-{attempt}'
+                    CartItem.objects.create(product_id=hot.pk, quantity=1, cart_key=cart_key)
+                    try:
+                        place_order(DatabaseCart(None, cart_key=cart_key), ORDER_DATA)
+                        outcome = 'ok'
+                    except ValidationError:
+                        outcome = 'rejected'
+                    except OperationalError:
+                        outcome = 'locked'
+                    with lock:
+                        results[outcome] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        final_stock = Product.objects.get(pk=hot.pk).stock
+        oversold = final_stock < 0 or stock - final_stock != results['ok']
+        self.stdout.write(
+            f'workers={workers} ok={results["ok"]} rejected={results["rejected"]} locked={results["locked"]} '
+            f'final_stock={final_stock} orders/s={results["ok"] / elapsed:.1f}'
+        )
+        if oversold:
+            self.stderr.write('ОШИБКА: остаток не сходится с числом заказов')
+        else:
+            self.stdout.write(self.style.SUCCESS('Перепродаж нет'))
@@ -0,0 +1,119 @@
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connections
+from django.test.utils import override_settings
+
+from shop.bench import bench_database, seed_catalog, summarize
+from shop.cart import DatabaseCart
+from shop.models import Product
+
+# настройки «до»: журнал отката, синхронная запись, отложенные транзакции, соединение на запрос, без реплики
+BASELINE = {
+    'pragmas': {'journal_mode': 'DELETE', 'synchronous': 'FULL'},
+    'replicas': [],
+    'conn_max_age': 0,
+    'options': {'timeout': 5},
+}
+
+
+class Command(BaseCommand):
+    help = 'Смешанная нагрузка чтения каталога и записи в корзину: пропускная способность до и после настройки SQLite'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=20_000)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        with bench_database():
+            seed_catalog(options['products'], stock=10 ** 6)
+            tuned = self.current_profile()
+            for label, profile in (('before', BASELINE), ('after', tuned)):
+                with self.profile(profile):
+                    self.report(label, self.run(options))
+
+    def current_profile(self):
+        default = connections.settings['default']
+        return {
+            'pragmas': getattr(settings, 'SHOP_SQLITE_PRAGMAS', {}),
+            'replicas': getattr(settings, 'SHOP_DATABASE_REPLICAS', []),
+            'conn_max_age': default.get('CONN_MAX_AGE', 0),
+            'options': dict(default.get('OPTIONS', {})),
+        }
+
+    def profile(self, profile):
+        # соединения читают settings_dict при открытии, поэтому меняем его на месте и закрываем текущие
+        connections.close_all()
+        for alias in connections:
+            settings_dict = connections.settings[alias]
+            settings_dict['CONN_MAX_AGE'] = profile['conn_max_age']
+            options = dict(profile['options'])
+            if alias != 'default':
+                options.pop('transaction_mode', None)
+            settings_dict['OPTIONS'] = options
+        return override_settings(SHOP_SQLITE_PRAGMAS=profile['pragmas'], SHOP_DATABASE_REPLICAS=profile['replicas'])
+
+    def run(self, options):
+        product_ids = list(Product.objects.values_list('pk', flat=True))
+        products = Product.objects.in_bulk(random.Random(0).sample(product_ids, 200))
+        pages = max(1, len(product_ids) // 20)
+        deadline = time.perf_counter() + options['seconds']
+        samples = defaultdict(list)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+
+        def reader(index):
+            rng = random.Random(index)
+            while time.perf_counter() < deadline:
+                offset = rng.randrange(min(pages, 50)) * 20
+                yield 'read', lambda: list(
+                    Product.objects.filter(stock__gte=1).select_related('category')
+                    .order_by('category__name', 'name', 'pk')[offset:offset + 20]
+                )
+
+        def writer(index):
+            rng = random.Random(1000 + index)
+            cart = DatabaseCart(None, cart_key=f'bench-db-{index}')
+            while time.perf_counter() < deadline:
+                product = products[rng.choice(list(products))]
+                yield 'write', lambda: cart.add(product, 1)
+
+        def worker(operations):
+            try:
+                for kind, operation in operations:
+                    start = time.perf_counter()
+                    try:
+                        operation()
+                    except OperationalError:
+                        with lock:
+                            errors[kind] += 1
+                    else:
+                        with lock:
+                            samples[kind].append(time.perf_counter() - start)
+                    # граница «запроса»: при CONN_MAX_AGE=0 соединение закрывается, как после ответа
+                    close_old_connections()
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(reader(i),)) for i in range(options['readers'])]
+        threads += [threading.Thread(target=worker, args=(writer(i),)) for i in range(options['writers'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+        return {kind: (summarize(samples[kind]), len(samples[kind]) / wall, errors[kind]) for kind in ('read', 'write')}
+
+    def report(self, label, results):
+        for kind, (stats, rate, errors) in results.items():
+            self.stdout.write(
+                f'{label:<6} {kind:<5} ops/s={rate:<8.1f} p50={stats["p50_ms"]}ms p95={stats["p95_ms"]}ms '
+                f'p99={stats["p99_ms"]}ms errors={errors}'
+            )
@@ -0,0 +1,115 @@
+import itertools
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count
+
+from shop.bench import bench_database, seed_catalog, seed_orders, summarize, timed
+from shop.catalog_io import peak_memory_mb
+from shop.models import OrderItem, Product
+from shop.recommendations import (
+    BACKENDS, bought_together, build_neighbors, numpy_available, order_rows, rebuild, record_order
+)
+
+HOT_PRODUCTS = 10
+
+
+def raw_bought_together(product_id, limit):
+    # то, как соседей пришлось бы считать на каждый просмотр: self-join позиций заказов по всей истории
+    orders = OrderItem.objects.filter(product_id=product_id).values('order_id')
+    return (
+        OrderItem.objects.filter(order_id__in=orders, product__isnull=False)
+        .exclude(product_id=product_id)
+        .values('product_id')
+        .annotate(score=Count('pk'))
+        .order_by('-score', 'product_id')[:limit]
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Рекомендации «с этим товаром покупают»: время и память сборки на миллионе позиций заказов '
+        '(numpy против чистого Python), инкрементальное обновление и выборка для страницы товара'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=1_000_000, help='Сколько позиций заказов сгенерировать')
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--lines-per-order', type=int, default=3)
+        parser.add_argument('--chunk-size', type=int, default=100_000)
+        parser.add_argument('--hot-share', type=float, default=0.2, help='Доля заказов с одним из десяти хитов продаж')
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        with bench_database():
+            seed_catalog(options['products'])
+            start = time.perf_counter()
+            seed_orders(
+                options['lines'], 30, options['lines_per_order'],
+                hot_products=HOT_PRODUCTS, hot_share=options['hot_share'],
+            )
+            self.stdout.write(f'Сгенерировано позиций: {options["lines"]} за {time.perf_counter() - start:.1f} с')
+
+            _, samples = timed(lambda: sum(1 for _ in order_rows(options['chunk_size'])))
+            self.stdout.write(f'чтение позиций из базы (входит в каждую сборку): {samples[0]:.2f} с')
+
+            backends = [backend for backend in BACKENDS if backend != 'numpy' or numpy_available()]
+            results = {}
+            for backend in backends:
+                results[backend], samples = timed(lambda: list(build_neighbors(backend, options['chunk_size'])))
+                # память — отдельным прогоном: tracemalloc заметно замедляет чистый Python
+                tracemalloc.start()
+                list(build_neighbors(backend, options['chunk_size']))
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.stdout.write(
+                    f'сборка {backend:<6} {samples[0]:.2f} с, пик памяти {peak / 1024 / 1024:.1f} МБ, '
+                    f'соседей: {len(results[backend])}'
+                )
+            if len(results) > 1:
+                self.stdout.write(f'numpy и python совпадают: {results["numpy"] == results["python"]}')
+            if not numpy_available():
+                self.stdout.write('numpy не установлен — только чистый Python')
+
+            _, samples = timed(lambda: rebuild(chunk_size=options['chunk_size']))
+            self.stdout.write(
+                f'rebuild_recommendations целиком: {samples[0]:.2f} с, RSS процесса {peak_memory_mb():.0f} МБ'
+            )
+
+            product_ids = list(Product.objects.values_list('pk', flat=True)[:options['repeat']])
+            size = options['lines_per_order']
+            baskets = [product_ids[i:i + size] for i in range(0, len(product_ids), size)]
+            _, samples = timed(lambda: record_order(baskets.pop()), len(baskets))
+            self.stdout.write(f'инкрементальное обновление на заказ: {summarize(samples)}')
+
+            # SQL отдельно от ORM: компиляция queryset стоит около миллисекунды на любой запрос
+            products = Product.objects.order_by('pk')
+            cases = {
+                'хит продаж': list(products.values_list('pk', flat=True)[:HOT_PRODUCTS]),
+                'обычный товар': list(products.values_list('pk', flat=True)[HOT_PRODUCTS:HOT_PRODUCTS + 50]),
+            }
+            for label, ids in cases.items():
+                raw_p50 = self.sql_p50(lambda pk: raw_bought_together(pk, 8), ids, options['repeat'])
+                table_p50 = self.sql_p50(lambda pk: bought_together(pk), ids, options['repeat'])
+                self.stdout.write(
+                    f'{label:<14} self-join SQL p50={raw_p50}ms  ProductNeighbor SQL p50={table_p50}ms  '
+                    f'x{raw_p50 / table_p50 if table_p50 else 0:.0f}'
+                )
+            ids = itertools.cycle(cases['обычный товар'])
+            _, samples = timed(lambda: list(bought_together(next(ids))), options['repeat'])
+            self.stdout.write(f'bought_together через ORM: p50={summarize(samples)["p50_ms"]}ms')
+
+    def sql_p50(self, make_queryset, ids, repeat):
+        queries = [make_queryset(pk) for pk in ids]
+        compiled = [queryset.query.sql_with_params() for queryset in queries]
+        connection = connections[queries[0].db]
+        samples = []
+        with connection.cursor() as cursor:
+            for sql, params in itertools.islice(itertools.cycle(compiled), repeat):
+                start = time.perf_counter()
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                samples.append(time.perf_counter() - start)
+        return summarize(samples)['p50_ms']
@@ -0,0 +1,118 @@
+import threading
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.db.models import Sum
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from shop.bench import bench_database, seed_catalog
+from shop.cart import DatabaseCart
+from shop.checkout import place_order
+from shop.models import CartItem, OrderItem, Product, StockReservation
+from shop.reservations import release_expired
+
+ORDER_DATA = {'username': 'bench', 'phone': '000', 'address': 'bench'}
+RETRIES = 50
+
+
+class Command(BaseCommand):
+    help = (
+        'Стресс-тест горячего товара: параллельные «в корзину + оформить» с резервами и без, '
+        'проверка отсутствия перепродаж и возврата истёкших резервов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--attempts', type=int, default=25, help='Покупок на один поток')
+        parser.add_argument('--stock', type=int, default=100, help='Остаток горячего товара')
+        parser.add_argument(
+            '--abandon-every', type=int, default=5,
+            help='Каждая N-я корзина бросается без оформления и держит резерв до истечения',
+        )
+
+    def handle(self, *args, **options):
+        with bench_database():
+            seed_catalog(products=10, stock=0)
+            hot = Product.objects.order_by('pk').first()
+            failed = False
+            for label, ttl in (('direct', 0), ('reservations', 900)):
+                with override_settings(SHOP_STOCK_RESERVATION_TTL=ttl):
+                    failed |= not self.run_mode(label, hot.pk, options)
+            if failed:
+                self.stderr.write('ОШИБКА: остатки не сходятся')
+            else:
+                self.stdout.write(self.style.SUCCESS('Перепродаж нет, резервы сходятся со счётчиком'))
+
+    def run_mode(self, label, product_id, options):
+        CartItem.objects.all().delete()
+        OrderItem.objects.all().delete()
+        StockReservation.objects.all().delete()
+        Product.objects.filter(pk=product_id).update(stock=options['stock'], reserved=0)
+        product = Product.objects.get(pk=product_id)
+        results = {'ok': 0, 'rejected': 0, 'abandoned': 0, 'locked': 0, 'retries': 0}
+        lock = threading.Lock()
+
+        def with_retries(func):
+            # SQLite отвечает «database is locked» конкурентным писателям — клиент повторяет с паузой
+            for retry in range(RETRIES):
+                try:
+                    return func()
+                except OperationalError:
+                    with lock:
+                        results['retries'] += 1
+                    time.sleep(0.002 * (retry + 1))
+            raise OperationalError('database is locked')
+
+        def worker(index):
+            try:
+                for attempt in range(options['attempts']):
+                    cart = DatabaseCart(None, cart_key=f'{label}-{index}-{attempt}')
+                    try:
+                        with_retries(lambda: cart.add(product, 1))
+                        if options['abandon_every'] and attempt % options['abandon_every'] == 0:
+                            outcome = 'abandoned'
+                        else:
+                            with_retries(lambda: place_order(cart, ORDER_DATA))
+                            outcome = 'ok'
+                    except ValidationError:
+                        outcome = 'rejected'
+                    except OperationalError:
+                        outcome = 'locked'
+                    with lock:
+                        results[outcome] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['workers'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        product.refresh_from_db()
+        sold = OrderItem.objects.filter(product_id=product_id).aggregate(total=Sum('quantity'))['total'] or 0
+        held = StockReservation.objects.filter(product_id=product_id).aggregate(total=Sum('quantity'))['total'] or 0
+        consistent = (
+            product.stock >= 0
+            and product.stock >= product.reserved
+            and options['stock'] - product.stock == sold
+            and product.reserved == held
+        )
+        self.stdout.write(
+            f'{label}: ok={results["ok"]} rejected={results["rejected"]} abandoned={results["abandoned"]} '
+            f'locked={results["locked"]} retries={results["retries"]} stock={product.stock} reserved={product.reserved} '
+            f'orders/s={results["ok"] / elapsed:.1f}'
+        )
+
+        # брошенные корзины: резервы истекают и возвращаются в свободный остаток
+        StockReservation.objects.update(expires_at=timezone.now())
+        while release_expired():
+            pass
+        product.refresh_from_db()
+        self.stdout.write(f'{label}: после возврата истёкших резервов stock={product.stock} reserved={product.reserved}')
+        return consistent and product.reserved == 0
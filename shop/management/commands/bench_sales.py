@@ -0,0 +1,79 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import DecimalField, F, Max, Sum
+
+from shop.bench import bench_database, seed_catalog, seed_orders, summarize, timed
+from shop.models import OrderItem
+from shop.sales import category_report, day_bounds, product_report, rebuild
+
+REVENUE = Sum(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def raw_product_report(start, end, limit):
+    # то, как отчёт считался бы без сводок: позиции ⋈ заказы за весь период
+    first, _ = day_bounds(start)
+    _, last = day_bounds(end)
+    return list(
+        OrderItem.objects.filter(order__created_at__gte=first, order__created_at__lt=last)
+        .values('product_id')
+        .annotate(name=Max('product_name'), units=Sum('quantity'), revenue=REVENUE)
+        .order_by('-revenue', 'product_id')[:limit]
+    )
+
+
+def raw_category_report(start, end, limit):
+    first, _ = day_bounds(start)
+    _, last = day_bounds(end)
+    return list(
+        OrderItem.objects.filter(order__created_at__gte=first, order__created_at__lt=last)
+        .values('product__category_id')
+        .annotate(name=Max('product__category__name'), units=Sum('quantity'), revenue=REVENUE)
+        .order_by('-revenue', 'product__category_id')[:limit]
+    )
+
+
+class Command(BaseCommand):
+    help = 'Отчёт о продажах: дневные сводки против join по позициям заказов на миллионах строк'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=1_000_000, help='Сколько позиций заказов сгенерировать')
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--lines-per-order', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with bench_database():
+            seed_catalog(options['products'])
+            start = time.perf_counter()
+            first_day, last_day = seed_orders(options['lines'], options['days'], options['lines_per_order'])
+            self.stdout.write(f'Сгенерировано позиций: {options["lines"]} за {time.perf_counter() - start:.1f} с')
+
+            _, samples = timed(lambda: sum(1 for _ in rebuild()))
+            self.stdout.write(f'rebuild_sales: {samples[0]:.2f} с на {options["days"]} дней')
+
+            periods = {
+                'последние 7 дней': (last_day - timedelta(days=6), last_day),
+                'весь период': (first_day, last_day),
+            }
+            reports = {
+                'товары': (raw_product_report, product_report),
+                'категории': (raw_category_report, category_report),
+            }
+            for period, (start_day, end_day) in periods.items():
+                for label, (raw, rollup) in reports.items():
+                    raw_rows, raw_samples = timed(lambda: raw(start_day, end_day, 20), options['repeat'])
+                    rollup_rows, rollup_samples = timed(
+                        lambda: list(rollup(start_day, end_day, 20)), options['repeat']
+                    )
+                    raw_p50 = summarize(raw_samples)['p50_ms']
+                    rollup_p50 = summarize(rollup_samples)['p50_ms']
+                    same = [(r['units'], r['revenue']) for r in raw_rows] == [
+                        (r['units'], r['revenue']) for r in rollup_rows
+                    ]
+                    self.stdout.write(
+                        f'{period:<17} {label:<10} join p50={raw_p50}ms  сводки p50={rollup_p50}ms  '
+                        f'x{raw_p50 / rollup_p50 if rollup_p50 else 0:.0f}  совпадают={same}'
+                    )
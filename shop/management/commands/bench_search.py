@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from shop.bench import bench_database, seed_catalog, summarize, timed
+from shop.models import Product
+from shop.search import search_fts, search_like
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает поиск через FTS5 с поиском через LIKE на большом каталоге'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=5)
+        parser.add_argument('--queries', nargs='+', default=['product 4242', 'description', '99999', 'missing'])
+
+    def handle(self, *args, **options):
+        with bench_database():
+            seed_catalog(options['products'])
+            base = Product.objects.filter(stock__gte=1).order_by('category__name', 'name')
+            size = options['page_size']
+            for query in options['queries']:
+                for label, search in (('like', search_like), ('fts', search_fts)):
+                    queryset = search(base, query)
+
+                    def run():
+                        return queryset.count(), list(queryset[:size])
+
+                    (count, _), samples = timed(run, options['repeat'])
+                    stats = summarize(samples)
+                    self.stdout.write(
+                        f'{label:<4} q={query!r:<16} found={count:<7} '
+                        f'p50={stats["p50_ms"]}ms p95={stats["p95_ms"]}ms'
+                    )
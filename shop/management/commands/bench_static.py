@@ -0,0 +1,108 @@
+import os
+import re
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from shop.bench import bench_database, seed_catalog
+from shop.staticfiles import COMPRESSIBLE_EXTENSIONS, brotli_available, compress_files
+
+ASSET_RE = re.compile(r'(?:src|href)="([^"]+)"')
+
+
+class Command(BaseCommand):
+    help = (
+        'Статика до и после: байты на первый просмотр страницы и число запросов к статике при повторном, '
+        'плюс время сжатия при collectstatic в один и несколько потоков'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        root = tempfile.mkdtemp(prefix='shop_static_')
+        setup_test_environment()
+        try:
+            with override_settings(STATIC_ROOT=root, DEBUG=False), bench_database():
+                seed_catalog(50)
+                User.objects.create_superuser('bench', 'bench@example.com', 'bench')
+
+                start = time.perf_counter()
+                call_command('collectstatic', interactive=False, verbosity=0)
+                self.stdout.write(
+                    f'collectstatic: {time.perf_counter() - start:.2f} с, brotli: {"да" if brotli_available() else "нет"}'
+                )
+                self.bench_compression(Path(root), options['workers'])
+
+                staff = Client()
+                staff.login(username='bench', password='bench')
+                pages = [
+                    ('products', Client(), reverse('products')),
+                    ('admin login', Client(), reverse('admin:login')),
+                    ('admin products', staff, reverse('admin:shop_product_changelist')),
+                ]
+                for label, client, url in pages:
+                    self.bench_page(client, label, url)
+        finally:
+            teardown_test_environment()
+            shutil.rmtree(root, ignore_errors=True)
+
+    def bench_compression(self, root, workers):
+        paths = [
+            path for path in root.rglob('*')
+            if path.is_file() and path.suffix.lower() in COMPRESSIBLE_EXTENSIONS
+        ]
+        size = sum(path.stat().st_size for path in paths)
+        for count in sorted({1, workers}):
+            start = time.perf_counter()
+            compressed = sum(len(written) for _, written in compress_files(paths, workers=count))
+            self.stdout.write(
+                f'сжатие {len(paths)} файлов ({size / 1024:.0f} КБ) в {count} потоках: '
+                f'{time.perf_counter() - start:.2f} с, вариантов: {compressed}'
+            )
+
+    def bench_page(self, client, label, url):
+        response = client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        html = response.content.decode()
+        static_prefix = '/' + staticfiles_storage.base_url.lstrip('/')
+        urls = sorted({match for match in ASSET_RE.findall(html) if match.startswith(static_prefix)})
+        external = sorted({match for match in ASSET_RE.findall(html) if match.startswith(('http://', 'https://'))})
+        originals = {hashed: original for original, hashed in staticfiles_storage.hashed_files.items()}
+
+        # до: имена без хеша, без сжатия, без Cache-Control — повторный просмотр перепроверяет каждый файл
+        before_bytes = 0
+        for asset_url in urls:
+            name = asset_url[len(static_prefix):]
+            plain = client.get(static_prefix + originals.get(name, name), HTTP_ACCEPT_ENCODING='identity')
+            before_bytes += self.body_size(plain)
+
+        # после: хешированные имена, готовые .br/.gz, immutable — повторный просмотр в сеть за ними не ходит
+        after_bytes = 0
+        revalidated = 0
+        encodings = set()
+        for asset_url in urls:
+            asset = client.get(asset_url, HTTP_ACCEPT_ENCODING='gzip, br')
+            after_bytes += self.body_size(asset)
+            encodings.add(asset.get('Content-Encoding', 'identity'))
+            if 'immutable' not in asset.get('Cache-Control', ''):
+                revalidated += 1
+
+        self.stdout.write(
+            f'{label:<15} статика: {len(urls)} файлов, внешние: {len(external)} | '
+            f'первый просмотр {before_bytes / 1024:.1f} КБ -> {after_bytes / 1024:.1f} КБ '
+            f'({", ".join(sorted(encodings))}) | запросов к статике при повторном: {len(urls)} -> {revalidated}'
+        )
+
+    def body_size(self, response):
+        if response.streaming:
+            return sum(len(chunk) for chunk in response.streaming_content)
+        return len(response.content)
@@ -0,0 +1,35 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.catalog_io import detect_format, export_records, peak_memory_mb, write_records
+
+
+class Command(BaseCommand):
+    help = 'Потоковый экспорт каталога в JSON Lines или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл JSONL/CSV или - для stdout')
+        parser.add_argument('--format', choices=['jsonl', 'csv'])
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        fmt = detect_format(options['path'], options['format'])
+        to_stdout = options['path'] == '-'
+        stream = sys.stdout if to_stdout else open(options['path'], 'w', encoding='utf-8', newline='')
+        start = time.perf_counter()
+        total = 0
+        try:
+            for _ in write_records(stream, export_records(chunk_size=options['chunk_size']), fmt):
+                total += 1
+        finally:
+            if not to_stdout:
+                stream.close()
+
+        elapsed = time.perf_counter() - start
+        memory = peak_memory_mb()
+        self.stderr.write(
+            f'Экспортировано товаров: {total} за {elapsed:.2f} с, {total / elapsed if elapsed else 0:.0f} записей/с'
+            + (f', пик памяти {memory:.0f} МБ' if memory else '')
+        )
@@ -0,0 +1,57 @@
+import sys
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from shop.catalog_io import detect_format, peak_memory_mb
+from shop.models import Order
+from shop.order_export import iter_records
+
+
+def parse_date(value):
+    try:
+        return timezone.make_aware(datetime.fromisoformat(value))
+    except ValueError:
+        raise CommandError(f'Некорректная дата: {value}')
+
+
+class Command(BaseCommand):
+    help = 'Потоковый экспорт заказов: CSV по строке на позицию или JSON Lines по объекту на заказ'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл CSV/JSONL или - для stdout')
+        parser.add_argument('--format', choices=['jsonl', 'csv'])
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--since', help='Заказы начиная с даты (ISO 8601)')
+        parser.add_argument('--until', help='Заказы до даты (ISO 8601)')
+
+    def handle(self, *args, **options):
+        fmt = detect_format(options['path'], options['format'])
+        orders = None
+        if options['since'] or options['until']:
+            orders = Order.objects.all()
+            if options['since']:
+                orders = orders.filter(created_at__gte=parse_date(options['since']))
+            if options['until']:
+                orders = orders.filter(created_at__lt=parse_date(options['until']))
+
+        to_stdout = options['path'] == '-'
+        stream = sys.stdout if to_stdout else open(options['path'], 'w', encoding='utf-8', newline='')
+        start = time.perf_counter()
+        total = 0
+        try:
+            for record in iter_records(fmt, orders, options['chunk_size']):
+                stream.write(record)
+                total += 1
+        finally:
+            if not to_stdout:
+                stream.close()
+
+        elapsed = time.perf_counter() - start
+        memory = peak_memory_mb()
+        self.stderr.write(
+            f'Экспортировано записей: {total} за {elapsed:.2f} с, {total / elapsed if elapsed else 0:.0f} записей/с'
+            + (f', пик памяти {memory:.0f} МБ' if memory else '')
+        )
@@ -0,0 +1,84 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from shop.models import CartItem, StockReservation
+from shop.reservations import release_carts, release_expired
+
+
+class Command(BaseCommand):
+    help = (
+        'Возвращает в остаток истёкшие резервы, удаляет брошенные корзины и истёкшие сессии '
+        'небольшими пачками, не блокируя запись надолго'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age', type=int, default=settings.SESSION_COOKIE_AGE,
+            help='Сколько секунд корзину не меняли (ни одну её строку), чтобы она считалась брошенной',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0.05, help='Пауза между пачками, секунд')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, ничего не удалять')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        cutoff = now - timedelta(seconds=options['max_age'])
+        # брошена корзина целиком: старые строки корзины, которую недавно меняли, не трогаем.
+        # обе выборки идут по индексу updated_at, без GROUP BY по всей таблице
+        carts = (
+            CartItem.objects.filter(updated_at__lt=cutoff)
+            .exclude(cart_key__in=CartItem.objects.filter(updated_at__gte=cutoff).values('cart_key'))
+            .values_list('cart_key', flat=True)
+            .order_by('cart_key')
+            .distinct()
+        )
+        sessions = Session.objects.filter(expire_date__lt=now)
+        reservations = StockReservation.objects.filter(expires_at__lte=now)
+
+        if options['dry_run']:
+            self.stdout.write(
+                f'Будет возвращено резервов: {reservations.count()}, '
+                f'удалено корзин: {carts.count()}, сессий: {sessions.count()}'
+            )
+            return
+
+        self.release_reservations(options)
+        self.purge('корзин', CartItem, carts, 'cart_key', options, release_carts)
+        self.purge('сессий', Session, sessions.order_by('expire_date'), 'session_key', options)
+
+    def release_reservations(self, options):
+        released = 0
+        while True:
+            batch = release_expired(batch_size=options['batch_size'])
+            if not batch:
+                break
+            released += batch
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Возвращено в остаток истёкших резервов: {released}'))
+
+    def purge(self, label, model, queryset, key_field, options, release=None):
+        deleted = 0
+        start = time.perf_counter()
+        while True:
+            # каждая пачка — отдельная короткая транзакция по индексу, между пачками даём поработать другим писателям
+            with transaction.atomic():
+                keys = list(queryset.values_list(key_field, flat=True)[:options['batch_size']])
+                if not keys:
+                    break
+                model.objects.filter(**{f'{key_field}__in': keys}).delete()
+                if release is not None:
+                    release(keys)
+            deleted += len(keys)
+            if options['pause']:
+                time.sleep(options['pause'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено {label}: {deleted} за {elapsed:.2f} с ({deleted / elapsed if elapsed else 0:.0f} в секунду)'
+        ))
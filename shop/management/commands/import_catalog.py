@@ -0,0 +1,41 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.catalog_io import CatalogImporter, detect_format, peak_memory_mb, read_records
+
+
+class Command(BaseCommand):
+    help = 'Потоковый импорт каталога из JSON Lines или CSV: категории по slug, товары по (категория, название)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл JSONL/CSV или - для stdin')
+        parser.add_argument('--format', choices=['jsonl', 'csv'])
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        fmt = detect_format(options['path'], options['format'])
+        stream = sys.stdin if options['path'] == '-' else open(options['path'], encoding='utf-8', newline='')
+        importer = CatalogImporter(batch_size=options['batch_size'])
+        start = time.perf_counter()
+        total = 0
+        try:
+            for count in importer.run(read_records(stream, fmt)):
+                total += count
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{total} записей, {total / (time.perf_counter() - start):.0f} записей/с')
+        except (ValueError, KeyError) as e:
+            raise CommandError(f'Ошибка в записи после {total} импортированных: {e}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.perf_counter() - start
+        memory = peak_memory_mb()
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано записей: {total} (создано {importer.created}, обновлено {importer.updated}, '
+            f'новых категорий {importer.categories_created}) за {elapsed:.2f} с, '
+            f'{total / elapsed if elapsed else 0:.0f} записей/с'
+            + (f', пик памяти {memory:.0f} МБ' if memory else '')
+        ))
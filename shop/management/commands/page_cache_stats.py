@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from shop.page_cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает статистику попаданий в кеш страниц каталога'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Обнулить счётчики после вывода')
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        self.stdout.write(
+            f'hits={stats["hits"]} misses={stats["misses"]} hit_ratio={stats["hit_ratio"]:.1%}'
+        )
+        if options['reset']:
+            reset_stats()
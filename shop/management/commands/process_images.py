@@ -0,0 +1,81 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.images import fetch_remote_enabled, pillow_available, pipeline_options, process_source, resolve_source
+from shop.models import Product
+from shop.page_cache import bump_generations
+
+
+class Command(BaseCommand):
+    help = (
+        'Нарезает варианты изображений товаров (WebP/JPEG нескольких размеров) в пуле процессов '
+        'и сохраняет их в кеш по хешу содержимого'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--force', action='store_true', help='Обработать и товары, у которых варианты уже есть')
+        parser.add_argument('--fetch-remote', action='store_true', help='Скачивать изображения по http(s) при выключенном SHOP_IMAGE_FETCH_REMOTE')
+        parser.add_argument('--skip-remote', action='store_true', help='Не скачивать изображения по http(s)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Сколько image_digest сохранять за раз')
+
+    def handle(self, *args, **options):
+        if not pillow_available():
+            raise CommandError('Для обработки изображений нужен Pillow: pip install Pillow')
+
+        products = Product.objects.exclude(image='').order_by('pk')
+        if not options['force']:
+            products = products.filter(image_digest='')
+
+        allow_remote = (options['fetch_remote'] or fetch_remote_enabled()) and not options['skip_remote']
+        jobs = []
+        skipped = 0
+        for product_id, image in products.values_list('pk', 'image').iterator():
+            source = resolve_source(image, allow_remote=allow_remote)
+            if source is None:
+                skipped += 1
+            else:
+                jobs.append((product_id, source))
+        if not jobs:
+            self.stdout.write(f'Нечего обрабатывать (пропущено без доступного источника: {skipped})')
+            return
+
+        options_for_workers = pipeline_options()
+        digests = {}
+        created = failed = 0
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = [pool.submit(process_source, pk, source, options_for_workers) for pk, source in jobs]
+            for future in as_completed(futures):
+                product_id, digest, was_created, error, _ = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f'Товар #{product_id}: {error}')
+                    continue
+                created += was_created
+                digests[product_id] = digest
+                if len(digests) >= options['batch_size']:
+                    self.save_digests(digests)
+        self.save_digests(digests)
+        elapsed = time.perf_counter() - start
+
+        processed = len(jobs) - failed
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано {processed} изображений (новых в кеше: {created}, ошибок: {failed}, '
+            f'пропущено: {skipped}) за {elapsed:.2f} с — {processed / elapsed if elapsed else 0:.1f} изобр./с '
+            f'на {options["workers"]} процессах'
+        ))
+
+    def save_digests(self, digests):
+        if not digests:
+            return
+        products = [Product(pk=pk, image_digest=digest) for pk, digest in digests.items()]
+        Product.objects.bulk_update(products, ['image_digest'])
+        # bulk_update обходит сигналы, поэтому кеш страниц сбрасываем сами
+        bump_generations(set(
+            Product.objects.filter(pk__in=digests).values_list('category_id', flat=True)
+        ))
+        digests.clear()
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.recommendations import BACKENDS, numpy_available, rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает «с этим товаром покупают» из истории заказов: матрица совместных покупок '
+        'пачками (векторно при установленном numpy) и top-K соседей каждого товара в ProductNeighbor'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', choices=BACKENDS, help='По умолчанию numpy, если установлен')
+        parser.add_argument('--chunk-size', type=int, default=100_000, help='Сколько позиций заказов в пачке')
+
+    def handle(self, *args, **options):
+        backend = options['backend'] or ('numpy' if numpy_available() else 'python')
+        if backend == 'numpy' and not numpy_available():
+            raise CommandError('numpy не установлен, используйте --backend python')
+        start = time.perf_counter()
+        rows = rebuild(backend, options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано соседей: {rows} ({backend}) за {time.perf_counter() - start:.2f} с'
+        ))
@@ -0,0 +1,34 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.sales import rebuild
+
+
+def parse_day(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Некорректная дата: {value}')
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневные сводки продаж по товарам и категориям из заказов, по одному дню за транзакцию'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=parse_day, help='Первый день (YYYY-MM-DD), по умолчанию — день первого заказа')
+        parser.add_argument('--end', type=parse_day, help='Последний день (YYYY-MM-DD), по умолчанию — день последнего заказа')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        days = units = 0
+        for day, day_units in rebuild(options['start'], options['end']):
+            days += 1
+            units += day_units
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{day}: {day_units} шт.')
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано дней: {days}, продано единиц: {units} за {elapsed:.2f} с'
+        ))
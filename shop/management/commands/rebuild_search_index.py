@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from shop.models import Product
+from shop.search import install_fts, uninstall_fts
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс товаров (SQLite FTS5)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recreate', action='store_true', help='Удалить таблицу индекса и триггеры и создать заново')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Полнотекстовый индекс поддерживается только для SQLite')
+
+        start = time.perf_counter()
+        with transaction.atomic():
+            if options['recreate']:
+                uninstall_fts(connection)
+            install_fts(connection)
+        elapsed = time.perf_counter() - start
+
+        count = Product.objects.count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано товаров: {count} за {elapsed:.2f} с ({count / elapsed if elapsed else 0:.0f} товаров/с)'
+        ))
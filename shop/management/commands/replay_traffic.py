@@ -0,0 +1,202 @@
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import Resolver404, resolve
+
+from shop.bench import bench_database, seed_catalog, summarize
+
+
+def load_sessions(path):
+    sessions = defaultdict(list)
+    with open(path, encoding='utf-8') as stream:
+        for index, line in enumerate(stream):
+            if line.strip():
+                record = json.loads(line)
+                # запросы без сессии воспроизводим как отдельных анонимных посетителей
+                sessions[record.get('session') or f'anonymous-{index}'].append(record)
+    return list(sessions.values())
+
+
+def synthetic_sessions(count, products, seed=0):
+    rng = random.Random(seed)
+    sessions = []
+    for _ in range(count):
+        session = [{'method': 'GET', 'path': '/products/', 'query': {}}]
+        for _ in range(rng.randint(1, 4)):
+            session.append({'method': 'GET', 'path': '/products/', 'query': {'page': str(rng.randint(1, 20))}})
+        session.append({'method': 'GET', 'path': '/products/', 'query': {'q': f'product {rng.randint(1, products)}'}})
+        for _ in range(rng.randint(0, 3)):
+            pk = rng.randint(1, products)
+            session.append({'method': 'GET', 'path': f'/products/{pk}/', 'query': {}})
+            session.append({'method': 'POST', 'path': f'/cart/add/{pk}/', 'query': {}, 'body': {'quantity': '1'}})
+        session.append({'method': 'GET', 'path': '/cart/', 'query': {}})
+        if rng.random() < 0.2:
+            session.append({
+                'method': 'POST', 'path': '/cart/order/', 'query': {},
+                'body': {'username': 'replay', 'phone': '***', 'address': '***'},
+            })
+        sessions.append(session)
+    return sessions
+
+
+def endpoint_name(path):
+    try:
+        return resolve(path).url_name or path
+    except Resolver404:
+        return 'not_found'
+
+
+class TestClientDriver:
+    def __init__(self):
+        # ошибки сервера считаем как 5xx, а не роняем весь прогон
+        self.client = Client(raise_request_exception=False)
+
+    def send(self, record):
+        data = record.get('body')
+        path = record['path']
+        if record.get('query'):
+            path = f'{path}?{urlencode(record["query"])}'
+        with CaptureQueriesContext(connection) as ctx:
+            if record['method'] == 'POST':
+                if record.get('content_type') == 'application/json':
+                    response = self.client.post(path, json.dumps(data), content_type='application/json')
+                else:
+                    response = self.client.post(path, data or {})
+            else:
+                response = self.client.generic(record['method'], path)
+        return response.status_code, len(ctx.captured_queries)
+
+
+class ServerDriver:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies))
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        self.opener.open(f'{self.base_url}/products/').read()
+        return next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+
+    def send(self, record):
+        url = f'{self.base_url}{record["path"]}'
+        if record.get('query'):
+            url = f'{url}?{urlencode(record["query"])}'
+        data = None
+        headers = {}
+        if record['method'] == 'POST':
+            headers = {'X-CSRFToken': self.csrf_token(), 'Referer': f'{self.base_url}/'}
+            if record.get('content_type') == 'application/json':
+                data = json.dumps(record.get('body')).encode()
+                headers['Content-Type'] = 'application/json'
+            else:
+                data = urlencode(record.get('body') or {}).encode()
+        request = Request(url, data=data, headers=headers, method=record['method'])
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status, None
+        except HTTPError as e:
+            return e.code, None
+
+
+class Command(BaseCommand):
+    help = 'Воспроизводит записанный трафик (или синтетический сценарий) и выдаёт задержки, пропускную способность и число запросов к БД по эндпоинтам в JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='JSONL, записанный TrafficRecorderMiddleware')
+        parser.add_argument('--synthetic-sessions', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--products', type=int, default=1000, help='Размер засеянного каталога')
+        parser.add_argument('--server', help='Гонять запросы на запущенный сервер вместо тестового клиента')
+        parser.add_argument('--output', help='Куда записать JSON с результатами (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        if options['path']:
+            sessions = load_sessions(options['path'])
+        else:
+            sessions = synthetic_sessions(options['synthetic_sessions'], options['products'])
+        if not sessions:
+            raise CommandError('Нет запросов для воспроизведения')
+
+        if options['server']:
+            report = self.replay(sessions, lambda: ServerDriver(options['server']), options)
+        else:
+            setup_test_environment()
+            try:
+                with bench_database():
+                    seed_catalog(options['products'], stock=10 ** 6)
+                    report = self.replay(sessions, TestClientDriver, options)
+            finally:
+                teardown_test_environment()
+
+        output = json.dumps(report, indent=2, sort_keys=True, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                stream.write(output + '\n')
+        else:
+            sys.stdout.write(output + '\n')
+
+    def replay(self, sessions, make_driver, options):
+        samples = defaultdict(list)
+        queries = defaultdict(list)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+
+        def run_session(session):
+            driver = make_driver()
+            try:
+                for record in session:
+                    name = endpoint_name(record['path'])
+                    start = time.perf_counter()
+                    status, query_count = driver.send(record)
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        samples[name].append(elapsed)
+                        if query_count is not None:
+                            queries[name].append(query_count)
+                        if status >= 500:
+                            errors[name] += 1
+            finally:
+                connections.close_all()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(run_session, sessions))
+        wall = time.perf_counter() - start
+
+        endpoints = {}
+        for name, endpoint_samples in samples.items():
+            stats = summarize(endpoint_samples)
+            stats['errors'] = errors[name]
+            stats['queries_mean'] = round(sum(queries[name]) / len(queries[name]), 2) if queries[name] else None
+            endpoints[name] = stats
+        all_samples = [sample for endpoint_samples in samples.values() for sample in endpoint_samples]
+        total = summarize(all_samples)
+        total['throughput_rps'] = round(len(all_samples) / wall, 1) if wall else 0.0
+        total['wall_s'] = round(wall, 3)
+        return {
+            'meta': {
+                'sessions': len(sessions),
+                'concurrency': options['concurrency'],
+                'products': options['products'],
+                'mode': 'server' if options['server'] else 'test_client',
+            },
+            'endpoints': endpoints,
+            'total': total,
+        }
@@ -0,0 +1,109 @@
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from shop.taskqueue import claim, purge_finished, queue_stats, requeue_stale, run_task
+
+logger = logging.getLogger('shop.tasks')
+
+# как часто возвращать в очередь задачи умерших воркеров и чистить выполненные, секунд
+MAINTENANCE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Исполняет фоновые задачи из очереди (shop.Task) пулом потоков или процессов: '
+        'повторы с экспоненциальной задержкой, возврат зависших задач, очистка выполненных'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'SHOP_TASK_WORKERS', 4))
+        parser.add_argument(
+            '--mode', choices=['thread', 'process'], default=getattr(settings, 'SHOP_TASK_WORKER_MODE', 'thread'),
+            help='Потоки — для задач, которые в основном ждут базу; процессы — для задач, упирающихся в CPU',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Сколько задач забирать за один запрос, по умолчанию — по числу свободных воркеров',
+        )
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Пауза при пустой очереди, секунд')
+        parser.add_argument('--once', action='store_true', help='Выйти, когда готовых задач не останется')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+        if options['mode'] == 'process':
+            # spawn, а не fork: дочерний процесс не наследует открытые соединения с базой и настраивает Django сам
+            connections.close_all()
+            pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup
+            )
+        else:
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='shop-task')
+
+        self.stdout.write(f'{worker_id}: {workers} воркеров ({options["mode"]})')
+        outcomes = Counter()
+        in_flight = set()
+        last_maintenance = float('-inf')
+        start = time.perf_counter()
+        with pool:
+            while not stop.is_set():
+                if time.monotonic() - last_maintenance >= MAINTENANCE_INTERVAL:
+                    self.maintenance()
+                    last_maintenance = time.monotonic()
+                free = workers - len(in_flight)
+                ids = claim(worker_id, min(free, options['batch_size'] or free)) if free else []
+                in_flight.update(pool.submit(run_task, pk, worker_id) for pk in ids)
+                if not in_flight:
+                    if options['once']:
+                        break
+                    close_old_connections()
+                    stop.wait(options['poll_interval'])
+                    continue
+                done, in_flight = wait(in_flight, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                self.collect(done, outcomes)
+            # при остановке забранные задачи доделываем, новых не берём
+            self.collect(wait(in_flight)[0], outcomes)
+
+        elapsed = time.perf_counter() - start
+        total = sum(outcomes.values())
+        stats = queue_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено: {outcomes["done"]}, на повтор: {outcomes["retry"]}, с ошибкой: {outcomes["failed"]}, '
+            f'отброшено после возврата в очередь: {outcomes["lost"]}, '
+            f'сбоев воркера: {outcomes["error"]} за {elapsed:.2f} с ({total / elapsed if elapsed else 0:.0f} задач/с); '
+            f'в очереди: {stats["depth"]["pending"]}, в среднем ожидание {stats["wait_ms_mean"]} мс, '
+            f'выполнение {stats["run_ms_mean"]} мс'
+        ))
+
+    def collect(self, futures, outcomes):
+        for future in futures:
+            try:
+                outcomes[future.result()] += 1
+            except Exception:
+                # упал не код задачи, а сам воркер (например, база недоступна) — задачу вернёт requeue_stale
+                logger.exception('Сбой воркера очереди задач')
+                outcomes['error'] += 1
+
+    def maintenance(self):
+        requeued, failed = requeue_stale()
+        purged = purge_finished()
+        if requeued or failed or purged:
+            self.stdout.write(
+                f'Возвращено зависших задач: {requeued}, исчерпали попытки: {failed}, удалено выполненных: {purged}'
+            )
@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shop.management.commands.rebuild_sales import parse_day
+from shop.sales import category_report, product_report
+
+
+class Command(BaseCommand):
+    help = 'Продажи по товарам или категориям за период — только из дневных сводок, без чтения заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=parse_day, help='Первый день (YYYY-MM-DD), по умолчанию — 30 дней назад')
+        parser.add_argument('--end', type=parse_day, help='Последний день (YYYY-MM-DD), по умолчанию — сегодня')
+        parser.add_argument('--by', choices=['product', 'category'], default='category')
+        parser.add_argument('--limit', type=int, default=20)
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.localdate()
+        start = options['start'] or end - timedelta(days=29)
+        report = product_report if options['by'] == 'product' else category_report
+        rows = list(report(start, end, options['limit']))
+        self.stdout.write(f'Продажи с {start} по {end}')
+        for row in rows:
+            self.stdout.write(f'{row["name"] or "—":<40} {row["units"]:>10} шт. {row["revenue"]:>14.2f} сом')
+        if not rows:
+            self.stdout.write('Продаж нет')
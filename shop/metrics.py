@@ -0,0 +1,134 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, deque
+from contextvars import ContextVar
+from time import perf_counter
+
+from .bench import percentile
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RECENT_SAMPLES = 1000
+
+current_request_metrics = ContextVar('shop_request_metrics', default=None)
+
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+LITERAL_RE = re.compile(r"'[^']*'|\b\d+\b")
+
+
+def sql_shape(sql):
+    # параметры уже вынесены в %s, но IN-списки и литералы в тексте запроса разной длины — схлопываем их
+    return LITERAL_RE.sub('?', IN_LIST_RE.sub('IN (...)', sql))
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # используется как connection.execute_wrapper
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - start
+            self.queries += 1
+            self.shapes[sql_shape(sql)] += 1
+
+    def repeated_shapes(self, threshold):
+        return [(shape, count) for shape, count in self.shapes.items() if count >= threshold]
+
+
+def execute_with_current_metrics(execute, sql, params, many, context):
+    metrics = current_request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def record_template_time(seconds):
+    metrics = current_request_metrics.get()
+    if metrics is not None:
+        metrics.template_time += seconds
+
+
+class RouteStats:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total_time = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, duration, metrics):
+        self.buckets[bisect_left(BUCKETS, duration)] += 1
+        self.count += 1
+        self.total_time += duration
+        self.queries += metrics.queries
+        self.db_time += metrics.db_time
+        self.template_time += metrics.template_time
+        self.recent.append(duration)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def observe(self, route, duration, metrics):
+        with self.lock:
+            self.routes.setdefault(route, RouteStats()).observe(duration, metrics)
+
+    def reset(self):
+        with self.lock:
+            self.routes = {}
+
+    def snapshot(self):
+        with self.lock:
+            result = {}
+            for route, stats in self.routes.items():
+                recent = list(stats.recent)
+                result[route] = {
+                    'count': stats.count,
+                    'mean_ms': round(stats.total_time / stats.count * 1000, 3),
+                    'p50_ms': round(percentile(recent, 50) * 1000, 3),
+                    'p95_ms': round(percentile(recent, 95) * 1000, 3),
+                    'p99_ms': round(percentile(recent, 99) * 1000, 3),
+                    'queries_mean': round(stats.queries / stats.count, 2),
+                    'db_ms_mean': round(stats.db_time / stats.count * 1000, 3),
+                    'template_ms_mean': round(stats.template_time / stats.count * 1000, 3),
+                }
+            return result
+
+    def prometheus(self):
+        lines = [
+            '# HELP shop_request_duration_seconds Время обработки запроса',
+            '# TYPE shop_request_duration_seconds histogram',
+        ]
+        with self.lock:
+            routes = sorted(self.routes.items())
+            for route, stats in routes:
+                cumulative = 0
+                for bound, count in zip((*BUCKETS, '+Inf'), stats.buckets):
+                    cumulative += count
+                    lines.append(f'shop_request_duration_seconds_bucket{{route="{route}",le="{bound}"}} {cumulative}')
+                lines.append(f'shop_request_duration_seconds_sum{{route="{route}"}} {stats.total_time:.6f}')
+                lines.append(f'shop_request_duration_seconds_count{{route="{route}"}} {stats.count}')
+            for name, attr, help_text in (
+                ('shop_db_queries_total', 'queries', 'Число запросов к БД'),
+                ('shop_db_duration_seconds_total', 'db_time', 'Время в БД'),
+                ('shop_template_duration_seconds_total', 'template_time', 'Время рендеринга шаблонов'),
+            ):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for route, stats in routes:
+                    lines.append(f'{name}{{route="{route}"}} {getattr(stats, attr)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,298 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags
+
+from .db import replica_aliases, use_primary
+from .metrics import RequestMetrics, current_request_metrics, execute_with_current_metrics, registry
+from .staticfiles import IMMUTABLE_CACHE_CONTROL, build_static_index, mutable_max_age
+
+logger = logging.getLogger('shop.performance')
+
+# значения этих полей в запись не попадают
+SENSITIVE_FIELDS = {'csrfmiddlewaretoken', 'password', 'phone', 'address'}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+def session_group(request):
+    cookie = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not cookie:
+        return None
+    return hashlib.sha1(cookie.encode(), usedforsecurity=False).hexdigest()[:12]
+
+
+def session_group_from_response(response):
+    cookie = response.cookies.get(settings.SESSION_COOKIE_NAME)
+    if cookie is None or not cookie.value:
+        return None
+    return hashlib.sha1(cookie.value.encode(), usedforsecurity=False).hexdigest()[:12]
+
+
+def redact(value):
+    # в JSON чувствительные поля могут лежать на любой глубине
+    if isinstance(value, dict):
+        return {key: '***' if key in SENSITIVE_FIELDS else redact(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+def sanitize_post(request):
+    if request.content_type == 'application/json':
+        try:
+            return redact(json.loads(request.body or b'null'))
+        except ValueError:
+            return None
+    return redact(request.POST.dict())
+
+
+class AsyncCapableMiddleware:
+    # под ASGI цепочка остаётся асинхронной, и async-представления вызываются без перехода в пул потоков
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.process(request)
+
+    def process(self, request):
+        raise NotImplementedError
+
+    async def __acall__(self, request):
+        raise NotImplementedError
+
+
+class TrafficRecorderMiddleware(AsyncCapableMiddleware):
+    def __init__(self, get_response):
+        self.path = getattr(settings, 'SHOP_TRAFFIC_RECORD_PATH', None)
+        if not self.path:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.lock = threading.Lock()
+        self.stream = open(self.path, 'a', encoding='utf-8', buffering=1)
+
+    def process(self, request):
+        # тело нужно прочитать до view, иначе после чтения request.POST его уже не получить
+        body = sanitize_post(request) if request.method == 'POST' else None
+        group = session_group(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self.write(request, response, body, group, start)
+        return response
+
+    async def __acall__(self, request):
+        body = sanitize_post(request) if request.method == 'POST' else None
+        group = session_group(request)
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.write(request, response, body, group, start)
+        return response
+
+    def write(self, request, response, body, group, start):
+        record = {
+            'ts': time.time(),
+            'method': request.method,
+            'path': request.path,
+            'query': request.GET.dict(),
+            'body': body,
+            'content_type': request.content_type,
+            'session': group or session_group_from_response(response),
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self.lock:
+            self.stream.write(line + '\n')
+
+
+def install_metrics_wrapper(sender, connection, **kwargs):
+    if execute_with_current_metrics not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_with_current_metrics)
+
+
+class PerformanceMiddleware(AsyncCapableMiddleware):
+    def __init__(self, get_response):
+        if not getattr(settings, 'SHOP_PERFORMANCE_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.n_plus_one_threshold = getattr(settings, 'SHOP_N_PLUS_ONE_THRESHOLD', 5)
+        if self.async_mode:
+            # async ORM ходит в БД из потоков sync_to_async, а не из event loop: каждое соединение
+            # получает постоянную обёртку, которая пишет в метрики текущего запроса из ContextVar;
+            # сигнал приходит для любого алиаса, уже открытые соединения (default, реплики) дооснащаем сразу
+            connection_created.connect(install_metrics_wrapper, dispatch_uid='shop.performance.metrics_wrapper')
+            for existing in connections.all(initialized_only=True):
+                install_metrics_wrapper(None, existing)
+
+    def process(self, request):
+        metrics = RequestMetrics()
+        token = current_request_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            # каталог читается с реплик (shop.db.PrimaryReplicaRouter) — считаем запросы на всех алиасах
+            with ExitStack() as stack:
+                for alias_connection in connections.all():
+                    stack.enter_context(alias_connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            current_request_metrics.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_request_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request_metrics.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    def finish(self, request, response, metrics, duration):
+        match = request.resolver_match
+        route = (match.url_name or match.route) if match else 'unresolved'
+        registry.observe(route, duration, metrics)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.queries} queries"',
+            f'tpl;dur={metrics.template_time * 1000:.2f}',
+            f'view;dur={duration * 1000:.2f}',
+        ])
+
+        for shape, count in metrics.repeated_shapes(self.n_plus_one_threshold):
+            logger.warning('Возможный N+1 в %s %s: %d одинаковых запросов: %s', request.method, request.path, count, shape)
+        return response
+
+
+class ReadYourWritesMiddleware(AsyncCapableMiddleware):
+    # после записи сессия какое-то время читает каталог с основной базы, чтобы не увидеть отставшую реплику;
+    # метка живёт в cookie, чтобы не тянуть сессию из БД ради каждого запроса
+    cookie_name = 'shop_primary_until'
+
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.sticky_seconds = getattr(settings, 'SHOP_READ_YOUR_WRITES_SECONDS', 5)
+
+    def needs_primary(self, request):
+        if request.method not in SAFE_METHODS:
+            return True
+        try:
+            return float(request.COOKIES.get(self.cookie_name, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def remember_write(self, request, response):
+        if request.method not in SAFE_METHODS and self.sticky_seconds:
+            response.set_cookie(
+                self.cookie_name, f'{time.time() + self.sticky_seconds:.3f}',
+                max_age=self.sticky_seconds, httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process(self, request):
+        token = use_primary.set(self.needs_primary(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            use_primary.reset(token)
+        return self.remember_write(request, response)
+
+    async def __acall__(self, request):
+        token = use_primary.set(self.needs_primary(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_primary.reset(token)
+        return self.remember_write(request, response)
+
+
+def accepted_encodings(request):
+    # Accept-Encoding: "gzip, deflate, br;q=0" -> {'gzip', 'deflate'}
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticAssetsMiddleware(AsyncCapableMiddleware):
+    # отдаёт собранную collectstatic статику до сессий, CSRF и представлений:
+    # хешированные имена — с immutable на год, готовые .br/.gz — по Accept-Encoding без сжатия на лету
+    def __init__(self, get_response):
+        if not getattr(settings, 'SHOP_STATIC_SERVE', True) or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        self.index = None
+        self.lock = threading.Lock()
+
+    def get_index(self):
+        if self.index is None:
+            with self.lock:
+                if self.index is None:
+                    self.index = build_static_index(settings.STATIC_ROOT, self.prefix)
+        return self.index
+
+    def process(self, request):
+        response = self.serve(request)
+        if response is None:
+            response = self.get_response(request)
+        return response
+
+    async def __acall__(self, request):
+        response = self.serve(request)
+        if response is None:
+            response = await self.get_response(request)
+        return response
+
+    def serve(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefix):
+            return None
+        asset = self.get_index().get(request.path)
+        if asset is None:
+            return None
+
+        accepted = accepted_encodings(request)
+        encoding = next((name for name in asset.variants if name in accepted), None)
+        etag = f'"{asset.etag}-{encoding}"' if encoding else f'"{asset.etag}"'
+        headers = {
+            'ETag': etag,
+            'Last-Modified': http_date(asset.mtime),
+            'Vary': 'Accept-Encoding',
+            'Cache-Control': IMMUTABLE_CACHE_CONTROL if asset.immutable else f'public, max-age={mutable_max_age()}',
+            'X-Content-Type-Options': 'nosniff',
+        }
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            path = asset.variants[encoding] if encoding else asset.path
+            response = FileResponse(open(path, 'rb'), content_type=asset.content_type, filename=asset.path.name)
+            # браузер показывает файл, а не скачивает его
+            del response['Content-Disposition']
+            if encoding:
+                headers['Content-Encoding'] = encoding
+        for name, value in headers.items():
+            response[name] = value
+        return response
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from shop.search import install_fts, uninstall_fts
+
+
+def forwards(apps, schema_editor):
+    install_fts(schema_editor.connection)
+
+
+def backwards(apps, schema_editor):
+    uninstall_fts(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_order_orderitem_order_products'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:25
+
+from django.db import migrations, models
+
+from shop.search import install_fts
+
+
+def reinstall_fts_triggers(apps, schema_editor):
+    # SQLite пересоздаёт shop_product при добавлении поля, а вместе со старой таблицей пропадают и триггеры FTS
+    install_fts(schema_editor.connection, rebuild=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_indexes_and_cart_uniq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(reinstall_fts_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:31
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+from shop.search import reinstall_fts_triggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_cartitem_timestamps'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_default=django.db.models.functions.datetime.Now()),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_default=django.db.models.functions.datetime.Now()),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'name'], name='shop_product_natural_key_idx'),
+        ),
+        migrations.RunPython(reinstall_fts_triggers, migrations.RunPython.noop),
+    ]
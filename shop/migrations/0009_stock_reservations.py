@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from shop.search import reinstall_fts_triggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_product_natural_key_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reserved',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(reinstall_fts_triggers, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(max_length=40)),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='shop.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('session_key', 'product'), name='shop_reservation_session_product_uniq')],
+            },
+        ),
+    ]
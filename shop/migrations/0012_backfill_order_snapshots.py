@@ -0,0 +1,62 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:56
+
+from django.db import migrations, transaction
+from django.db.models import F, Sum
+
+BATCH_SIZE = 2000
+
+
+def backfill_items(apps, schema_editor):
+    OrderItem = apps.get_model('shop', 'OrderItem')
+    db = schema_editor.connection.alias
+    last_pk = 0
+    # проход по диапазонам pk: каждая пачка — своя короткая транзакция, таблица не блокируется целиком
+    while True:
+        rows = list(
+            OrderItem.objects.using(db).filter(pk__gt=last_pk, product__isnull=False)
+            .order_by('pk').values_list('pk', 'product__name', 'product__price')[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        items = [OrderItem(pk=pk, product_name=name, unit_price=price) for pk, name, price in rows]
+        with transaction.atomic(using=db):
+            OrderItem.objects.using(db).bulk_update(items, ['product_name', 'unit_price'])
+        last_pk = rows[-1][0]
+
+
+def backfill_orders(apps, schema_editor):
+    Order = apps.get_model('shop', 'Order')
+    OrderItem = apps.get_model('shop', 'OrderItem')
+    db = schema_editor.connection.alias
+    last_pk = 0
+    while True:
+        order_ids = list(
+            Order.objects.using(db).filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE]
+        )
+        if not order_ids:
+            break
+        totals = (
+            OrderItem.objects.using(db).filter(order_id__in=order_ids).values('order_id')
+            .annotate(total=Sum(F('quantity') * F('unit_price')), item_count=Sum('quantity'))
+        )
+        orders = [
+            Order(pk=row['order_id'], total=row['total'], item_count=row['item_count'])
+            for row in totals
+        ]
+        with transaction.atomic(using=db):
+            Order.objects.using(db).bulk_update(orders, ['total', 'item_count'])
+        last_pk = order_ids[-1]
+
+
+class Migration(migrations.Migration):
+    # без общей транзакции: на большой истории заказов пачки фиксируются по мере прохода
+    atomic = False
+
+    dependencies = [
+        ('shop', '0011_order_snapshots'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_items, migrations.RunPython.noop),
+        migrations.RunPython(backfill_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0015_product_neighbors'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='cartitem',
+            name='shop_cartitem_session_product_uniq',
+        ),
+        migrations.RemoveConstraint(
+            model_name='stockreservation',
+            name='shop_reservation_session_product_uniq',
+        ),
+        migrations.RenameField(
+            model_name='cartitem',
+            old_name='session_key',
+            new_name='cart_key',
+        ),
+        migrations.RenameField(
+            model_name='stockreservation',
+            old_name='session_key',
+            new_name='cart_key',
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart_key', 'product'), name='shop_cartitem_cart_product_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockreservation',
+            constraint=models.UniqueConstraint(fields=('cart_key', 'product'), name='shop_reservation_cart_product_uniq'),
+        ),
+    ]
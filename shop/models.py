@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Now
 from django.utils.text import slugify
 from django.core.exceptions import ValidationError
 
@@ -7,6 +8,7 @@ class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
     slug = models.SlugField(unique=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now())
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -22,14 +24,35 @@ class Product(models.Model):
     description = models.TextField(blank=True, null=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now())
     price = models.DecimalField(max_digits=7, decimal_places=2)
     stock = models.IntegerField(default=0)
+    # сколько единиц из stock удержано резервами корзин; доступно к продаже stock - reserved
+    reserved = models.IntegerField(default=0)
     image = models.CharField(max_length=1000, blank=True)
+    # sha256 исходной картинки: по нему шаблонный тег находит нарезанные варианты в кеше (shop/images.py)
+    image_digest = models.CharField(max_length=64, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # частичный индекс под витрину: только товары в наличии, в порядке сортировки списка
+            models.Index(
+                fields=['category', 'name', 'id'],
+                condition=models.Q(stock__gte=1),
+                name='shop_product_in_stock_idx',
+            ),
+            # естественный ключ товара для импорта каталога
+            models.Index(fields=['category', 'name'], name='shop_product_natural_key_idx'),
+        ]
 
     def clean(self):
         if self.stock < 0:
             raise ValidationError({'stock': 'Остаток не может быть меньше 0'})
 
+    @property
+    def available(self):
+        return self.stock - self.reserved
+
     def __str__(self):
         return self.name
 
@@ -37,7 +60,15 @@ class Product(models.Model):
 class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cart_items')
     quantity = models.PositiveIntegerField(default=1)
-    session_key = models.CharField(max_length=40)
+    # постоянный id корзины из сессии (shop.cart.get_or_create_cart_key), не session_key: с signed_cookies тот меняется
+    cart_key = models.CharField(max_length=40)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart_key', 'product'], name='shop_cartitem_cart_product_uniq'),
+        ]
 
     def clean(self):
         if self.quantity < 1:
@@ -52,12 +83,30 @@ class CartItem(models.Model):
         return f'{self.product.name} — {self.quantity} шт.'
 
 
+class StockReservation(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    cart_key = models.CharField(max_length=40)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart_key', 'product'], name='shop_reservation_cart_product_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.product.name} — {self.quantity} шт. до {self.expires_at:%Y-%m-%d %H:%M}'
+
+
 class Order(models.Model):
     username = models.CharField(max_length=150)
     phone = models.CharField(max_length=30)
     address = models.CharField(max_length=500)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     products = models.ManyToManyField(Product, through='OrderItem', related_name='orders')
+    # денормализованные итоги на момент оформления: список заказов и отчёты не пересчитывают позиции
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"Заказ #{self.id} от {self.username} ({self.created_at.strftime('%Y-%m-%d %H:%M')})"
@@ -65,8 +114,98 @@ class Order(models.Model):
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='order_items')
-    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='order_items')
+    # удаление товара не стирает историю: позиция остаётся со снимком названия и цены
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='order_items')
+    product_name = models.CharField(max_length=300)
+    unit_price = models.DecimalField(max_digits=7, decimal_places=2)
     quantity = models.PositiveIntegerField(default=1)
 
+    def subtotal(self):
+        return self.unit_price * self.quantity
+
+    def __str__(self):
+        return f"{self.product_name} в заказе #{self.order_id} — {self.quantity} шт."
+
+
+class ProductDailySales(models.Model):
+    # сводка продаж за день, обновляется задачей после оформления заказа (shop/sales.py, shop/tasks.py)
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='daily_sales')
+    product_name = models.CharField(max_length=300)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='shop_product_daily_sales_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.day}: {self.product_name} — {self.units} шт.'
+
+
+class CategoryDailySales(models.Model):
+    day = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='daily_sales')
+    category_name = models.CharField(max_length=100)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='shop_category_daily_sales_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.day}: {self.category_name} — {self.units} шт.'
+
+
+class Task(models.Model):
+    # очередь фоновых задач в той же базе: ставится после коммита, исполняется командой run_workers (shop/taskqueue.py)
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(PENDING, 'В очереди'), (RUNNING, 'Выполняется'), (DONE, 'Выполнена'), (FAILED, 'Ошибка')]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    # одинаковый ключ — одна задача: повторная постановка ничего не добавляет
+    idempotency_key = models.CharField(max_length=200, null=True, blank=True, unique=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    # ожидание в очереди (от run_at до старта последней попытки) и время её выполнения
+    wait_ms = models.PositiveIntegerField(null=True, blank=True)
+    run_ms = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='shop_task_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.get_status_display()})'
+
+
+class ProductNeighbor(models.Model):
+    # «с этим товаром покупают»: не больше SHOP_RECOMMENDATIONS_TOP_K соседей на товар (shop/recommendations.py),
+    # score — в скольких заказах товары встретились вместе
+    # отдельный индекс не нужен: выборку по товару обслуживает уникальный индекс (product, neighbor)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='neighbors', db_index=False)
+    neighbor = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'neighbor'], name='shop_product_neighbor_uniq'),
+        ]
+
     def __str__(self):
-        return f"{self.product.name} в заказе #{self.order.id} — {self.quantity} шт."
\ No newline at end of file
+        return f'{self.product_id} -> {self.neighbor_id}: {self.score}'
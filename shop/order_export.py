@@ -0,0 +1,114 @@
+import csv
+import json
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import OrderItem
+
+LINE_FIELDS = [
+    'order_id', 'created_at', 'username', 'phone', 'address',
+    'product_id', 'product_name', 'quantity', 'unit_price', 'line_total',
+]
+BUFFER_SIZE = 64 * 1024
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson; charset=utf-8'}
+
+
+def export_lines(orders=None, chunk_size=2000):
+    # одна строка на позицию заказа, цены и названия — из снимка, без join к товарам; порядок по заказу нужен, чтобы JSONL мог собрать заказ из подряд идущих строк
+    items = OrderItem.objects.all()
+    if orders is not None:
+        items = items.filter(order_id__in=orders.order_by().values('pk'))
+    rows = items.order_by('order_id', 'pk').values_list(
+        'order_id', 'order__created_at', 'order__username', 'order__phone', 'order__address',
+        'product_id', 'product_name', 'quantity', 'unit_price',
+    )
+    for order_id, created_at, username, phone, address, product_id, name, quantity, price in rows.iterator(
+        chunk_size=chunk_size
+    ):
+        yield {
+            'order_id': order_id,
+            'created_at': created_at.isoformat(),
+            'username': username,
+            'phone': phone,
+            'address': address,
+            'product_id': product_id,
+            'product_name': name,
+            'quantity': quantity,
+            'unit_price': price,
+            'line_total': price * quantity,
+        }
+
+
+def export_orders(orders=None, chunk_size=2000):
+    # в памяти только позиции текущего заказа
+    for order_id, lines in groupby(export_lines(orders, chunk_size), key=itemgetter('order_id')):
+        lines = list(lines)
+        first = lines[0]
+        yield {
+            'id': order_id,
+            'created_at': first['created_at'],
+            'username': first['username'],
+            'phone': first['phone'],
+            'address': first['address'],
+            'item_count': sum(line['quantity'] for line in lines),
+            'total': sum((line['line_total'] for line in lines), Decimal('0.00')),
+            'items': [
+                {key: line[key] for key in ('product_id', 'product_name', 'quantity', 'unit_price', 'line_total')}
+                for line in lines
+            ],
+        }
+
+
+class Echo:
+    # csv.writer пишет в «файл», который просто возвращает строку — её и отдаём в поток
+    def write(self, value):
+        return value
+
+
+def iter_csv(lines):
+    writer = csv.DictWriter(Echo(), fieldnames=LINE_FIELDS)
+    yield writer.writeheader()
+    for line in lines:
+        yield writer.writerow(line)
+
+
+def iter_jsonl(orders):
+    for order in orders:
+        yield json.dumps(order, ensure_ascii=False, default=str) + '\n'
+
+
+def buffered(parts, size=BUFFER_SIZE):
+    # сервер пишет в сокет каждый кусок отдельно — склеиваем строки в блоки по ~64 КБ
+    buffer = []
+    length = 0
+    for part in parts:
+        buffer.append(part)
+        length += len(part)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def iter_records(fmt, orders=None, chunk_size=2000):
+    # CSV — строка на позицию, JSONL — объект на заказ с вложенными позициями
+    if fmt == 'csv':
+        return iter_csv(export_lines(orders, chunk_size))
+    return iter_jsonl(export_orders(orders, chunk_size))
+
+
+def iter_export(fmt, orders=None, chunk_size=2000):
+    return buffered(iter_records(fmt, orders, chunk_size))
+
+
+def export_response(fmt, orders=None, chunk_size=2000):
+    response = StreamingHttpResponse(iter_export(fmt, orders, chunk_size), content_type=CONTENT_TYPES[fmt])
+    filename = f'orders-{timezone.now():%Y%m%d-%H%M%S}.{fmt}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
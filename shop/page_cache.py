@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+
+from .cart import get_cart
+from .categories import aget_categories_version, get_categories_version
+
+GENERATION_KEY = 'shop:pagegen'
+PAGE_KEY = 'shop:page'
+STATS_KEYS = {'hit': 'shop:pagecache:hits', 'miss': 'shop:pagecache:misses'}
+ALL_PRODUCTS = 'all'
+
+# в кеш кладётся страница с заглушками вместо CSRF-токена и бейджа корзины,
+# при отдаче подставляются значения текущего запроса
+CSRF_PLACEHOLDER = '__shop_page_cache_csrf__'
+CART_BADGE_PLACEHOLDER = '__shop_page_cache_cart_badge__'
+
+
+def page_cache_timeout():
+    return getattr(settings, 'SHOP_PAGE_CACHE_TIMEOUT', 0)
+
+
+def generation_key(scope):
+    return f'{GENERATION_KEY}:{scope}'
+
+
+def bump_generations(category_ids):
+    scopes = {ALL_PRODUCTS, *(f'category:{pk}' for pk in category_ids if pk is not None)}
+    for scope in scopes:
+        key = generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+
+
+def get_generation(scope):
+    key = generation_key(scope)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+async def aget_generation(scope):
+    key = generation_key(scope)
+    generation = await cache.aget(key)
+    if generation is None:
+        await cache.aadd(key, time.time_ns(), None)
+        generation = await cache.aget(key)
+    return generation
+
+
+def count_stat(outcome):
+    key = STATS_KEYS[outcome]
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+async def acount_stat(outcome):
+    key = STATS_KEYS[outcome]
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 1, None)
+
+
+def get_stats():
+    values = cache.get_many(STATS_KEYS.values())
+    hits = values.get(STATS_KEYS['hit'], 0)
+    misses = values.get(STATS_KEYS['miss'], 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
+
+
+def reset_stats():
+    cache.delete_many(STATS_KEYS.values())
+
+
+class BasePageCacheMixin:
+    page_cache_vary_params = ('q', 'page', 'cursor', 'price', 'in_stock')
+
+    def build_page_cache_key(self, scope, generation, categories_version):
+        # отсутствующий параметр и пустой различаются: ?cursor= включает курсорную пагинацию (CursorPaginationMixin)
+        params = '&'.join(
+            f'{name}={self.request.GET[name]}' for name in self.page_cache_vary_params if name in self.request.GET
+        )
+        digest = hashlib.md5(params.encode(), usedforsecurity=False).hexdigest()
+        return f'{PAGE_KEY}:{scope}:{generation}:{categories_version}:{digest}'
+
+    def page_cache_enabled(self):
+        return page_cache_timeout() > 0 and self.request.method == 'GET'
+
+    def build_cached_response(self, content, cart_badge, outcome, fragments=None):
+        badge = render_to_string('shop/cart_badge.html', {'cart_badge': cart_badge}).strip()
+        content = content.replace(CSRF_PLACEHOLDER, get_token(self.request)).replace(CART_BADGE_PLACEHOLDER, badge)
+        # остальные части страницы, которые представление собирает на каждый запрос (см. render_page_fragments)
+        for placeholder, fragment in (fragments or {}).items():
+            content = content.replace(placeholder, fragment)
+        response = HttpResponse(content)
+        response['X-Page-Cache'] = outcome
+        return response
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if getattr(self, 'rendering_for_cache', False):
+            context['csrf_token'] = CSRF_PLACEHOLDER
+            context['cart_badge_placeholder'] = CART_BADGE_PLACEHOLDER
+        return context
+
+
+class ProductPageCacheMixin(BasePageCacheMixin):
+    def get_page_cache_scope(self):
+        return ALL_PRODUCTS
+
+    def get_page_cache_key(self):
+        scope = self.get_page_cache_scope()
+        return self.build_page_cache_key(scope, get_generation(scope), get_categories_version())
+
+    def get(self, request, *args, **kwargs):
+        if not self.page_cache_enabled():
+            return super().get(request, *args, **kwargs)
+
+        key = self.get_page_cache_key()
+        content = cache.get(key)
+        if content is not None:
+            count_stat('hit')
+            return self.cached_response(content, 'HIT')
+
+        count_stat('miss')
+        self.rendering_for_cache = True
+        response = super().get(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        response.render()
+        content = response.content.decode(response.charset)
+        cache.set(key, content, page_cache_timeout())
+        return self.cached_response(content, 'MISS')
+
+    def render_page_fragments(self):
+        return {}
+
+    def cached_response(self, content, outcome):
+        return self.build_cached_response(
+            content, get_cart(self.request).badge(), outcome, self.render_page_fragments()
+        )
+
+
+class AsyncProductPageCacheMixin(BasePageCacheMixin):
+    # тот же кеш страниц для async-представлений: кеш, генерации и бейдж корзины читаются без пула потоков
+
+    async def aget_page_cache_scope(self):
+        return ALL_PRODUCTS
+
+    async def aget_page_cache_key(self):
+        scope = await self.aget_page_cache_scope()
+        generation, categories_version = await asyncio.gather(aget_generation(scope), aget_categories_version())
+        return self.build_page_cache_key(scope, generation, categories_version)
+
+    async def get(self, request, *args, **kwargs):
+        if not self.page_cache_enabled():
+            return await super().get(request, *args, **kwargs)
+
+        key = await self.aget_page_cache_key()
+        content = await cache.aget(key)
+        if content is not None:
+            await acount_stat('hit')
+            return await self.acached_response(content, 'HIT')
+
+        await acount_stat('miss')
+        self.rendering_for_cache = True
+        response = await super().get(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        await sync_to_async(response.render)()
+        content = response.content.decode(response.charset)
+        await cache.aset(key, content, page_cache_timeout())
+        return await self.acached_response(content, 'MISS')
+
+    async def arender_page_fragments(self):
+        return {}
+
+    async def acached_response(self, content, outcome):
+        badge, fragments = await asyncio.gather(get_cart(self.request).abadge(), self.arender_page_fragments())
+        return self.build_cached_response(content, badge, outcome, fragments)
@@ -0,0 +1,118 @@
+from functools import reduce
+from operator import or_
+
+from django.core import signing
+from django.db.models import Q
+from django.http import Http404
+
+CURSOR_SALT = 'shop.pagination.cursor'
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+# keyset-пагинация: страница выбирается условием по ключу сортировки, без COUNT и OFFSET
+class CursorPaginator:
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+
+    def encode_cursor(self, obj, direction):
+        return signing.dumps({'d': direction, 'v': self.key_values(obj)}, salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+            direction, values = data['d'], data['v']
+        except (signing.BadSignature, KeyError, TypeError):
+            raise Http404('Некорректный курсор страницы')
+        if direction not in ('next', 'prev') or len(values) != len(self.ordering):
+            raise Http404('Некорректный курсор страницы')
+        return direction, values
+
+    def key_values(self, obj):
+        values = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            # строки из .values() приходят словарями с ключами вида category__name
+            if isinstance(obj, dict):
+                values.append(obj[name])
+                continue
+            value = obj
+            for attr in name.split('__'):
+                value = getattr(value, attr)
+            values.append(value)
+        return values
+
+    def keyset_filter(self, values, reverse):
+        # (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+        conditions = []
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            condition = Q(**{f'{name}__{"lt" if descending else "gt"}': values[index]})
+            for prev_field, prev_value in zip(self.ordering[:index], values[:index]):
+                condition &= Q(**{prev_field.lstrip('-'): prev_value})
+            conditions.append(condition)
+        return reduce(or_, conditions)
+
+    def reversed_ordering(self):
+        return [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering]
+
+    def page_queryset(self, cursor):
+        queryset = self.queryset.order_by(*self.ordering)
+        direction, values = self.decode_cursor(cursor) if cursor else ('next', None)
+
+        if direction == 'prev':
+            queryset = queryset.filter(self.keyset_filter(values, reverse=True)).order_by(*self.reversed_ordering())
+        elif values is not None:
+            queryset = queryset.filter(self.keyset_filter(values, reverse=False))
+
+        # берём на одну запись больше, чтобы узнать, есть ли следующая страница
+        return queryset[:self.per_page + 1], direction, values
+
+    def build_page(self, rows, direction, values):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == 'prev':
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        if not rows:
+            return CursorPage(rows)
+        return CursorPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], 'next') if has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], 'prev') if has_previous else None,
+        )
+
+    def page(self, cursor=None):
+        queryset, direction, values = self.page_queryset(cursor)
+        return self.build_page(list(queryset), direction, values)
+
+    async def apage(self, cursor=None):
+        queryset, direction, values = self.page_queryset(cursor)
+        return self.build_page([row async for row in queryset], direction, values)
@@ -0,0 +1,193 @@
+import heapq
+import itertools
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import OrderItem, Product, ProductNeighbor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BACKENDS = ('numpy', 'python')
+
+
+def numpy_available():
+    return np is not None
+
+
+def top_k():
+    return getattr(settings, 'SHOP_RECOMMENDATIONS_TOP_K', 8)
+
+
+def max_basket():
+    # оптовые заказы на сотни позиций дают квадратичное число пар и почти ничего не говорят о связях товаров
+    return getattr(settings, 'SHOP_RECOMMENDATIONS_MAX_BASKET', 50)
+
+
+def order_rows(chunk_size):
+    # (order_id, product_id) по возрастанию заказа, потоком: корзина целиком идёт подряд
+    return (
+        OrderItem.objects.filter(product__isnull=False)
+        .order_by('order_id')
+        .values_list('order_id', 'product_id')
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def python_neighbors(rows, k, limit):
+    counts = defaultdict(Counter)
+    for _, group in itertools.groupby(rows, key=itemgetter(0)):
+        basket = {product_id for _, product_id in group}
+        if 2 <= len(basket) <= limit:
+            for left, right in itertools.permutations(basket, 2):
+                counts[left][right] += 1
+    for product_id in sorted(counts):
+        # при равном счёте — меньший id, как и в numpy-версии
+        for neighbor_id, score in heapq.nsmallest(k, counts[product_id].items(), key=lambda item: (-item[1], item[0])):
+            yield product_id, neighbor_id, score
+
+
+def basket_chunks(rows, chunk_size):
+    # пачки по chunk_size строк; последний заказ пачки может продолжиться в следующей — переносим его туда
+    carry = np.empty((0, 2), dtype=np.int64)
+    while True:
+        batch = list(itertools.islice(rows, chunk_size))
+        if not batch:
+            break
+        chunk = np.concatenate([carry, np.array(batch, dtype=np.int64)])
+        cut = np.searchsorted(chunk[:, 0], chunk[-1, 0])
+        carry = chunk[cut:]
+        if cut:
+            yield chunk[:cut]
+    if len(carry):
+        yield carry
+
+
+def chunk_pairs(chunk, limit):
+    order_ids, product_ids = chunk[:, 0], chunk[:, 1]
+    ordering = np.lexsort((product_ids, order_ids))
+    order_ids, product_ids = order_ids[ordering], product_ids[ordering]
+    unique = np.ones(len(order_ids), dtype=bool)
+    unique[1:] = (order_ids[1:] != order_ids[:-1]) | (product_ids[1:] != product_ids[:-1])
+    order_ids, product_ids = order_ids[unique], product_ids[unique]
+
+    starts = np.flatnonzero(np.r_[True, order_ids[1:] != order_ids[:-1]])
+    sizes = np.diff(np.r_[starts, len(order_ids)])
+    fits = (sizes >= 2) & (sizes <= limit)
+    product_ids = product_ids[np.repeat(fits, sizes)]
+    sizes = sizes[fits]
+    starts = np.cumsum(sizes) - sizes
+
+    # каждый товар корзины в паре с каждым товаром той же корзины: товар повторяется size раз слева,
+    # справа — вся его корзина; пары с самим собой отбрасываем
+    element_sizes = np.repeat(sizes, sizes)
+    element_starts = np.repeat(starts, sizes)
+    left = np.repeat(product_ids, element_sizes)
+    first = np.cumsum(element_sizes) - element_sizes
+    offsets = np.arange(len(left)) - np.repeat(first, element_sizes)
+    right = product_ids[np.repeat(element_starts, element_sizes) + offsets]
+    different = left != right
+    return left[different], right[different]
+
+
+def merge_counts(parts):
+    keys = np.concatenate([part[0] for part in parts])
+    counts = np.concatenate([part[1] for part in parts])
+    merged, inverse = np.unique(keys, return_inverse=True)
+    return merged, np.bincount(inverse, weights=counts, minlength=len(merged)).astype(np.int64)
+
+
+def numpy_neighbors(rows, k, limit, chunk_size):
+    # разреженная матрица совместных покупок как пары (товар, сосед) -> счёт, закодированные одним int64
+    base = (Product.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+    total = None
+    pending = []
+    pending_size = 0
+    for chunk in basket_chunks(rows, chunk_size):
+        left, right = chunk_pairs(chunk, limit)
+        keys, counts = np.unique(left * base + right, return_counts=True)
+        pending.append((keys, counts))
+        pending_size += len(keys)
+        # сливаем, когда накопленное сравнялось с итогом: суммарно O(n log n), в памяти не больше двух итогов
+        if total is None or pending_size >= len(total[0]):
+            total = merge_counts(([total] if total is not None else []) + pending)
+            pending, pending_size = [], 0
+    if pending:
+        total = merge_counts(([total] if total is not None else []) + pending)
+    if total is None:
+        return
+
+    keys, counts = total
+    left, right = keys // base, keys % base
+    ordering = np.lexsort((right, -counts, left))
+    left, right, counts = left[ordering], right[ordering], counts[ordering]
+    starts = np.flatnonzero(np.r_[True, left[1:] != left[:-1]])
+    rank = np.arange(len(left)) - np.repeat(starts, np.diff(np.r_[starts, len(left)]))
+    top = rank < k
+    yield from zip(left[top].tolist(), right[top].tolist(), counts[top].tolist())
+
+
+def build_neighbors(backend=None, chunk_size=100_000):
+    backend = backend or ('numpy' if numpy_available() else 'python')
+    if backend == 'numpy' and not numpy_available():
+        raise ImportError('Для сборки рекомендаций через numpy установите пакет numpy')
+    rows = order_rows(chunk_size)
+    if backend == 'numpy':
+        return numpy_neighbors(rows, top_k(), max_basket(), chunk_size)
+    return python_neighbors(rows, top_k(), max_basket())
+
+
+def rebuild(backend=None, chunk_size=100_000, batch_size=5000):
+    # полный пересчёт из истории заказов; инкрементальные обновления между пересчётами — нижняя оценка
+    neighbors = list(build_neighbors(backend, chunk_size))
+    existing = set(Product.objects.values_list('pk', flat=True))
+    with transaction.atomic():
+        ProductNeighbor.objects.all().delete()
+        ProductNeighbor.objects.bulk_create(
+            (
+                ProductNeighbor(product_id=product_id, neighbor_id=neighbor_id, score=score)
+                for product_id, neighbor_id, score in neighbors
+                if product_id in existing and neighbor_id in existing
+            ),
+            batch_size=batch_size,
+        )
+    return len(neighbors)
+
+
+def record_order(product_ids):
+    # вызывается задачей recommendations.record_order после коммита заказа (shop/tasks.py)
+    basket = sorted(Product.objects.filter(pk__in=set(product_ids)).values_list('pk', flat=True))
+    if not 2 <= len(basket) <= max_basket():
+        return
+    # та же схема, что у сводок продаж: недостающие пары без конфликтов, затем один UPDATE с приращением
+    ProductNeighbor.objects.bulk_create(
+        [ProductNeighbor(product_id=left, neighbor_id=right) for left, right in itertools.permutations(basket, 2)],
+        ignore_conflicts=True,
+    )
+    ProductNeighbor.objects.filter(product_id__in=basket, neighbor_id__in=basket).update(score=F('score') + 1)
+    # у каждого товара остаются top-K соседей; пара, вытесненная раньше, возвращается со счётом 1,
+    # точный счёт ей вернёт очередной rebuild_recommendations
+    k = top_k()
+    for product_id in basket:
+        extra = list(
+            ProductNeighbor.objects.filter(product_id=product_id)
+            .order_by('-score', 'neighbor_id')
+            .values_list('pk', flat=True)[k:]
+        )
+        if extra:
+            ProductNeighbor.objects.filter(pk__in=extra).delete()
+
+
+def bought_together(product_id, limit=None):
+    # одна выборка по уникальному индексу (product, neighbor) плюс join товара по первичному ключу
+    return (
+        ProductNeighbor.objects.filter(product_id=product_id)
+        .select_related('neighbor')
+        .order_by('-score', 'neighbor_id')[:limit or top_k()]
+    )
@@ -0,0 +1,176 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+
+from .models import Product, StockReservation
+
+RESERVE_ATTEMPTS = 3
+
+
+def reservation_ttl():
+    return getattr(settings, 'SHOP_STOCK_RESERVATION_TTL', 0)
+
+
+def reservations_enabled():
+    return reservation_ttl() > 0
+
+
+def available_quantity(product_id):
+    return (
+        Product.objects.filter(pk=product_id)
+        .annotate(available=F('stock') - F('reserved'))
+        .values_list('available', flat=True)
+        .first()
+    ) or 0
+
+
+def _decrement_reserved(amounts):
+    if amounts:
+        Product.objects.filter(pk__in=amounts).update(
+            reserved=Case(*(When(pk=pk, then=F('reserved') - amount) for pk, amount in amounts.items()))
+        )
+
+
+def _check_cart_key(cart_key):
+    # без ключа строку резерва не найти при оформлении, а единицы в Product.reserved так и остались бы занятыми
+    if not cart_key:
+        raise ValueError('Резерв без ключа корзины')
+
+
+def _hold(cart_key, amounts):
+    # на каждый товар одна строка резерва на корзину: повторное добавление увеличивает её и продлевает срок.
+    # вызывается в транзакции вместе с увеличением Product.reserved: если строка не записалась, откатываем и его
+    expires_at = timezone.now() + timedelta(seconds=reservation_ttl())
+    StockReservation.objects.bulk_create(
+        [
+            StockReservation(cart_key=cart_key, product_id=pk, quantity=0, expires_at=expires_at)
+            for pk in amounts
+        ],
+        ignore_conflicts=True,
+    )
+    held = StockReservation.objects.filter(cart_key=cart_key, product_id__in=amounts).update(
+        quantity=Case(*(When(product_id=pk, then=F('quantity') + amount) for pk, amount in amounts.items())),
+        expires_at=expires_at,
+    )
+    if held != len(amounts):
+        raise IntegrityError(f'Записано {held} резервов из {len(amounts)} для корзины {cart_key}')
+
+
+def reserve(cart_key, product_id, quantity):
+    # сколько удалось удержать: столько, сколько просили, или меньше, если доступного остатка не хватает.
+    # строку товара не блокируем: условный UPDATE сработает только если остаток за время чтения не разобрали
+    _check_cart_key(cart_key)
+    for _ in range(RESERVE_ATTEMPTS):
+        granted = min(quantity, available_quantity(product_id))
+        if granted < 1:
+            if release_expired(product_id=product_id):
+                continue
+            return 0
+        with transaction.atomic():
+            updated = Product.objects.filter(pk=product_id, stock__gte=F('reserved') + granted).update(
+                reserved=F('reserved') + granted
+            )
+            if updated:
+                _hold(cart_key, {product_id: granted})
+                return granted
+    return 0
+
+
+def reserve_many(cart_key, quantities):
+    # оптимистичный путь — одно чтение и один UPDATE на всю пачку; если кто-то успел раньше, добираем по одному
+    _check_cart_key(cart_key)
+    available = dict(
+        Product.objects.filter(pk__in=quantities)
+        .annotate(available=F('stock') - F('reserved'))
+        .values_list('pk', 'available')
+    )
+    grants = {
+        pk: min(quantity, available[pk]) for pk, quantity in quantities.items() if available.get(pk, 0) > 0
+    }
+    if not grants:
+        return {}
+    amount = Case(*(When(pk=pk, then=granted) for pk, granted in grants.items()))
+    with transaction.atomic():
+        updated = Product.objects.filter(pk__in=grants, stock__gte=F('reserved') + amount).update(
+            reserved=F('reserved') + amount
+        )
+        if updated == len(grants):
+            _hold(cart_key, grants)
+            return grants
+        transaction.set_rollback(True)
+    grants = {pk: reserve(cart_key, pk, quantities[pk]) for pk in grants}
+    return {pk: granted for pk, granted in grants.items() if granted}
+
+
+def release(cart_key, product_id, quantity):
+    with transaction.atomic():
+        reservation = (
+            StockReservation.objects.select_for_update()
+            .filter(cart_key=cart_key, product_id=product_id)
+            .first()
+        )
+        if reservation is None:
+            return 0
+        released = min(quantity, reservation.quantity)
+        if released == reservation.quantity:
+            reservation.delete()
+        else:
+            StockReservation.objects.filter(pk=reservation.pk).update(quantity=F('quantity') - released)
+        _decrement_reserved({product_id: released})
+        return released
+
+
+def take_held(cart_key, product_ids):
+    # вызывается внутри транзакции оформления: забирает резервы корзины целиком, включая просроченные,
+    # которые ещё не вернули в остаток — их единицы пока числятся в Product.reserved
+    if not cart_key:
+        return {}
+    reservations = StockReservation.objects.select_for_update().filter(
+        cart_key=cart_key, product_id__in=product_ids
+    )
+    held = dict(reservations.values_list('product_id', 'quantity'))
+    if held:
+        reservations.delete()
+    return held
+
+
+def _release_rows(rows):
+    StockReservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+    amounts = defaultdict(int)
+    for _, pk, quantity in rows:
+        amounts[pk] += quantity
+    _decrement_reserved(amounts)
+
+
+def release_expired(batch_size=500, product_id=None):
+    reservations = StockReservation.objects.filter(expires_at__lte=timezone.now())
+    if product_id is not None:
+        reservations = reservations.filter(product_id=product_id)
+    with transaction.atomic():
+        # skip_locked: резервы, которые прямо сейчас списывает оформление заказа, пропускаем
+        rows = list(
+            reservations.select_for_update(skip_locked=True)
+            .order_by('expires_at')
+            .values_list('pk', 'product_id', 'quantity')[:batch_size]
+        )
+        if not rows:
+            return 0
+        _release_rows(rows)
+    return len(rows)
+
+
+def release_carts(cart_keys):
+    # брошенные корзины (gc_carts): их резервы возвращаем в остаток сразу, не дожидаясь срока
+    with transaction.atomic():
+        rows = list(
+            StockReservation.objects.select_for_update(skip_locked=True)
+            .filter(cart_key__in=cart_keys)
+            .values_list('pk', 'product_id', 'quantity')
+        )
+        if rows:
+            _release_rows(rows)
+    return len(rows)
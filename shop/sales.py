@@ -0,0 +1,145 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Max, Min, Sum, When
+from django.utils import timezone
+
+from .models import CategoryDailySales, Order, OrderItem, ProductDailySales
+
+CENTS = Decimal('0.01')
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def sales_day(moment):
+    return timezone.localdate(moment)
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def _increment(model, key, name_field, day, totals):
+    # та же схема, что у резервов: пустые строки на день без конфликтов, затем один UPDATE с приращением
+    totals = dict(totals)
+    orphaned = totals.pop(None, None)
+    if totals:
+        model.objects.bulk_create(
+            [model(day=day, **{key: pk, name_field: name}) for pk, (name, _, _) in totals.items()],
+            ignore_conflicts=True,
+        )
+        model.objects.filter(day=day, **{f'{key}__in': totals}).update(
+            units=Case(*(When(**{key: pk}, then=F('units') + units) for pk, (_, units, _) in totals.items())),
+            revenue=Case(
+                *(When(**{key: pk}, then=F('revenue') + revenue) for pk, (_, _, revenue) in totals.items()),
+                output_field=MONEY,
+            ),
+        )
+    if orphaned is not None:
+        # товар (категорию) удалили до запуска задачи: NULL не конфликтует в уникальном ключе и не попадает в IN,
+        # поэтому строку без ключа ищем отдельно — как и rebuild_day, все такие позиции копятся в одной строке за день
+        name, units, revenue = orphaned
+        updated = model.objects.filter(day=day, **{f'{key}__isnull': True}).update(
+            units=F('units') + units, revenue=F('revenue') + revenue
+        )
+        if not updated:
+            model.objects.create(day=day, **{key: None, name_field: name}, units=units, revenue=revenue)
+
+
+def record_order(order, items, categories):
+    # вызывается задачей sales.record_order после коммита заказа (shop/tasks.py)
+    # categories: product_id -> (category_id, category_name); товара, удалённого до запуска задачи, в нём нет
+    day = sales_day(order.created_at)
+    by_product = {}
+    by_category = defaultdict(lambda: ['', 0, Decimal('0.00')])
+    for item in items:
+        by_product[item.product_id] = (item.product_name, item.quantity, item.subtotal())
+        category_id, category_name = categories.get(item.product_id, (None, ''))
+        row = by_category[category_id]
+        row[0] = category_name
+        row[1] += item.quantity
+        row[2] += item.subtotal()
+    _increment(ProductDailySales, 'product_id', 'product_name', day, by_product)
+    _increment(CategoryDailySales, 'category_id', 'category_name', day, by_category)
+
+
+def rebuild_day(day):
+    # пересчёт одного дня из заказов; единственное место, где сводки читают позиции и товары
+    start, end = day_bounds(day)
+    items = OrderItem.objects.filter(order__created_at__gte=start, order__created_at__lt=end).order_by()
+    revenue = Sum(F('quantity') * F('unit_price'), output_field=MONEY)
+    products = items.values('product_id').annotate(name=Max('product_name'), units=Sum('quantity'), revenue=revenue)
+    categories = items.values('product__category_id').annotate(
+        name=Max('product__category__name'), units=Sum('quantity'), revenue=revenue
+    )
+    with transaction.atomic():
+        ProductDailySales.objects.filter(day=day).delete()
+        CategoryDailySales.objects.filter(day=day).delete()
+        ProductDailySales.objects.bulk_create([
+            ProductDailySales(
+                day=day, product_id=row['product_id'], product_name=row['name'],
+                units=row['units'], revenue=row['revenue'].quantize(CENTS),
+            )
+            for row in products
+        ])
+        # позиции удалённых товаров попадают в строку без категории
+        CategoryDailySales.objects.bulk_create([
+            CategoryDailySales(
+                day=day, category_id=row['product__category_id'], category_name=row['name'] or '',
+                units=row['units'], revenue=row['revenue'].quantize(CENTS),
+            )
+            for row in categories
+        ])
+    return sum(row['units'] for row in products)
+
+
+def order_days():
+    bounds = Order.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+    if bounds['first'] is None:
+        return None, None
+    return sales_day(bounds['first']), sales_day(bounds['last'])
+
+
+def rebuild(start=None, end=None):
+    # по дню за транзакцию: оформление заказов ждёт блокировку не дольше пересчёта одного дня
+    first, last = order_days()
+    start = start or first
+    end = end or last
+    if start is None or end is None:
+        return
+    day = start
+    while day <= end:
+        yield day, rebuild_day(day)
+        day += timedelta(days=1)
+
+
+def product_report(start, end, limit=None):
+    rows = (
+        ProductDailySales.objects.filter(day__gte=start, day__lte=end)
+        .values('product_id')
+        .annotate(name=Max('product_name'), units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue', 'product_id')
+    )
+    return rows[:limit] if limit else rows
+
+
+def category_report(start, end, limit=None):
+    rows = (
+        CategoryDailySales.objects.filter(day__gte=start, day__lte=end)
+        .values('category_id')
+        .annotate(name=Max('category_name'), units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue', 'category_id')
+    )
+    return rows[:limit] if limit else rows
+
+
+def daily_totals(start, end):
+    # по категориям строк меньше, чем по товарам, итог за день тот же
+    return (
+        CategoryDailySales.objects.filter(day__gte=start, day__lte=end)
+        .values('day')
+        .annotate(units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('day')
+    )
@@ -0,0 +1,90 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+
+FTS_TABLE = 'shop_product_fts'
+
+CREATE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description, content='shop_product', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON shop_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON shop_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description ON shop_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+DROP_FTS_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+# name весит больше описания при ранжировании bm25
+RANK_CONFIG_SQL = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25(10.0, 1.0)')"
+
+
+def fts_enabled(using=connection):
+    return using.vendor == 'sqlite' and getattr(settings, 'SHOP_SEARCH_BACKEND', 'fts') == 'fts'
+
+
+def install_fts(schema_connection, rebuild=True):
+    if schema_connection.vendor != 'sqlite':
+        return
+    with schema_connection.cursor() as cursor:
+        for sql in CREATE_FTS_SQL:
+            cursor.execute(sql)
+        cursor.execute(RANK_CONFIG_SQL)
+        if rebuild:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def reinstall_fts_triggers(apps, schema_editor):
+    # SQLite пересоздаёт shop_product при изменении полей, а вместе со старой таблицей пропадают и триггеры FTS;
+    # rowid при копировании сохраняются, поэтому сам индекс пересобирать не нужно
+    install_fts(schema_editor.connection, rebuild=False)
+
+
+def uninstall_fts(schema_connection):
+    if schema_connection.vendor != 'sqlite':
+        return
+    with schema_connection.cursor() as cursor:
+        for sql in DROP_FTS_SQL:
+            cursor.execute(sql)
+
+
+def build_match_expression(query):
+    tokens = re.findall(r'\w+', query)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_like(queryset, query):
+    return queryset.filter(name__icontains=query)
+
+
+def search_fts(queryset, query):
+    match = build_match_expression(query)
+    if not match:
+        return search_like(queryset, query)
+    ordering = queryset.query.order_by
+    # соединяемся с FTS-таблицей напрямую: коррелированный подзапрос с MATCH пересчитывал бы поиск на каждую строку
+    return queryset.extra(
+        select={'search_rank': f'{FTS_TABLE}.rank'},
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = shop_product.id', f'{FTS_TABLE} MATCH %s'],
+        params=[match],
+    ).order_by('search_rank', *ordering)
+
+
+def search_products(queryset, query):
+    if fts_enabled():
+        return search_fts(queryset, query)
+    return search_like(queryset, query)
@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .categories import bump_categories_version
+from .models import Category, Product
+from .page_cache import bump_generations
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_registry(sender, **kwargs):
+    # версию поднимаем после коммита, иначе другой воркер может закешировать старые данные под новой версией
+    transaction.on_commit(bump_categories_version)
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_category(sender, instance, **kwargs):
+    instance._previous_category_id = None
+    if instance.pk:
+        instance._previous_category_id = (
+            Product.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+        )
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_pages(sender, instance, **kwargs):
+    category_ids = {instance.category_id, getattr(instance, '_previous_category_id', None)}
+    transaction.on_commit(lambda: bump_generations(category_ids))
@@ -0,0 +1,126 @@
+import gzip
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# уже сжатые форматы (png, jpg, webp, woff2) повторно не жмём
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico', '.ttf', '.otf'}
+# вариант пишем, только если он заметно меньше исходника
+MIN_COMPRESSION_RATIO = 0.95
+# порядок предпочтения при выборе Content-Encoding
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def brotli_available():
+    return brotli is not None
+
+
+def compress_workers():
+    return getattr(settings, 'SHOP_STATIC_COMPRESS_WORKERS', None) or os.cpu_count() or 1
+
+
+def mutable_max_age():
+    return getattr(settings, 'SHOP_STATIC_MAX_AGE', 60)
+
+
+def compress_file(path):
+    path = Path(path)
+    data = path.read_bytes()
+    written = []
+    # mtime=0: одинаковый вход даёт побайтно одинаковый .gz при каждом collectstatic
+    variants = [('.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', lambda: brotli.compress(data, quality=11)))
+    for suffix, compress in variants:
+        compressed = compress()
+        target = path.with_name(path.name + suffix)
+        if len(compressed) < len(data) * MIN_COMPRESSION_RATIO:
+            target.write_bytes(compressed)
+            written.append(target)
+        elif target.exists():
+            target.unlink()
+    return path, written
+
+
+def compress_files(paths, workers=None):
+    # zlib и brotli отпускают GIL на время сжатия, поэтому хватает потоков
+    with ThreadPoolExecutor(max_workers=workers or compress_workers()) as pool:
+        yield from pool.map(compress_file, paths)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # к хешированным именам collectstatic добавляет .gz (и .br, если установлен brotli) рядом с файлом
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # collectstatic ещё не запускали (тесты, свежий checkout с DEBUG=False): отдаём имя без хеша,
+            # такой файл StaticAssetsMiddleware кеширует ненадолго, а не навсегда
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        targets = []
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            yield name, hashed_name, processed
+            if isinstance(processed, Exception):
+                continue
+            for candidate in {name, hashed_name}:
+                if candidate and Path(candidate).suffix.lower() in COMPRESSIBLE_EXTENSIONS:
+                    targets.append(self.path(candidate))
+        if dry_run:
+            return
+        root = Path(self.location)
+        for path, written in compress_files(targets):
+            for target in written:
+                yield str(path.relative_to(root)), str(target.relative_to(root)), True
+
+
+class StaticAsset:
+    def __init__(self, path, immutable):
+        self.path = path
+        stat = path.stat()
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.immutable = immutable
+        self.content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        self.etag = f'{int(stat.st_mtime):x}-{stat.st_size:x}'
+        self.variants = {
+            encoding: path.with_name(path.name + suffix)
+            for encoding, suffix in ENCODINGS
+            if path.with_name(path.name + suffix).exists()
+        }
+
+
+def build_static_index(root, url_prefix):
+    # один проход по STATIC_ROOT при первом запросе: дальше отдача файла — поиск в словаре без stat на диске
+    root = Path(root)
+    if not root.is_dir():
+        return {}
+    storage = staticfiles_storage
+    hashed_names = set()
+    if isinstance(storage, ManifestStaticFilesStorage):
+        # манифест читаем заново: collectstatic мог пройти уже после старта процесса
+        hashed_files, _ = storage.load_manifest()
+        hashed_names = {name for original, name in hashed_files.items() if name != original}
+    skipped_suffixes = tuple(suffix for _, suffix in ENCODINGS)
+    manifest_name = getattr(storage, 'manifest_name', None)
+    index = {}
+    for path in root.rglob('*'):
+        if not path.is_file() or path.name.endswith(skipped_suffixes) or path.name == manifest_name:
+            continue
+        name = path.relative_to(root).as_posix()
+        index[url_prefix + name] = StaticAsset(path, name in hashed_names)
+    return index
@@ -0,0 +1,246 @@
+import logging
+import random
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Avg, Count, F, Max, Min
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger('shop.tasks')
+
+# имя задачи -> определение; заполняется декоратором task при импорте shop.tasks (см. ShopConfig.ready)
+TASKS = {}
+LOST = 'lost'
+
+
+class TaskLostError(Exception):
+    # requeue_stale уже вернул задачу в очередь, и её мог забрать другой воркер
+    pass
+
+
+class TaskDefinition:
+    def __init__(self, name, func, max_attempts, atomic):
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+        # atomic: функция и отметка о выполнении в одной транзакции — повтор после сбоя не применит изменения дважды
+        self.atomic = atomic
+
+
+def task(name, max_attempts=None, atomic=False):
+    def decorator(func):
+        TASKS[name] = TaskDefinition(name, func, max_attempts, atomic)
+        func.task_name = name
+        return func
+    return decorator
+
+
+def default_max_attempts():
+    return getattr(settings, 'SHOP_TASK_MAX_ATTEMPTS', 5)
+
+
+def retry_base():
+    return getattr(settings, 'SHOP_TASK_RETRY_BASE', 2)
+
+
+def retry_max_delay():
+    return getattr(settings, 'SHOP_TASK_RETRY_MAX', 300)
+
+
+def stale_timeout():
+    return getattr(settings, 'SHOP_TASK_STALE_TIMEOUT', 600)
+
+
+def retention():
+    return getattr(settings, 'SHOP_TASK_RETENTION', 7 * 24 * 60 * 60)
+
+
+def backoff(attempts):
+    # экспоненциальная задержка с разбросом, чтобы задачи, упавшие одновременно, не повторялись одной волной
+    delay = min(retry_max_delay(), retry_base() * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def enqueue(name, payload=None, key=None, delay=0):
+    if name not in TASKS:
+        raise ValueError(f'Неизвестная задача: {name}')
+    definition = TASKS[name]
+
+    def insert():
+        Task.objects.bulk_create(
+            [Task(
+                name=name,
+                payload=payload or {},
+                idempotency_key=key,
+                max_attempts=definition.max_attempts or default_max_attempts(),
+                run_at=timezone.now() + timedelta(seconds=delay),
+            )],
+            ignore_conflicts=True,
+        )
+
+    # задача появляется только после коммита вызывающей транзакции: откат заказа не оставит в очереди работы,
+    # а сама вставка не удлиняет транзакцию оформления; вне транзакции on_commit выполняет сразу
+    transaction.on_commit(insert)
+
+
+def claim(worker, limit):
+    now = timezone.now()
+    with transaction.atomic():
+        # в SQLite транзакция IMMEDIATE уже держит блокировку записи, в PostgreSQL воркеры не ждут друг друга
+        ids = list(
+            Task.objects.select_for_update(skip_locked=True)
+            .filter(status=Task.PENDING, run_at__lte=now)
+            .order_by('run_at', 'pk')
+            .values_list('pk', flat=True)[:limit]
+        )
+        if ids:
+            Task.objects.filter(pk__in=ids, status=Task.PENDING).update(
+                status=Task.RUNNING, locked_by=worker, started_at=now, attempts=F('attempts') + 1
+            )
+    return ids
+
+
+def elapsed_ms(start, end):
+    return max(0, int((end - start).total_seconds() * 1000))
+
+
+def execute(pk, worker):
+    task_row = Task.objects.get(pk=pk)
+    definition = TASKS.get(task_row.name)
+    start = time.perf_counter()
+    finished = {
+        'status': Task.DONE,
+        'wait_ms': elapsed_ms(task_row.run_at, task_row.started_at),
+        'last_error': '',
+    }
+    try:
+        if definition is None:
+            raise LookupError(f'Задача {task_row.name} не зарегистрирована')
+        if definition.atomic:
+            # mark падает, если задача уже не наша, — изменения задачи откатываются вместе с отметкой
+            with transaction.atomic():
+                definition.func(**task_row.payload)
+                mark(pk, worker, run_ms=int((time.perf_counter() - start) * 1000), **finished)
+        else:
+            definition.func(**task_row.payload)
+            mark(pk, worker, run_ms=int((time.perf_counter() - start) * 1000), **finished)
+    except TaskLostError:
+        return lost(task_row, worker)
+    except Exception:
+        return fail(task_row, worker, traceback.format_exc(limit=5), time.perf_counter() - start)
+    return Task.DONE
+
+
+def run_task(pk, worker):
+    # точка входа для пула run_workers; в потоке соединение своё, протухшее закрываем, как после запроса
+    try:
+        return execute(pk, worker)
+    finally:
+        close_old_connections()
+
+
+def mark(pk, worker, **fields):
+    updated = Task.objects.filter(pk=pk, status=Task.RUNNING, locked_by=worker).update(
+        finished_at=timezone.now(), **fields
+    )
+    if not updated:
+        raise TaskLostError(f'Задача #{pk} больше не закреплена за воркером {worker}')
+
+
+def lost(task_row, worker):
+    logger.warning(
+        'Задача %s #%s ушла от воркера %s (зависла и возвращена в очередь), результат отброшен',
+        task_row.name, task_row.pk, worker,
+    )
+    return LOST
+
+
+def fail(task_row, worker, error, duration):
+    now = timezone.now()
+    fields = {
+        'last_error': error[-4000:],
+        'wait_ms': elapsed_ms(task_row.run_at, task_row.started_at),
+        'run_ms': int(duration * 1000),
+    }
+    if task_row.attempts >= task_row.max_attempts:
+        logger.error('Задача %s #%s не выполнена за %s попыток:\n%s', task_row.name, task_row.pk, task_row.attempts, error)
+        try:
+            mark(task_row.pk, worker, status=Task.FAILED, **fields)
+        except TaskLostError:
+            return lost(task_row, worker)
+        return Task.FAILED
+    delay = backoff(task_row.attempts)
+    logger.warning('Задача %s #%s упала (попытка %s), повтор через %.1f с', task_row.name, task_row.pk, task_row.attempts, delay)
+    updated = Task.objects.filter(pk=task_row.pk, status=Task.RUNNING, locked_by=worker).update(
+        status=Task.PENDING, locked_by='', run_at=now + timedelta(seconds=delay), **fields
+    )
+    if not updated:
+        return lost(task_row, worker)
+    return 'retry'
+
+
+def requeue_stale():
+    # воркер умер посреди задачи: через SHOP_TASK_STALE_TIMEOUT она возвращается в очередь как неудачная попытка
+    cutoff = timezone.now() - timedelta(seconds=stale_timeout())
+    stale = Task.objects.filter(status=Task.RUNNING, started_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Task.FAILED, finished_at=timezone.now(), last_error='Воркер не завершил задачу'
+    )
+    requeued = stale.update(status=Task.PENDING, locked_by='', run_at=timezone.now())
+    return requeued, failed
+
+
+def purge_finished(batch_size=1000):
+    cutoff = timezone.now() - timedelta(seconds=retention())
+    deleted = 0
+    while True:
+        ids = list(
+            Task.objects.filter(status=Task.DONE, finished_at__lt=cutoff).values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += Task.objects.filter(pk__in=ids).delete()[0]
+
+
+def queue_stats(window=300):
+    now = timezone.now()
+    counts = dict(Task.objects.values_list('status').annotate(count=Count('pk')).order_by())
+    ready = Task.objects.filter(status=Task.PENDING, run_at__lte=now).aggregate(count=Count('pk'), oldest=Min('run_at'))
+    recent = Task.objects.filter(status=Task.DONE, finished_at__gte=now - timedelta(seconds=window)).aggregate(
+        count=Count('pk'), wait_mean=Avg('wait_ms'), wait_max=Max('wait_ms'), run_mean=Avg('run_ms')
+    )
+    return {
+        'depth': {status: counts.get(status, 0) for status, _ in Task.STATUSES},
+        'ready': ready['count'],
+        'oldest_ready_seconds': round((now - ready['oldest']).total_seconds(), 3) if ready['oldest'] else 0.0,
+        'window_seconds': window,
+        'completed': recent['count'],
+        'wait_ms_mean': round(recent['wait_mean'] or 0, 3),
+        'wait_ms_max': recent['wait_max'] or 0,
+        'run_ms_mean': round(recent['run_mean'] or 0, 3),
+    }
+
+
+def prometheus(stats):
+    lines = [
+        '# HELP shop_task_queue_depth Задачи в очереди по статусам',
+        '# TYPE shop_task_queue_depth gauge',
+    ]
+    for status, count in stats['depth'].items():
+        lines.append(f'shop_task_queue_depth{{status="{status}"}} {count}')
+    for name, key, help_text in (
+        ('shop_task_ready', 'ready', 'Задачи, готовые к выполнению'),
+        ('shop_task_oldest_ready_seconds', 'oldest_ready_seconds', 'Сколько ждёт самая старая готовая задача'),
+        ('shop_task_wait_ms_mean', 'wait_ms_mean', 'Среднее ожидание в очереди за окно'),
+        ('shop_task_run_ms_mean', 'run_ms_mean', 'Среднее время выполнения за окно'),
+        ('shop_task_completed_window', 'completed', 'Выполнено задач за окно'),
+    ):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+        lines.append(f'{name} {stats[key]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,43 @@
+import logging
+
+from django.conf import settings
+from django.db.models import F
+
+from .models import Order, Product
+from .recommendations import record_order as record_order_neighbors
+from .sales import record_order
+from .taskqueue import task
+
+logger = logging.getLogger('shop.tasks')
+
+
+def low_stock_threshold():
+    return getattr(settings, 'SHOP_LOW_STOCK_THRESHOLD', 5)
+
+
+@task('sales.record_order', atomic=True)
+def record_order_sales(order_id):
+    # atomic: сводки и отметка о выполнении коммитятся вместе, повтор не посчитает заказ дважды
+    order = Order.objects.get(pk=order_id)
+    items = list(order.order_items.all())
+    categories = {
+        pk: (category_id, category_name)
+        for pk, category_id, category_name in Product.objects.filter(
+            pk__in=[item.product_id for item in items]
+        ).values_list('pk', 'category_id', 'category__name')
+    }
+    record_order(order, items, categories)
+
+
+@task('recommendations.record_order', atomic=True)
+def record_order_recommendations(product_ids):
+    record_order_neighbors(product_ids)
+
+
+@task('stock.low_stock_alert')
+def low_stock_alert(product_ids):
+    rows = Product.objects.filter(pk__in=product_ids, stock__lt=F('reserved') + low_stock_threshold()).values_list(
+        'pk', 'name', 'stock', 'reserved'
+    )
+    for pk, name, stock, reserved in rows:
+        logger.warning('Заканчивается товар #%s %s: свободно %s шт.', pk, name, max(0, stock - reserved))
@@ -0,0 +1,38 @@
+from django import template
+from django.templatetags.static import static
+
+from shop.images import image_formats, image_sizes, variant_url
+
+register = template.Library()
+
+PLACEHOLDER = 'images/placeholder.svg'
+MIME_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
+def density_variants(size):
+    # 1x — запрошенный вариант, 2x — следующий по размеру (для экранов с высокой плотностью)
+    names = sorted(image_sizes(), key=image_sizes().get)
+    index = names.index(size)
+    return [(name, f'{density}x') for density, name in enumerate(names[index:index + 2], start=1)]
+
+
+@register.inclusion_tag('shop/product_image.html')
+def product_image(product, size='card', css_class=''):
+    context = {'alt': product.name, 'css_class': css_class}
+    if not product.image_digest or size not in image_sizes():
+        context['src'] = product.image or static(PLACEHOLDER)
+        return context
+
+    digest = product.image_digest
+    variants = density_variants(size)
+    *modern, fallback = image_formats()
+    context['sources'] = [
+        {
+            'type': MIME_TYPES[fmt],
+            'srcset': ', '.join(f'{variant_url(digest, name, fmt)} {density}' for name, density in variants),
+        }
+        for fmt in modern
+    ]
+    context['src'] = variant_url(digest, size, fallback)
+    context['srcset'] = ', '.join(f'{variant_url(digest, name, fallback)} {density}' for name, density in variants)
+    return context
@@ -0,0 +1,31 @@
+from time import perf_counter
+
+from django.template.backends.django import DjangoTemplates
+
+from .metrics import record_template_time
+
+
+class InstrumentedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    @property
+    def origin(self):
+        return self.template.origin
+
+    def render(self, context=None, request=None):
+        start = perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            record_template_time(perf_counter() - start)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    # время рендеринга шаблона верхнего уровня попадает в метрики текущего запроса
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(super().get_template(template_name))
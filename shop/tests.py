@@ -1,3 +1,764 @@
-from django.test import TestCase
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .bench import seed_catalog
+from .cart import DatabaseCart
+from .checkout import place_order
+from .facets import build_facets, facet_grid, parse_filters
+from .images import resolve_source
+from .management.commands.replay_traffic import Command as ReplayCommand, TestClientDriver, load_sessions
+from .middleware import ReadYourWritesMiddleware
+from .models import (
+    CartItem, Category, CategoryDailySales, Order, OrderItem, Product, ProductDailySales, StockReservation, Task,
+)
+from .recommendations import build_neighbors, numpy_available
+from .reservations import release_expired, reserve
+from .sales import rebuild_day, sales_day
+from .search import search_products
+from .taskqueue import LOST, execute
+
+
+@override_settings(DEBUG=False)
+class StaticFilesWithoutManifestTests(TestCase):
+    def test_pages_render_before_collectstatic(self):
+        category = Category.objects.create(name='Чай', slug='tea')
+        product = Product.objects.create(name='Улун', category=category, price=100, stock=1)
+        for url in (reverse('products'), reverse('product_detail', args=[product.pk])):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, '/static/images/shop_logo.png')
+
+
+class PerformanceMiddlewareTests(TransactionTestCase):
+    # вне транзакции теста роутер действительно отправляет чтение каталога на реплику
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Чай', slug='tea')
+        self.product = Product.objects.create(name='Улун', category=category, price=100, stock=1)
+
+    def test_replica_queries_are_counted(self):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(reverse('product_detail', args=[self.product.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(replica.captured_queries)
+        counted = int(re.search(r'"(\d+) queries"', response['Server-Timing']).group(1))
+        self.assertEqual(counted, len(primary.captured_queries) + len(replica.captured_queries))
+
+
+class PageCacheKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Чай', slug='tea')
+        Product.objects.create(name='Улун', category=category, price=100, stock=1)
+
+    def test_empty_cursor_is_cached_separately(self):
+        url = reverse('products')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'MISS')
+        response = self.client.get(url, {'cursor': ''})
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertTrue(response.context['cursor_pagination'])
+        self.assertEqual(self.client.get(url, {'cursor': ''})['X-Page-Cache'], 'HIT')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+
+
+@override_settings(
+    SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies',
+    SHOP_CART_BACKEND='shop.cart.SessionCart',
+    SHOP_STOCK_RESERVATION_TTL=600,
+)
+class SignedCookieReservationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Чай', slug='tea')
+        self.product = Product.objects.create(name='Улун', category=category, price=100, stock=5)
+
+    def test_holds_survive_session_rewrites_until_checkout(self):
+        for _ in range(2):
+            self.client.post(reverse('add_to_cart', args=[self.product.pk]), {'quantity': 1})
+        reservation = StockReservation.objects.get()
+        self.assertEqual(reservation.quantity, 2)
+        self.assertEqual(reservation.cart_key, self.client.session['cart_key'])
+
+        response = self.client.post(
+            reverse('order_create'), {'username': 'Айбек', 'phone': '+996555000000', 'address': 'Бишкек'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (3, 0))
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(Order.objects.get().item_count, 2)
+
+    def test_reserve_without_cart_key_is_refused(self):
+        with self.assertRaises(ValueError):
+            reserve(None, self.product.pk, 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 0)
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Чай', slug='tea')
+        self.product = Product.objects.create(name='Улун', category=category, price=15, stock=3)
+
+    def post_batch(self, quantity):
+        return self.client.post(
+            reverse('cart_batch'),
+            json.dumps({'items': [{'product_id': self.product.pk, 'quantity': quantity}]}),
+            content_type='application/json',
+        ).json()
+
+    def test_line_is_capped_before_reserving(self):
+        self.client.post(reverse('add_to_cart', args=[self.product.pk]), {'quantity': 1})
+        StockReservation.objects.all().delete()
+        Product.objects.filter(pk=self.product.pk).update(reserved=0)
+        # строка без резерва (резерв истёк и вернулся в остаток): места в ней осталось на 2 шт. из 3
+        state = self.post_batch(5)
+        self.assertEqual(state['items'][0]['quantity'], 3)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 2)
+        self.assertEqual(StockReservation.objects.get().quantity, 2)
+
+    def test_amounts_keep_two_decimal_places(self):
+        state = self.post_batch(2)
+        self.assertEqual(state['items'][0]['subtotal'], '30.00')
+        self.assertEqual(state['total'], '30.00')
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Чай', slug='tea')
+        product = Product.objects.create(name='Улун', category=category, price=15, stock=3)
+        order = Order.objects.create(username='Айбек', phone='+996555000000', address='Бишкек', total=15, item_count=1)
+        OrderItem.objects.create(order=order, product=product, product_name=product.name, unit_price=15, quantity=1)
+        self.order, self.category = order, category
+        now = timezone.now()
+        self.task = Task.objects.create(
+            name='sales.record_order', payload={'order_id': order.pk}, status=Task.RUNNING,
+            attempts=1, run_at=now, started_at=now, locked_by='worker-a',
+        )
+
+    def test_stale_worker_rolls_back_atomic_task(self):
+        # пока worker-a работал, requeue_stale вернул задачу в очередь и её забрал worker-b
+        Task.objects.filter(pk=self.task.pk).update(locked_by='worker-b')
+        with self.assertLogs('shop.tasks', 'WARNING'):
+            self.assertEqual(execute(self.task.pk, 'worker-a'), LOST)
+        self.assertFalse(ProductDailySales.objects.exists())
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.status, self.task.locked_by), (Task.RUNNING, 'worker-b'))
+
+    def test_owner_commits_atomic_task(self):
+        self.assertEqual(execute(self.task.pk, 'worker-a'), Task.DONE)
+        self.assertEqual(ProductDailySales.objects.get().units, 1)
+
+    def test_rollup_keeps_products_deleted_before_the_task_runs(self):
+        cup = Product.objects.create(name='Пиала', category=self.category, price=7, stock=3)
+        OrderItem.objects.create(order=self.order, product=cup, product_name=cup.name, unit_price=7, quantity=3)
+        cup.delete()
+        for _ in range(2):
+            self.assertEqual(execute(self.task.pk, 'worker-a'), Task.DONE)
+            Task.objects.filter(pk=self.task.pk).update(status=Task.RUNNING)
+
+        by_product = dict(ProductDailySales.objects.values_list('product_name', 'units'))
+        self.assertEqual(by_product, {'Улун': 2, 'Пиала': 6})
+        by_category = {
+            row.category_id: (row.units, row.revenue) for row in CategoryDailySales.objects.all()
+        }
+        self.assertEqual(by_category, {self.category.pk: (2, Decimal('30.00')), None: (6, Decimal('42.00'))})
+        # инкрементальные сводки совпадают с пересчётом дня из заказов
+        rebuild_day(sales_day(self.order.created_at))
+        self.assertEqual(dict(ProductDailySales.objects.values_list('product_name', 'units')), {'Улун': 1, 'Пиала': 3})
+
+
+# навигация по категориям читает все категории целиком — это ожидаемо
+ALLOWED_FULL_SCANS = {'shop_category'}
+FULL_SCAN_RE = re.compile(r'^SCAN (\w+)$')
+
+
+class QueryPlanTests(TransactionTestCase):
+    # вне транзакции теста каталог читается с реплики, как в работе, — планы проверяем на каждом алиасе
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        seed_catalog(2000)
+        # без статистики планировщик SQLite не знает, что категорий мало, и сортирует товары во временном B-дереве
+        with connections['default'].cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def hot_paths(self):
+        category = Category.objects.order_by('name').first()
+        product = Product.objects.filter(stock__gte=1).order_by('pk').first()
+        self.client.post(reverse('add_to_cart', args=[product.pk]), {'quantity': 1})
+        cart_item = CartItem.objects.get(product=product)
+        return [
+            ('products', 'get', reverse('products'), {}),
+            ('products page 3', 'get', reverse('products'), {'page': 3}),
+            ('products cursor', 'get', reverse('products'), {'cursor': ''}),
+            ('products search', 'get', reverse('products'), {'q': 'product 42'}),
+            ('products_by_category', 'get', reverse('products_by_category', args=[category.slug]), {}),
+            ('product_detail', 'get', reverse('product_detail', args=[product.pk]), {}),
+            ('add_to_cart', 'post', reverse('add_to_cart', args=[product.pk]), {'quantity': 1}),
+            ('cart', 'get', reverse('cart'), {}),
+            ('remove_from_cart', 'post', reverse('remove_from_cart', args=[cart_item.pk]), {}),
+        ]
+
+    def capture(self, method, url, data):
+        # кеш страниц отдал бы готовый HTML без единого запроса — каждую страницу строим заново;
+        # метка после POST перевела бы чтение каталога на основную базу — читаем, как после окна, с реплики
+        cache.clear()
+        self.client.cookies.pop(ReadYourWritesMiddleware.cookie_name, None)
+        with ExitStack() as stack:
+            captured = [
+                stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in sorted(self.databases)
+            ]
+            getattr(self.client, method)(url, data)
+        return [(context.connection, query['sql']) for context in captured for query in context.captured_queries]
+
+    def explain(self, connection, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_hot_paths_use_indexes(self):
+        for name, method, url, data in self.hot_paths():
+            with self.subTest(name):
+                queries = self.capture(method, url, data)
+                self.assertTrue(queries)
+                for connection, sql in queries:
+                    if not sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                        continue
+                    # COUNT(*) для нумерованных страниц линеен по определению, его убирает курсорная пагинация
+                    if sql.startswith('SELECT COUNT(*)'):
+                        continue
+                    for detail in self.explain(connection, sql):
+                        match = FULL_SCAN_RE.match(detail)
+                        self.assertFalse(
+                            match and match.group(1) not in ALLOWED_FULL_SCANS,
+                            f'{connection.alias}: {detail}\n{sql}',
+                        )
+
+
+class CartBackendTests:
+    # общие проверки обеих корзин; конкретный бэкенд и движок сессий задают подклассы через override_settings
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Чай', slug='tea')
+        self.tea = Product.objects.create(name='Улун', category=category, price=15, stock=5)
+        self.cup = Product.objects.create(name='Пиала', category=category, price=20, stock=2)
+
+    def add(self, product, quantity):
+        return self.client.post(reverse('add_to_cart', args=[product.pk]), {'quantity': quantity})
+
+    def state(self):
+        return self.client.get(reverse('cart_batch')).json()
+
+    def lines(self):
+        return {item['product_id']: item['quantity'] for item in self.state()['items']}
+
+    def assertReserved(self, product, quantity):
+        product.refresh_from_db()
+        self.assertEqual(product.reserved, quantity)
+        held = StockReservation.objects.filter(product=product).values_list('quantity', flat=True)
+        self.assertEqual(sum(held), quantity)
+
+    def test_add_is_capped_by_stock(self):
+        self.assertEqual(self.add(self.tea, 2).status_code, 302)
+        self.add(self.tea, 10)
+        self.assertEqual(self.lines(), {self.tea.pk: 5})
+        self.assertReserved(self.tea, 5)
+
+    def test_add_over_lapsed_hold_is_capped_by_stock(self):
+        self.add(self.cup, 1)
+        # резерв истёк и вернулся в остаток, а строка в корзине осталась
+        StockReservation.objects.all().delete()
+        Product.objects.filter(pk=self.cup.pk).update(reserved=0)
+        self.assertEqual(self.add(self.cup, 5).status_code, 302)
+        self.assertEqual(self.lines(), {self.cup.pk: 2})
+        self.assertReserved(self.cup, 1)
+
+    def test_add_many(self):
+        self.add(self.tea, 1)
+        response = self.client.post(
+            reverse('cart_batch'),
+            json.dumps({'items': [
+                {'product_id': self.tea.pk, 'quantity': 2},
+                {'product_id': self.cup.pk, 'quantity': 5},
+            ]}),
+            content_type='application/json',
+        )
+        state = response.json()
+        self.assertEqual(state['errors'], [])
+        self.assertEqual((state['count'], state['total']), (5, '85.00'))
+        self.assertEqual(self.lines(), {self.tea.pk: 3, self.cup.pk: 2})
+        self.assertReserved(self.tea, 3)
+        self.assertReserved(self.cup, 2)
+
+    def test_remove_one(self):
+        self.add(self.tea, 2)
+        line_id = self.state()['items'][0]['id']
+        self.client.post(reverse('remove_from_cart', args=[line_id]))
+        self.assertEqual(self.lines(), {self.tea.pk: 1})
+        self.assertReserved(self.tea, 1)
+        self.client.post(reverse('remove_from_cart', args=[line_id]))
+        self.assertEqual(self.lines(), {})
+        self.assertReserved(self.tea, 0)
+        self.assertEqual(self.client.post(reverse('remove_from_cart', args=[line_id])).status_code, 404)
+
+    def test_badge_follows_cart(self):
+        self.assertNotContains(self.client.get(reverse('products')), 'шт. ·')
+        self.add(self.tea, 2)
+        self.assertContains(self.client.get(reverse('products')), '2 шт. · 30.00 сом')
+        self.client.post(reverse('remove_from_cart', args=[self.state()['items'][0]['id']]))
+        self.assertContains(self.client.get(reverse('products')), '1 шт. · 15.00 сом')
+
+    def test_checkout_takes_holds_and_clears_cart(self):
+        self.add(self.tea, 2)
+        self.add(self.cup, 1)
+        response = self.client.post(
+            reverse('order_create'), {'username': 'Айбек', 'phone': '+996555000000', 'address': 'Бишкек'}
+        )
+        self.assertEqual(response.status_code, 302)
+        order = Order.objects.get()
+        self.assertEqual((order.item_count, order.total), (3, 50))
+        self.tea.refresh_from_db()
+        self.cup.refresh_from_db()
+        self.assertEqual((self.tea.stock, self.cup.stock), (3, 1))
+        self.assertReserved(self.tea, 0)
+        self.assertReserved(self.cup, 0)
+        self.assertEqual(self.lines(), {})
+        self.assertNotContains(self.client.get(reverse('products')), 'шт. ·')
+
+
+@override_settings(SHOP_CART_BACKEND='shop.cart.DatabaseCart')
+class DatabaseCartTests(CartBackendTests, TestCase):
+    pass
+
+
+@override_settings(SHOP_CART_BACKEND='shop.cart.SessionCart')
+class SessionCartTests(CartBackendTests, TestCase):
+    pass
+
+
+@override_settings(
+    SHOP_CART_BACKEND='shop.cart.DatabaseCart', SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies'
+)
+class DatabaseCartSignedCookiesTests(CartBackendTests, TestCase):
+    pass
+
+
+@override_settings(
+    SHOP_CART_BACKEND='shop.cart.SessionCart', SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies'
+)
+class SessionCartSignedCookiesTests(CartBackendTests, TestCase):
+    pass
+
+
+class ConcurrentReservationTests(TransactionTestCase):
+    # настоящие параллельные транзакции: у каждого потока своё соединение с файловой тестовой базой
+    databases = {'default', 'replica'}
+    shoppers = 12
+
+    def setUp(self):
+        category = Category.objects.create(name='Чай', slug='tea')
+        self.product = Product.objects.create(name='Улун', category=category, price=15, stock=10)
+
+    def shop(self, index):
+        cart = DatabaseCart(None, cart_key=f'shopper-{index}')
+        try:
+            cart.add(self.product, 1 + index % 3)
+            if index % 4 == 0:
+                cart.remove_one(cart.items().get().pk)
+            if index % 2 == 0:
+                place_order(cart, {'username': f'shopper {index}', 'phone': '+996555000000', 'address': 'Бишкек'})
+        except ValidationError:
+            pass
+        finally:
+            connections.close_all()
+
+    def test_stock_and_holds_stay_consistent(self):
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            list(pool.map(self.shop, range(self.shoppers)))
+        release_expired()
+
+        self.product.refresh_from_db()
+        sold = sum(OrderItem.objects.filter(product=self.product).values_list('quantity', flat=True))
+        held = sum(StockReservation.objects.filter(product=self.product).values_list('quantity', flat=True))
+        in_carts = sum(CartItem.objects.filter(product=self.product).values_list('quantity', flat=True))
+        self.assertGreaterEqual(self.product.stock, 0)
+        self.assertEqual(self.product.stock + sold, 10)
+        self.assertEqual(self.product.reserved, held)
+        self.assertEqual(held, in_carts)
+        self.assertLessEqual(self.product.reserved, self.product.stock)
+        self.assertTrue(sold)
+
+
+@override_settings(SHOP_RECOMMENDATIONS_TOP_K=2, SHOP_RECOMMENDATIONS_MAX_BASKET=3)
+class RecommendationBackendTests(TestCase):
+    baskets = [
+        [0, 1, 2], [0, 1], [0, 1, 3], [1, 2], [2, 3], [0, 2, 3],
+        # повтор товара в заказе, корзина из одного товара и корзина больше MAX_BASKET не учитываются
+        [4, 4], [3], [0, 1, 2, 3],
+    ]
+
+    def setUp(self):
+        category = Category.objects.create(name='Чай', slug='tea')
+        products = [
+            Product.objects.create(name=f'Товар {index}', category=category, price=10, stock=10) for index in range(5)
+        ]
+        for basket in self.baskets:
+            order = Order.objects.create(username='Айбек', phone='+996555000000', address='Бишкек')
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=products[index], product_name=products[index].name, unit_price=10)
+                for index in basket
+            ])
+
+    @skipUnless(numpy_available(), 'numpy не установлен')
+    def test_backends_agree(self):
+        expected = list(build_neighbors('python'))
+        self.assertTrue(expected)
+        # маленькие пачки: корзины разрезаются на границе пачки и переносятся в следующую
+        for chunk_size in (2, 3, 100_000):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(list(build_neighbors('numpy', chunk_size=chunk_size)), expected)
+
+
+class GarbageCollectCartsTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Чай', slug='tea')
+        self.tea = Product.objects.create(name='Улун', category=category, price=15, stock=10, reserved=3)
+        self.cup = Product.objects.create(name='Пиала', category=category, price=20, stock=10)
+        old = timezone.now() - timedelta(days=3)
+        expires_at = timezone.now() + timedelta(hours=1)
+        # live: одна строка давняя, другую только что добавили — корзина жива целиком
+        CartItem.objects.create(cart_key='live', product=self.tea, quantity=1)
+        CartItem.objects.create(cart_key='live', product=self.cup, quantity=1)
+        CartItem.objects.filter(cart_key='live', product=self.tea).update(updated_at=old)
+        CartItem.objects.create(cart_key='abandoned', product=self.tea, quantity=2)
+        CartItem.objects.create(cart_key='abandoned', product=self.cup, quantity=1)
+        CartItem.objects.filter(cart_key='abandoned').update(updated_at=old)
+        StockReservation.objects.create(cart_key='live', product=self.tea, quantity=1, expires_at=expires_at)
+        StockReservation.objects.create(cart_key='abandoned', product=self.tea, quantity=2, expires_at=expires_at)
+
+    def test_only_whole_stale_carts_are_removed(self):
+        call_command('gc_carts', max_age=24 * 60 * 60, pause=0, stdout=StringIO())
+        self.assertEqual(
+            sorted(CartItem.objects.values_list('cart_key', 'product__name')), [('live', 'Пиала'), ('live', 'Улун')]
+        )
+        self.assertEqual(list(StockReservation.objects.values_list('cart_key', flat=True)), ['live'])
+        self.tea.refresh_from_db()
+        self.assertEqual(self.tea.reserved, 1)
+
+
+class LegacySessionCartTests(TestCase):
+    # корзины, открытые до перехода на cart_key (миграция 0016), лежат под session_key серверной сессии
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Чай', slug='tea')
+        self.tea = Product.objects.create(name='Улун', category=category, price=15, stock=5, reserved=2)
+        self.cup = Product.objects.create(name='Пиала', category=category, price=20, stock=2)
+        session_key = self.client.session.session_key
+        CartItem.objects.create(cart_key=session_key, product=self.tea, quantity=2)
+        StockReservation.objects.create(
+            cart_key=session_key, product=self.tea, quantity=2, expires_at=timezone.now() + timedelta(hours=1)
+        )
+
+    def test_open_cart_survives_the_cutover(self):
+        state = self.client.get(reverse('cart_batch')).json()
+        self.assertEqual([(item['product_id'], item['quantity']) for item in state['items']], [(self.tea.pk, 2)])
+        self.client.post(reverse('add_to_cart', args=[self.cup.pk]), {'quantity': 1})
+        self.assertEqual(self.client.session['cart_key'], self.client.session.session_key)
+        response = self.client.post(
+            reverse('order_create'), {'username': 'Айбек', 'phone': '+996555000000', 'address': 'Бишкек'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.tea.refresh_from_db()
+        self.assertEqual((self.tea.stock, self.tea.reserved), (3, 0))
+        self.assertEqual(Order.objects.get().item_count, 3)
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class CatalogImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tmp = Path(self.enterContext(TemporaryDirectory()))
+
+    def write(self, name, text):
+        path = self.tmp / name
+        path.write_text(text, encoding='utf-8')
+        return str(path)
+
+    def test_bad_record_is_reported_with_line_number(self):
+        path = self.write('catalog.csv', (
+            'name,description,category,category_slug,price,stock,image\n'
+            'Улун,,Чай,tea,100,3,\n'
+            'Пуэр,,Чай,tea,сто,1,\n'
+        ))
+        with self.assertRaisesRegex(CommandError, 'строка 3: некорректная цена'):
+            call_command('import_catalog', path, stdout=StringIO())
+        self.assertFalse(Product.objects.exists())
+
+        path = self.write('catalog.jsonl', '{"name": "Улун", "category": "Чай", "price": "100"}\n\n{"name": "Пуэр"}\n')
+        with self.assertRaisesRegex(CommandError, "строка 3: нет поля 'category'"):
+            call_command('import_catalog', path, stdout=StringIO())
+
+    def test_changed_image_drops_stale_digest(self):
+        category = Category.objects.create(name='Чай', slug='tea')
+        Product.objects.create(name='Улун', category=category, price=100, image='/media/a.jpg', image_digest='a' * 64)
+        Product.objects.create(name='Пуэр', category=category, price=100, image='/media/b.jpg', image_digest='b' * 64)
+        path = self.write('catalog.jsonl', (
+            '{"name": "Улун", "category": "Чай", "category_slug": "tea", "price": "120", "image": "/media/c.jpg"}\n'
+            '{"name": "Пуэр", "category": "Чай", "category_slug": "tea", "price": "90", "image": "/media/b.jpg"}\n'
+        ))
+        call_command('import_catalog', path, stdout=StringIO())
+        self.assertEqual(
+            dict(Product.objects.values_list('name', 'image_digest')), {'Улун': '', 'Пуэр': 'b' * 64}
+        )
+
+
+    def test_export_import_round_trip(self):
+        tea = Category.objects.create(name='Чай', slug='tea')
+        cups = Category.objects.create(name='Посуда', slug='cups')
+        Product.objects.create(name='Улун', description='Тегуаньинь, "весенний"', category=tea, price='100.50', stock=3)
+        Product.objects.create(name='Пуэр', description='', category=tea, price=250, stock=0, image='/media/puer.jpg')
+        Product.objects.create(name='Пиала', description='Глина,\nручная работа', category=cups, price=90, stock=7)
+        fields = ('name', 'description', 'category__slug', 'category__name', 'price', 'stock', 'image')
+        catalog = sorted(Product.objects.values_list(*fields))
+
+        for name in ('catalog.csv', 'catalog.jsonl'):
+            with self.subTest(name):
+                path = str(self.tmp / name)
+                call_command('export_catalog', path, stderr=StringIO())
+                Product.objects.all().delete()
+                Category.objects.all().delete()
+                out = StringIO()
+                call_command('import_catalog', path, batch_size=2, stdout=out)
+                self.assertIn('создано 3, обновлено 0, новых категорий 2', out.getvalue())
+                self.assertEqual(sorted(Product.objects.values_list(*fields)), catalog)
+
+                # повторный импорт обновляет те же строки по (категория, название), а не плодит дубли
+                out = StringIO()
+                call_command('import_catalog', path, batch_size=2, stdout=out)
+                self.assertIn('создано 0, обновлено 3, новых категорий 0', out.getvalue())
+                self.assertEqual(sorted(Product.objects.values_list(*fields)), catalog)
+
+class ImageSourceTests(TestCase):
+    def test_only_static_and_media_files_are_read(self):
+        with TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            Path(media_root, 'tea.jpg').write_bytes(b'jpeg')
+            self.assertEqual(resolve_source('/media/tea.jpg'), str(Path(media_root, 'tea.jpg').resolve()))
+            self.assertIsNone(resolve_source('/media/../../etc/passwd'))
+            self.assertIsNone(resolve_source('/etc/passwd'))
+            self.assertIsNone(resolve_source('file:///etc/passwd'))
+        self.assertTrue(resolve_source('/static/images/shop_logo.png'))
+        self.assertIsNone(resolve_source('/static/../../settings.py'))
+
+    def test_remote_fetch_is_opt_in(self):
+        url = 'https://example.com/tea.jpg'
+        self.assertIsNone(resolve_source(url))
+        self.assertEqual(resolve_source(url, allow_remote=True), url)
+
+
+class TrafficRecorderTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Чай', slug='tea')
+        self.product = Product.objects.create(name='Улун', category=category, price=100, stock=5)
+        self.path = Path(self.enterContext(TemporaryDirectory())) / 'traffic.jsonl'
+        self.enterContext(override_settings(SHOP_TRAFFIC_RECORD_PATH=str(self.path)))
+
+    def recorded(self):
+        return [json.loads(line) for line in self.path.read_text(encoding='utf-8').splitlines()]
+
+    def test_json_body_is_redacted(self):
+        payload = {
+            'items': [{'product_id': self.product.pk, 'quantity': 1, 'address': 'Бишкек'}],
+            'contact': {'phone': '+996555000000', 'name': 'Айбек'},
+        }
+        self.client.post(reverse('cart_batch'), payload, content_type='application/json')
+        [record] = self.recorded()
+        self.assertEqual(record['body'], {
+            'items': [{'product_id': self.product.pk, 'quantity': 1, 'address': '***'}],
+            'contact': {'phone': '***', 'name': 'Айбек'},
+        })
+
+    def test_form_body_is_redacted(self):
+        self.client.post(reverse('order_create'), {'username': 'Айбек', 'phone': '+996555000000', 'address': 'Бишкек'})
+        [record] = self.recorded()
+        self.assertEqual(record['body'], {'username': 'Айбек', 'phone': '***', 'address': '***'})
+
+
+@override_settings(SHOP_PRICE_BUCKETS=(100, 500))
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tea = Category.objects.create(name='Чай', slug='tea')
+        self.cups = Category.objects.create(name='Посуда', slug='cups')
+        Product.objects.create(name='Улун', category=self.tea, price=50, stock=3)
+        Product.objects.create(name='Пуэр', category=self.tea, price=300, stock=0)
+        self.cup = Product.objects.create(name='Пиала', category=self.cups, price=300, stock=2)
+        Product.objects.create(name='Чайник', category=self.cups, price=900, stock=1)
+
+    def facets(self, params, category=None):
+        filters = parse_filters(params, category.pk if category else None)
+        return build_facets(facet_grid(filters['q']), filters, [self.tea, self.cups])
+
+    def test_counts_exclude_only_their_own_filter(self):
+        # все фасеты считаются из одного GROUP BY, другие фильтры — уже в памяти по закешированной сетке
+        with self.assertNumQueries(1):
+            facets = self.facets({'price': '100-500'}, self.tea)
+        self.assertEqual([item['count'] for item in facets['categories']], [0, 1])
+        self.assertEqual([(item['key'], item['count']) for item in facets['prices']], [('-100', 1), ('100-500', 0), ('500-', 0)])
+        self.assertEqual((facets['in_stock_count'], facets['all_count']), (0, 1))
+
+        with self.assertNumQueries(0):
+            facets = self.facets({'in_stock': '0'})
+        self.assertEqual(facets['total'], 4)
+        self.assertEqual([item['count'] for item in facets['prices']], [1, 2, 1])
+
+    def test_product_change_invalidates_cached_grid(self):
+        self.assertEqual(self.facets({})['total'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cup.stock = 0
+            self.cup.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.facets({})['total'], 2)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Чай', slug='tea')
+        self.puer = Product.objects.create(name='Пуэр', description='Прессованный чай', category=category, price=100, stock=1)
+        self.cup = Product.objects.create(name='Пиала', description='Для пуэра и улуна', category=category, price=50, stock=1)
+        Product.objects.create(name='Чайник', description='Глиняный', category=category, price=900, stock=1)
+
+    def names(self, query):
+        return list(search_products(Product.objects.all(), query).values_list('name', flat=True))
+
+    def test_prefix_match_ranks_name_above_description(self):
+        self.assertEqual(self.names('пуэ'), ['Пуэр', 'Пиала'])
+        self.assertEqual(self.names('ПРЕССОВАННЫЙ'), ['Пуэр'])
+        self.assertEqual(self.names('улун'), ['Пиала'])
+
+    def test_index_follows_product_changes(self):
+        self.puer.name = 'Шу пуэр'
+        self.puer.description = ''
+        self.puer.save()
+        self.cup.delete()
+        self.assertEqual(self.names('шу'), ['Шу пуэр'])
+        self.assertEqual(self.names('прессованный'), [])
+        self.assertEqual(self.names('улуна'), [])
+
+    def test_punctuation_and_like_backend(self):
+        self.assertEqual(self.names('"*'), [])
+        with override_settings(SHOP_SEARCH_BACKEND='like'):
+            self.assertEqual(self.names('айн'), ['Чайник'])
+
+    def test_listing_filters_by_query(self):
+        response = self.client.get(reverse('products'), {'q': 'глиняный'})
+        self.assertEqual([product.name for product in response.context['products']], ['Чайник'])
+
+
+class CatalogApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Чай', slug='tea')
+        self.products = [
+            Product.objects.create(name=f'Чай {index}', category=self.category, price=100 + index, stock=1)
+            for index in range(3)
+        ]
+
+    def test_list_answers_not_modified_until_catalog_changes(self):
+        url = reverse('api_products')
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual([item['id'] for item in payload['results']], [product.pk for product in self.products[:2]])
+        self.assertEqual(
+            [item['id'] for item in self.client.get(payload['next']).json()['results']], [self.products[2].pk]
+        )
+
+        etag = response['ETag']
+        response = self.client.get(url, {'page_size': 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        Product.objects.filter(pk=self.products[0].pk).update(price=90, updated_at=timezone.now() + timedelta(seconds=5))
+        response = self.client.get(url, {'page_size': 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['price'], '90.00')
+
+    def test_detail_honours_if_modified_since(self):
+        url = reverse('api_product_detail', args=[self.products[0].pk])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['category']['slug'], 'tea')
+        last_modified = response['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        Product.objects.filter(pk=self.products[0].pk).update(updated_at=timezone.now() + timedelta(seconds=5))
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+    def test_categories_etag_follows_registry_version(self):
+        url = reverse('api_categories')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Посуда', slug='cups')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['slug'] for item in response.json()['results']], ['cups', 'tea'])
+
+
+class TrafficReplayTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Чай', slug='tea')
+        self.product = Product.objects.create(name='Улун', category=category, price=100, stock=50)
+        self.path = Path(self.enterContext(TemporaryDirectory())) / 'traffic.jsonl'
+
+    def test_recorded_sessions_replay_without_errors(self):
+        with override_settings(SHOP_TRAFFIC_RECORD_PATH=str(self.path)):
+            self.client.post(reverse('add_to_cart', args=[self.product.pk]), {'quantity': 2})
+            self.client.post(
+                reverse('cart_batch'), [{'product_id': self.product.pk, 'quantity': 1}], content_type='application/json'
+            )
+            self.client.get(reverse('cart'))
+            self.client.get(reverse('products'), {'q': 'улун'})
+
+        sessions = load_sessions(self.path)
+        self.assertEqual([len(session) for session in sessions], [4])
+        self.assertEqual(sessions[0][1]['body'], [{'product_id': self.product.pk, 'quantity': 1}])
+
+        report = ReplayCommand().replay(sessions * 3, TestClientDriver, {'concurrency': 2, 'products': 1, 'server': None})
+        self.assertEqual(report['total']['count'], 12)
+        self.assertEqual(
+            {name: stats['errors'] for name, stats in report['endpoints'].items()},
+            {'add_to_cart': 0, 'cart_batch': 0, 'cart': 0, 'products': 0},
+        )
+        self.assertTrue(all(stats['queries_mean'] for stats in report['endpoints'].values()))
+        # каждая воспроизведённая сессия — отдельная корзина: записанная и три повтора по 2 + 1 шт.
+        self.assertEqual(CartItem.objects.values('cart_key').distinct().count(), 4)
+        self.assertEqual(sum(CartItem.objects.values_list('quantity', flat=True)), 12)
@@ -1,9 +1,19 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     ProductListView, ProductDetailView, ProductCreateView, ProductUpdateView, ProductDeleteView, ProductsByCategoryView,
     CategoryListView, CategoryDetailView, CategoryCreateView, CategoryUpdateView, CategoryDeleteView,
-    AddToCartView, CartView, RemoveFromCartView, OrderCreateView  # добавил OrderCreateView
+    AddToCartView, CartView, RemoveFromCartView, OrderCreateView, CartBatchView,  # добавил OrderCreateView
+    PerformanceStatsView, PerformanceMetricsView, SalesReportView
 )
+from .api import ProductListApiView, ProductsByCategoryApiView, ProductDetailApiView, CategoryListApiView
+from .async_views import AsyncProductListView, AsyncProductsByCategoryView, AsyncProductDetailView, AsyncCartView
+
+# под ASGI витрину и корзину обслуживают async-варианты представлений
+if getattr(settings, 'SHOP_ASYNC_VIEWS', False):
+    ProductListView, ProductsByCategoryView, ProductDetailView, CartView = (
+        AsyncProductListView, AsyncProductsByCategoryView, AsyncProductDetailView, AsyncCartView
+    )
 
 urlpatterns = [
     path('', ProductListView.as_view(), name='products'),
@@ -23,5 +33,16 @@ urlpatterns = [
     path('cart/', CartView.as_view(), name='cart'),
     path('cart/add/<int:pk>/', AddToCartView.as_view(), name='add_to_cart'),
     path('cart/remove/<int:pk>/', RemoveFromCartView.as_view(), name='remove_from_cart'),
-    path('cart/order/', OrderCreateView.as_view(), name='order_create')
+    path('cart/batch/', CartBatchView.as_view(), name='cart_batch'),
+    path('cart/order/', OrderCreateView.as_view(), name='order_create'),
+
+    path('api/products/', ProductListApiView.as_view(), name='api_products'),
+    path('api/products/category/<slug:slug>/', ProductsByCategoryApiView.as_view(), name='api_products_by_category'),
+    path('api/products/<int:pk>/', ProductDetailApiView.as_view(), name='api_product_detail'),
+    path('api/categories/', CategoryListApiView.as_view(), name='api_categories'),
+
+    path('perf/stats/', PerformanceStatsView.as_view(), name='perf_stats'),
+    path('perf/metrics/', PerformanceMetricsView.as_view(), name='perf_metrics'),
+
+    path('reports/sales/', SalesReportView.as_view(), name='sales_report'),
 ]
\ No newline at end of file
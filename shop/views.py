@@ -1,43 +1,111 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import transaction
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, View
 from django.urls import reverse_lazy, reverse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.http import HttpResponseBadRequest
-from .models import Product, Category, CartItem, Order, OrderItem
-from .forms import ProductForm, OrderForm
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from .models import Product, Category
+from .forms import ProductForm, OrderForm, SalesReportForm
+from .cart import get_cart
+from .checkout import place_order
+from .search import search_products
+from .pagination import CursorPaginator, CursorPage
+from .categories import category_registry
+from .page_cache import ProductPageCacheMixin
+from .facets import (
+    FACETS_PLACEHOLDER, apply_filters, build_facets, facet_grid, filter_params, parse_filters, render_facets
+)
+from .metrics import registry
+from .recommendations import bought_together
+from .sales import category_report, daily_totals, product_report
+from .taskqueue import prometheus as task_prometheus, queue_stats
 
 
 class CategoryContextMixin:
     def get_category_context(self):
         return {
             'query': self.request.GET.get('q', ''),
-            'categories': Category.objects.all().order_by('name'),
+            'categories': category_registry.all(),
         }
 
 
-def get_or_create_session_key(request):
-    if not request.session.session_key:
-        request.session.create()
-    return request.session.session_key
+class CursorPaginationMixin:
+    cursor_ordering = None
+
+    def use_cursor_pagination(self):
+        # поиск сортируется по релевантности, поэтому остаётся на обычных номерах страниц
+        if self.request.GET.get('q'):
+            return False
+        if 'cursor' in self.request.GET:
+            return True
+        return getattr(settings, 'SHOP_CURSOR_PAGINATION', False) and 'page' not in self.request.GET
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size, self.cursor_ordering)
+        page = paginator.page(self.request.GET.get('cursor'))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cursor_pagination'] = isinstance(context.get('page_obj'), CursorPage)
+        return context
 
 
-def get_filtered_products(queryset, request):
+def get_filtered_products(queryset, request, filters=None):
+    if filters is not None:
+        queryset = apply_filters(queryset, filters)
     query = request.GET.get('q')
     if query:
-        queryset = queryset.filter(name__icontains=query)
+        queryset = search_products(queryset, query)
     return queryset
 
 
-class ProductListView(CategoryContextMixin, ListView):
+class FacetMixin:
+    def get_facet_category(self):
+        return None
+
+    def get_facet_filters(self):
+        category = self.get_facet_category()
+        return parse_filters(self.request.GET, category.pk if category else None)
+
+    def get_facets(self):
+        filters = self.get_facet_filters()
+        return build_facets(facet_grid(filters['q']), filters, category_registry.all())
+
+    def render_page_fragments(self):
+        fragments = super().render_page_fragments()
+        fragments[FACETS_PLACEHOLDER] = render_facets(self.get_facets(), self.get_facet_category())
+        return fragments
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['filter_params'] = filter_params(self.get_facet_filters())
+        if getattr(self, 'rendering_for_cache', False):
+            context['facets_placeholder'] = FACETS_PLACEHOLDER
+        else:
+            context['facets'] = self.get_facets()
+        return context
+
+
+class ProductListView(FacetMixin, ProductPageCacheMixin, CategoryContextMixin, CursorPaginationMixin, ListView):
     model = Product
     template_name = 'shop/products_list.html'
     context_object_name = 'products'
     paginate_by = 5
+    cursor_ordering = ('category__name', 'name', 'pk')
 
     def get_queryset(self):
-        queryset = Product.objects.filter(stock__gte=1).order_by('category__name', 'name')
-        return get_filtered_products(queryset, self.request)
+        queryset = Product.objects.select_related('category').order_by(*self.cursor_ordering)
+        return get_filtered_products(queryset, self.request, self.get_facet_filters())
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -46,16 +114,24 @@ class ProductListView(CategoryContextMixin, ListView):
         return context
 
 
-class ProductsByCategoryView(CategoryContextMixin, ListView):
+class ProductsByCategoryView(FacetMixin, ProductPageCacheMixin, CategoryContextMixin, CursorPaginationMixin, ListView):
     model = Product
     template_name = 'shop/products_list.html'
     context_object_name = 'products'
     paginate_by = 5
+    cursor_ordering = ('name', 'pk')
+
+    def get_page_cache_scope(self):
+        category = category_registry.get_by_slug_or_404(self.kwargs['slug'])
+        return f'category:{category.pk}'
+
+    def get_facet_category(self):
+        return category_registry.get_by_slug_or_404(self.kwargs['slug'])
 
     def get_queryset(self):
-        self.category = get_object_or_404(Category, slug=self.kwargs['slug'])
-        queryset = Product.objects.filter(category=self.category, stock__gte=1).order_by('name')
-        return get_filtered_products(queryset, self.request)
+        self.category = category_registry.get_by_slug_or_404(self.kwargs['slug'])
+        queryset = Product.objects.filter(category=self.category).order_by(*self.cursor_ordering)
+        return get_filtered_products(queryset, self.request, self.get_facet_filters())
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -69,6 +145,12 @@ class ProductDetailView(DetailView):
     template_name = 'shop/product_detail.html'
     context_object_name = 'product'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # соседи заранее посчитаны в ProductNeighbor: без self-join по истории заказов на каждый просмотр
+        context['bought_together'] = list(bought_together(self.object.pk))
+        return context
+
 
 class ProductCreateView(CreateView):
     model = Product
@@ -142,23 +224,8 @@ class AddToCartView(View):
         except (ValueError, TypeError):
             return HttpResponseBadRequest("Некорректное количество")
 
-        session_key = get_or_create_session_key(request)
-
-        cart_item, _ = CartItem.objects.get_or_create(
-            product=product,
-            session_key=session_key,
-            defaults={'quantity': 0}
-        )
-
-        new_quantity = cart_item.quantity + quantity
-        if new_quantity > product.stock:
-            cart_item.quantity = product.stock
-        else:
-            cart_item.quantity = new_quantity
-
         try:
-            cart_item.full_clean()
-            cart_item.save()
+            get_cart(request).add(product, quantity)
         except ValidationError as e:
             return HttpResponseBadRequest(e.messages)
 
@@ -167,56 +234,146 @@ class AddToCartView(View):
 
 class RemoveFromCartView(View):
     def post(self, request, pk):
-        session_key = get_or_create_session_key(request)
-        cart_item = get_object_or_404(CartItem, pk=pk, session_key=session_key)
-
-        if cart_item.quantity > 1:
-            cart_item.quantity -= 1
-            try:
-                cart_item.full_clean()
-                cart_item.save()
-            except ValidationError as e:
-                return HttpResponseBadRequest(e.messages)
-        else:
-            cart_item.delete()
+        try:
+            get_cart(request).remove_one(pk)
+        except ValidationError as e:
+            return HttpResponseBadRequest(e.messages)
 
         return redirect('cart')
 
 
 class CartView(View):
     def get(self, request):
-        session_key = get_or_create_session_key(request)
-        cart_items = CartItem.objects.filter(session_key=session_key).select_related('product')
-        total = sum(item.subtotal() for item in cart_items)
+        cart = get_cart(request)
+        cart_items = cart.lines()
         return render(request, 'shop/cart.html', {
             'cart_items': cart_items,
-            'total': total,
+            'total': cart.summary(cart_items)['total'],
             'order_form': OrderForm(),
         })
 
 
+def cart_state(cart):
+    cart_items = cart.lines()
+    summary = cart.summary(cart_items)
+    return {
+        'items': [
+            {
+                'id': item.pk,
+                'product_id': item.product.pk,
+                'name': item.product.name,
+                'price': item.product.price,
+                'quantity': item.quantity,
+                'subtotal': item.subtotal(),
+            }
+            for item in cart_items
+        ],
+        'count': summary['count'],
+        'total': summary['total'],
+    }
+
+
+class CartBatchView(View):
+    def get(self, request):
+        return JsonResponse(cart_state(get_cart(request)))
+
+    def post(self, request):
+        try:
+            payload = json.loads(request.body)
+            operations = payload['items'] if isinstance(payload, dict) else payload
+            quantities = {}
+            for operation in operations:
+                product_id = int(operation['product_id'])
+                quantity = int(operation['quantity'])
+                if quantity < 1:
+                    return JsonResponse({'error': 'Количество должно быть больше 0'}, status=400)
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+        except (ValueError, TypeError, KeyError):
+            return JsonResponse({'error': 'Некорректный формат запроса'}, status=400)
+
+        products = Product.objects.only('pk', 'stock').in_bulk(list(quantities))
+        errors = []
+        for product_id in list(quantities):
+            product = products.get(product_id)
+            if product is None:
+                errors.append({'product_id': product_id, 'error': 'Товар не найден'})
+            elif product.stock < 1:
+                errors.append({'product_id': product_id, 'error': 'Товара нет в наличии'})
+            else:
+                continue
+            del quantities[product_id]
+
+        cart = get_cart(request)
+        if quantities:
+            for product_id in cart.add_many(products, quantities):
+                errors.append({'product_id': product_id, 'error': 'Товара нет в наличии'})
+
+        state = cart_state(cart)
+        state['errors'] = errors
+        return JsonResponse(state)
+
+
 class OrderCreateView(View):
-    @transaction.atomic
     def post(self, request):
-        session_key = get_or_create_session_key(request)
-        cart_items = CartItem.objects.filter(session_key=session_key).select_related('product')
+        cart = get_cart(request)
 
-        if not cart_items.exists():
+        if cart.is_empty():
             return redirect('cart')
 
         form = OrderForm(request.POST)
         if form.is_valid():
-            order = form.save()
-            for item in cart_items:
-                OrderItem.objects.create(order=order, product=item.product, quantity=item.quantity)
-                item.product.stock -= item.quantity
-                item.product.save()
-            cart_items.delete()
-            return redirect('products')
-        else:
-            total = sum(item.subtotal() for item in cart_items)
-            return render(request, 'shop/cart.html', {
-                'cart_items': cart_items,
-                'total': total,
-                'order_form': form,
-            })
+            try:
+                place_order(cart, form.cleaned_data)
+            except ValidationError as e:
+                form.add_error(None, e)
+            else:
+                return redirect('products')
+
+        cart_items = cart.lines()
+        return render(request, 'shop/cart.html', {
+            'cart_items': cart_items,
+            'total': cart.summary(cart_items)['total'],
+            'order_form': form,
+        })
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class PerformanceStatsView(View):
+    def get(self, request):
+        return JsonResponse({'routes': registry.snapshot(), 'tasks': queue_stats()})
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class PerformanceMetricsView(View):
+    def get(self, request):
+        # глубина очереди и задержки задач — рядом с метриками запросов, из той же базы
+        body = registry.prometheus() + task_prometheus(queue_stats())
+        return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class SalesReportView(View):
+    # отчёт читает только дневные сводки: тяжёлых join по истории заказов рядом с оформлением нет
+    limit = 50
+
+    def get(self, request):
+        form = SalesReportForm(request.GET or None)
+        end = timezone.localdate()
+        start = end - timedelta(days=29)
+        by = 'category'
+        if form.is_valid():
+            end = form.cleaned_data['end'] or end
+            start = form.cleaned_data['start'] or end - timedelta(days=29)
+            by = form.cleaned_data['by'] or by
+        report = product_report if by == 'product' else category_report
+        days = list(daily_totals(start, end))
+        return render(request, 'shop/sales_report.html', {
+            'form': form,
+            'start': start,
+            'end': end,
+            'by': by,
+            'rows': report(start, end, self.limit),
+            'days': days,
+            'units': sum(day['units'] for day in days),
+            'revenue': sum((day['revenue'] for day in days), Decimal('0.00')),
+        })
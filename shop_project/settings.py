@@ -41,6 +41,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'shop.middleware.StaticAssetsMiddleware',
+    'shop.middleware.TrafficRecorderMiddleware',
+    'shop.middleware.PerformanceMiddleware',
+    'shop.middleware.ReadYourWritesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,7 +58,7 @@ ROOT_URLCONF = 'shop_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'shop.templating.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'shop/templates']
         ,
         'APP_DIRS': True,
@@ -63,6 +67,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'shop.context_processors.cart_badge',
             ],
         },
     },
@@ -74,14 +79,153 @@ WSGI_APPLICATION = 'shop_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# 'replica' serves catalog reads (shop.db.PrimaryReplicaRouter). With SQLite it is a second, read-only connection
+# to the same WAL file, so readers never wait for writers; point it at a real replica on a server database.
+# IMMEDIATE transactions take the write lock up front instead of failing with "database is locked" on upgrade.
+# Tests use a file database too: an in-memory one is shared between connections with table-level locks that never
+# wait, so the replica mirror and the concurrency tests would fail with "database table is locked".
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
+}
+
+DATABASE_ROUTERS = ['shop.db.PrimaryReplicaRouter']
+
+# Aliases that catalog reads are spread over; empty sends everything to 'default'
+
+SHOP_DATABASE_REPLICAS = ['replica']
+
+# After a POST the session keeps reading the catalog from 'default' for this many seconds (replication lag window)
+
+SHOP_READ_YOUR_WRITES_SECONDS = 5
+
+# Applied to every new SQLite connection (shop.db.apply_sqlite_pragmas): WAL lets readers run alongside the writer,
+# synchronous=NORMAL is durable across app crashes in WAL mode, 64 MB page cache, 256 MB memory-mapped I/O
+
+SHOP_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Shop caches are invalidated through version counters stored here, so a multi-worker deployment
+# needs a shared backend (Redis, Memcached or DatabaseCache) instead of the per-process LocMemCache.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shop',
     }
 }
 
 
+# Product search: 'fts' uses the SQLite FTS5 index, 'like' falls back to name__icontains
+
+SHOP_SEARCH_BACKEND = 'fts'
+
+# Keyset (cursor) pagination for product listings: no COUNT(*) and no OFFSET scans on deep pages.
+# Explicit ?page= links and search results keep using page numbers.
+
+SHOP_CURSOR_PAGINATION = False
+
+# Rendered product listing pages are cached per (category, q, page) for this many seconds, 0 disables.
+# Product changes bump a per-category generation, so an edit in one category does not flush the others.
+
+SHOP_PAGE_CACHE_TIMEOUT = 300
+
+# Catalog facets: price bucket boundaries (half-open ranges, in som) and how long the per-search facet count grid
+# is cached. The grid is keyed by the catalog-wide page generation, so any product change invalidates it.
+
+SHOP_PRICE_BUCKETS = (100, 500, 1000, 5000)
+SHOP_FACET_CACHE_TIMEOUT = 300
+
+# Cart storage: 'shop.cart.DatabaseCart' keeps CartItem rows per session,
+# 'shop.cart.SessionCart' keeps lines in the session and only touches the database at checkout
+# (combine it with SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies' to avoid session rows too).
+
+SHOP_CART_BACKEND = 'shop.cart.DatabaseCart'
+
+# Adding to the cart holds the stock for this many seconds (Product.reserved + StockReservation rows),
+# checkout consumes the hold; expired holds go back to available stock via `manage.py gc_carts`. 0 disables holds.
+
+SHOP_STOCK_RESERVATION_TTL = 15 * 60
+
+# Largest page_size accepted by the read-only catalog JSON API
+
+SHOP_API_MAX_PAGE_SIZE = 1000
+
+# Path of a JSONL file to record incoming requests to (for `manage.py replay_traffic`), None disables recording
+
+SHOP_TRAFFIC_RECORD_PATH = None
+
+# Per-request DB/template/view timings: Server-Timing header, per-route histograms at perf/stats/ and perf/metrics/,
+# and a warning on the 'shop.performance' logger when one SQL shape repeats this many times in a request
+
+SHOP_PERFORMANCE_INSTRUMENTATION = True
+SHOP_N_PLUS_ONE_THRESHOLD = 5
+
+# Route the catalog and cart pages to async views (async ORM, no thread-pool hop per request).
+# Only worth enabling when serving through shop_project.asgi; under WSGI every async view is wrapped back into sync.
+
+SHOP_ASYNC_VIEWS = False
+
+# Background tasks (shop.Task table, shop/taskqueue.py): checkout enqueues non-critical work after commit and
+# `manage.py run_workers` executes it with SHOP_TASK_WORKERS threads (or processes, SHOP_TASK_WORKER_MODE).
+# A failed task is retried after min(SHOP_TASK_RETRY_MAX, SHOP_TASK_RETRY_BASE * 2**(attempt-1)) seconds (with
+# jitter) up to SHOP_TASK_MAX_ATTEMPTS times; a task running longer than SHOP_TASK_STALE_TIMEOUT is assumed to be
+# lost with its worker and requeued; finished tasks are deleted after SHOP_TASK_RETENTION seconds.
+
+SHOP_TASK_WORKERS = 4
+SHOP_TASK_WORKER_MODE = 'thread'
+SHOP_TASK_MAX_ATTEMPTS = 5
+SHOP_TASK_RETRY_BASE = 2
+SHOP_TASK_RETRY_MAX = 300
+SHOP_TASK_STALE_TIMEOUT = 600
+SHOP_TASK_RETENTION = 7 * 24 * 60 * 60
+
+# The stock.low_stock_alert task logs a warning on 'shop.tasks' when an ordered product's available stock
+# (stock - reserved) drops below this
+
+SHOP_LOW_STOCK_THRESHOLD = 5
+
+# "Frequently bought together" on the product page: up to SHOP_RECOMMENDATIONS_TOP_K neighbours per product,
+# counted from order co-occurrence. Each order updates them via the recommendations.record_order task;
+# `manage.py rebuild_recommendations` recomputes them exactly (vectorized when numpy is installed).
+# Orders with more than SHOP_RECOMMENDATIONS_MAX_BASKET distinct products are ignored.
+
+SHOP_RECOMMENDATIONS_TOP_K = 8
+SHOP_RECOMMENDATIONS_MAX_BASKET = 50
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -117,6 +261,37 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# collectstatic writes content-hashed copies plus a manifest, then pre-compresses text assets into .gz
+# (and .br when the brotli package is installed) using SHOP_STATIC_COMPRESS_WORKERS threads.
+# StaticAssetsMiddleware serves STATIC_ROOT ahead of the rest of the stack: hashed names get a one-year immutable
+# Cache-Control, unhashed names SHOP_STATIC_MAX_AGE seconds, and the best precompressed variant the client accepts.
+# Run `manage.py collectstatic` before every deploy: until the manifest exists, templates fall back to unhashed
+# URLs (no immutable caching), and a stale manifest keeps pointing at the previous build's files.
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'shop.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+SHOP_STATIC_SERVE = True
+SHOP_STATIC_MAX_AGE = 60
+SHOP_STATIC_COMPRESS_WORKERS = None  # one per CPU
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Product images are resized into these variants (longest side, px) and formats by `manage.py process_images`
+# and on upload; variants live under SHOP_IMAGE_ROOT addressed by the sha256 of the source image. Needs Pillow.
+
+SHOP_IMAGE_ROOT = MEDIA_ROOT / 'thumbs'
+SHOP_IMAGE_URL = MEDIA_URL + 'thumbs/'
+SHOP_IMAGE_SIZES = {'thumb': 160, 'card': 400, 'full': 1200}
+SHOP_IMAGE_FORMATS = ('webp', 'jpeg')
+SHOP_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+# Local sources are read only through the staticfiles finders and from MEDIA_ROOT. Downloading http(s) image URLs
+# is off by default because the URL comes from product data; enable it here or per run with --fetch-remote.
+SHOP_IMAGE_FETCH_REMOTE = False
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field